@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+from collections import deque
+from time import monotonic
+
+import anyio.to_thread
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+
+# First match wins; a class of None bypasses admission control.
+ROUTE_CLASSES: list[tuple[str | None, re.Pattern[str], str | None]] = [
+    (None, re.compile(r"^/(health|ready)$"), None),
+    ("GET", re.compile(r"^(/datasets/[^/]+)?/events$"), None),
+    ("POST", re.compile(r"^/auth/(token|register)$"), "auth"),
+    (None, re.compile(r"^/datasets/[^/]+/file$"), "transfer"),
+    ("GET", re.compile(r"^/datasets$"), "heavy"),
+    ("POST", re.compile(r"^/datasets/[^/]+/nca$"), "heavy"),
+    ("GET", re.compile(r"^/datasets/[^/]+/curves$"), "heavy"),
+    ("GET", re.compile(r"^/drugs/[^/]+/summary$"), "heavy"),
+    ("GET", re.compile(r"^/jobs/[^/]+/result$"), "transfer"),
+]
+RATE_LIMITED = re.compile(r"^/auth/(token|register)$")
+
+
+def classify(method: str, path: str) -> str | None:
+    for route_method, pattern, cost_class in ROUTE_CLASSES:
+        if (route_method is None or route_method == method) and pattern.match(path):
+            return cost_class
+    return "light"
+
+
+def lane_limits() -> dict[str, int]:
+    return {
+        "light": settings.admission_light_limit,
+        "heavy": settings.admission_heavy_limit,
+        "auth": settings.admission_auth_limit,
+        "transfer": settings.admission_transfer_limit,
+    }
+
+
+def size_threadpool() -> None:
+    """Raise the default threadpool so every admitted request can get a thread.
+
+    Sync endpoints and ``run_in_threadpool`` share anyio's default limiter of
+    40 tokens; with fewer tokens than admitted requests, lanes would queue a
+    second time, invisibly to admission control, behind one another's threads.
+    Must be called from the event loop.
+    """
+    if not settings.admission_enabled:
+        return
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(limiter.total_tokens, sum(lane_limits().values()))
+
+
+class Lane:
+    """Concurrency limit with a bounded, deadline-aware FIFO queue.
+
+    Waiting time is predicted from queue depth and a moving average of the
+    lane's service time; requests whose prediction exceeds the budget are
+    rejected up front instead of queueing.
+    """
+
+    def __init__(self, limit: int, queue_size: int, budget: float) -> None:
+        self.limit = limit
+        self.queue_size = queue_size
+        self.budget = budget
+        self.active = 0
+        self.service_time = 0.05
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    def predicted_wait(self) -> float:
+        return (len(self._waiters) + 1) / self.limit * self.service_time
+
+    async def acquire(self) -> float | None:
+        """Take a slot; returns a retry-after hint in seconds when shed."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        predicted = self.predicted_wait()
+        if len(self._waiters) >= self.queue_size or predicted > self.budget:
+            return predicted
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.budget)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # ``release`` handed us the slot as the deadline hit; keep it.
+                return None
+            self._discard(waiter)
+            return self.predicted_wait()
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0)
+            else:
+                self._discard(waiter)
+            raise
+        return None
+
+    def release(self, elapsed: float) -> None:
+        if elapsed:
+            self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter.
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, waiter: asyncio.Future[None]) -> None:
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+class TokenBucket:
+    """Per-client token buckets refilled at ``rate`` tokens per second."""
+
+    max_clients = 10_000
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def take(self, client: str) -> float | None:
+        """Consume a token; returns seconds until one is available when empty."""
+        now = monotonic()
+        tokens, updated = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[client] = (tokens - 1, now)
+        if len(self._buckets) > self.max_clients:
+            self._prune(now)
+        return None
+
+    def _prune(self, now: float) -> None:
+        refill = self.burst / self.rate
+        self._buckets = {
+            client: state for client, state in self._buckets.items() if now - state[1] < refill
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        budget = settings.admission_budget_ms / 1000
+        self.lanes = {
+            name: Lane(limit, settings.admission_queue_size, budget) for name, limit in lane_limits().items()
+        }
+        self.auth_bucket = TokenBucket(settings.auth_rate_per_second, settings.auth_burst)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.admission_enabled:
+            await self.app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+        if RATE_LIMITED.match(path):
+            client = scope["client"][0] if scope.get("client") else "unknown"
+            retry_after = self.auth_bucket.take(client)
+            if retry_after is not None:
+                await self._reject(429, "Too many authentication attempts", retry_after, scope, receive, send)
+                return
+        cost_class = classify(method, path)
+        if cost_class is None:
+            await self.app(scope, receive, send)
+            return
+        lane = self.lanes[cost_class]
+        retry_after = await lane.acquire()
+        if retry_after is not None:
+            await self._reject(503, "Server overloaded, retry later", retry_after, scope, receive, send)
+            return
+        started = monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release(monotonic() - started)
+
+    @staticmethod
+    async def _reject(
+        status_code: int, detail: str, retry_after: float, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        response = JSONResponse(
+            status_code=status_code,
+            content={"detail": detail},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import BinaryIO
+from urllib.parse import quote
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class MultipartError(ValueError):
+    pass
+
+
+class BlobStore:
+    """Content-addressed file store keyed by SHA-256 digest."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._tmp = root / "tmp"
+        self._tmp.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / "sha256" / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).is_file()
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+
+class BlobWriter:
+    """Streams bytes to a temporary file while hashing them.
+
+    ``commit`` moves the file to its content address, or discards it when an
+    identical blob is already stored.
+    """
+
+    def __init__(self, store: BlobStore) -> None:
+        self._store = store
+        self._hash = hashlib.sha256()
+        self._file: BinaryIO = NamedTemporaryFile(dir=store._tmp, delete=False)
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        digest = self._hash.hexdigest()
+        self._file.close()
+        target = self._store.path_for(digest)
+        if target.exists():
+            os.unlink(self._file.name)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._file.name, target)
+        return digest
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self._file.name):
+            os.unlink(self._file.name)
+
+
+class MultipartFile:
+    """Extracts one file part from a ``multipart/form-data`` body as it streams.
+
+    ``feed`` returns the bytes of the ``field`` part found in each chunk, so
+    the caller can write them on without spooling the body first.
+    """
+
+    def __init__(self, content_type: str, field: str = "file") -> None:
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise MultipartError("Missing multipart boundary")
+        self.field = field.encode()
+        self.file_name: str | None = None
+        self.found = False
+        self._in_field = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._data = bytearray()
+        self._parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._part_begin,
+                "on_header_field": self._header_field,
+                "on_header_value": self._header_value_data,
+                "on_header_end": self._header_end,
+                "on_headers_finished": self._headers_finished,
+                "on_part_data": self._part_data,
+                "on_part_end": self._part_end,
+            },
+        )
+
+    def feed(self, chunk: bytes) -> bytes:
+        try:
+            self._parser.write(chunk)
+        except ValueError as exc:
+            raise MultipartError(f"Malformed multipart body: {exc}") from exc
+        data = bytes(self._data)
+        self._data.clear()
+        return data
+
+    def _part_begin(self) -> None:
+        self._disposition = b""
+
+    def _header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _header_value_data(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _headers_finished(self) -> None:
+        _, params = parse_options_header(self._disposition)
+        # Only the first part with the field name is taken.
+        self._in_field = not self.found and params.get(b"name") == self.field
+        if self._in_field:
+            self.found = True
+            filename = params.get(b"filename")
+            self.file_name = filename.decode("utf-8", "replace") if filename else None
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_field:
+            self._data += data[start:end]
+
+    def _part_end(self) -> None:
+        self._in_field = False
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Return the ``[start, end)`` span for a single ``bytes=`` range.
+
+    Multi-range and malformed headers yield ``None`` so the caller serves the
+    whole file, which RFC 9110 permits.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable
+            return max(size - suffix, 0), size
+        start = int(first)
+        end = int(last) + 1 if last else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end <= start):
+        # A last position before the first makes the range invalid, not unsatisfiable.
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(end, size) if end is not None else size
+
+
+def content_disposition(file_name: str) -> str:
+    """``attachment`` header for a user-supplied name, with RFC 6266 escaping.
+
+    Names outside latin-1 get an ASCII ``filename`` fallback and the exact name
+    as ``filename*``.
+    """
+    name = "".join(char if char.isprintable() else "_" for char in file_name)
+    escaped = name.replace("\\", "\\\\").replace('"', '\\"')
+    try:
+        escaped.encode("latin-1")
+    except UnicodeEncodeError:
+        fallback = escaped.encode("ascii", "replace").decode("ascii")
+        return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(name, safe='')}"
+    return f'attachment; filename="{escaped}"'
+
+
+class BlobResponse(Response):
+    """Serves a stored blob with single-range support.
+
+    Uses the ASGI ``http.response.zerocopysend`` extension (``sendfile``) when
+    the server offers it and falls back to bounded chunked reads otherwise;
+    uvicorn does not offer it, so there every download takes the chunked path.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path: Path, digest: str, file_name: str | None, request_headers: Headers) -> None:
+        self.path = path
+        self.background = None
+        size = path.stat().st_size
+        etag = f'"{digest}"'
+        if_range = request_headers.get("if-range")
+        span = None
+        if if_range is None or if_range == etag:
+            try:
+                span = parse_range(request_headers.get("range"), size)
+            except RangeNotSatisfiable:
+                self.status_code = 416
+                self.span = (0, 0)
+                self.init_headers({"content-range": f"bytes */{size}", "content-length": "0"})
+                return
+        start, end = span or (0, size)
+        self.span = (start, end)
+        self.status_code = 206 if span else 200
+        headers = {
+            "content-type": "application/octet-stream",
+            "content-length": str(end - start),
+            "accept-ranges": "bytes",
+            "etag": etag,
+        }
+        if span:
+            headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+        if file_name:
+            headers["content-disposition"] = content_disposition(file_name)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        start, end = self.span
+        if scope.get("method") == "HEAD" or start == end:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        fd = await run_in_threadpool(os.open, self.path, os.O_RDONLY)
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": fd,
+                        "offset": start,
+                        "count": end - start,
+                        "more_body": False,
+                    }
+                )
+                return
+            offset = start
+            while offset < end:
+                chunk = await run_in_threadpool(os.pread, fd, min(self.chunk_size, end - offset), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+        finally:
+            os.close(fd)
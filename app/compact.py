@@ -0,0 +1,231 @@
+"""Compact in-process record storage used by ``InMemoryStore``.
+
+Rows keep their fields in ``__slots__`` with timestamps as integer
+microseconds and repeated strings interned; audit logs, by far the most
+numerous rows, are stored column-wise. Pydantic models are only built when a
+record leaves the store.
+"""
+from __future__ import annotations
+
+import json
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, ClassVar
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from app.models import (
+    AccessRequestRecord,
+    AuditLogRecord,
+    DatasetRecord,
+    JobRecord,
+    Role,
+    RoleUpgradeRequestRecord,
+    UserRecord,
+)
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(value: datetime) -> int:
+    return (value - EPOCH) // _MICROSECOND
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+class Interner:
+    """Two-way mapping between strings and dense integer codes."""
+
+    def __init__(self) -> None:
+        self._codes: dict[str, int] = {}
+        self._values: list[str] = []
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def lookup(self, value: str) -> int | None:
+        return self._codes.get(value)
+
+    def value(self, code: int) -> str:
+        return self._values[code]
+
+
+class Row:
+    """Slotted copy of a Pydantic record."""
+
+    __slots__ = ()
+    model: ClassVar[type[BaseModel]]
+    interned: ClassVar[frozenset[str]] = frozenset()
+    timestamps: ClassVar[frozenset[str]] = frozenset()
+
+    @classmethod
+    def from_record(cls, record: BaseModel) -> Row:
+        row = cls.__new__(cls)
+        for name in cls.__slots__:
+            value = getattr(record, name)
+            if name in cls.timestamps:
+                value = to_micros(value)
+            elif name in cls.interned and value is not None:
+                value = sys.intern(value)
+            setattr(row, name, value)
+        return row
+
+    def updated(self, changes: dict[str, Any]) -> Row:
+        """A new row with ``changes`` applied.
+
+        Readers do not take the store's lock, so rows are replaced whole
+        rather than changed in place.
+        """
+        row = self.__class__.__new__(self.__class__)
+        for name in self.__slots__:
+            setattr(row, name, getattr(self, name))
+        for name, value in changes.items():
+            if name in self.timestamps:
+                value = to_micros(value)
+            elif name in self.interned and value is not None:
+                value = sys.intern(value)
+            setattr(row, name, value)
+        return row
+
+    def to_record(self) -> Any:
+        values = {name: getattr(self, name) for name in self.__slots__}
+        for name in self.timestamps:
+            values[name] = from_micros(values[name])
+        return self.model.model_construct(**values)
+
+    def to_fields(self, fields: list[str]) -> dict[str, Any]:
+        """Plain dict of just ``fields``, without building a model."""
+        return {
+            name: from_micros(getattr(self, name)) if name in self.timestamps else getattr(self, name)
+            for name in fields
+        }
+
+
+class UserRow(Row):
+    __slots__ = ("id", "email", "role", "hashed_password")
+    model = UserRecord
+
+    def updated(self, changes: dict[str, Any]) -> UserRow:
+        row = super().updated(changes)
+        row.role = Role(row.role)
+        return row
+
+
+class DatasetRow(Row):
+    __slots__ = (
+        "id",
+        "drug_name",
+        "study_id",
+        "dataset_type",
+        "metadata",
+        "file_name",
+        "file_sha256",
+        "file_size",
+        "arrays_id",
+        "owner_id",
+        "locked",
+        "version",
+        "created_at",
+        "updated_at",
+    )
+    model = DatasetRecord
+    interned = frozenset({"drug_name", "study_id", "dataset_type", "owner_id"})
+    timestamps = frozenset({"created_at", "updated_at"})
+
+
+class AccessRequestRow(Row):
+    __slots__ = ("id", "dataset_id", "requester_id", "reason", "status", "created_at")
+    model = AccessRequestRecord
+    interned = frozenset({"dataset_id", "requester_id", "status"})
+    timestamps = frozenset({"created_at"})
+
+
+class RoleUpgradeRequestRow(Row):
+    __slots__ = ("id", "requester_id", "requested_role", "reason", "status", "created_at")
+    model = RoleUpgradeRequestRecord
+    interned = frozenset({"requester_id", "status"})
+    timestamps = frozenset({"created_at"})
+
+
+class JobRow(Row):
+    __slots__ = (
+        "id",
+        "dataset_id",
+        "dataset_version",
+        "kind",
+        "params",
+        "status",
+        "progress",
+        "result",
+        "result_file",
+        "error",
+        "submitted_by",
+        "cancel_requested",
+        "owner",
+        "heartbeat_at",
+        "active_key",
+        "created_at",
+        "updated_at",
+    )
+    model = JobRecord
+    interned = frozenset({"dataset_id", "kind", "status", "submitted_by"})
+    timestamps = frozenset({"created_at", "updated_at"})
+
+
+class AuditLogTable:
+    """Column-oriented audit log.
+
+    Ids are packed as 16-byte UUIDs, dataset/actor/action and the JSON form of
+    ``details`` are dictionary-coded, and timestamps are int64 microseconds.
+    """
+
+    def __init__(self) -> None:
+        self._ids = bytearray()
+        self._dataset = array("i")
+        self._actor = array("i")
+        self._action = array("i")
+        self._details = array("i")
+        self._created_at = array("q")
+        self._references = Interner()
+        self._actions = Interner()
+        self._payloads = Interner()
+        self._payloads.code("{}")
+        self._by_dataset: dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._created_at)
+
+    def append(self, record: AuditLogRecord) -> None:
+        row = len(self)
+        dataset = self._references.code(record.dataset_id)
+        self._ids += UUID(record.id).bytes
+        self._dataset.append(dataset)
+        self._actor.append(self._references.code(record.actor_id))
+        self._action.append(self._actions.code(record.action))
+        self._details.append(self._payloads.code(json.dumps(record.details, sort_keys=True, default=str)))
+        self._created_at.append(to_micros(record.created_at))
+        self._by_dataset.setdefault(dataset, array("I")).append(row)
+
+    def _materialize(self, row: int) -> AuditLogRecord:
+        return AuditLogRecord.model_construct(
+            id=str(UUID(bytes=bytes(self._ids[row * 16 : row * 16 + 16]))),
+            dataset_id=self._references.value(self._dataset[row]),
+            actor_id=self._references.value(self._actor[row]),
+            action=self._actions.value(self._action[row]),
+            details=json.loads(self._payloads.value(self._details[row])),
+            created_at=from_micros(self._created_at[row]),
+        )
+
+    def for_dataset(self, dataset_id: str) -> list[AuditLogRecord]:
+        code = self._references.lookup(dataset_id)
+        rows = self._by_dataset.get(code, ()) if code is not None else ()
+        return [self._materialize(row) for row in rows]
@@ -10,6 +10,33 @@ class Settings(BaseSettings):
     mongo_uri: str = "mongodb://localhost:27017"
     mongo_db: str = "pkdb"
     use_mongo: bool = False
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 10
+    mongo_connect_timeout_ms: int = 5000
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_socket_timeout_ms: int | None = None
+    mongo_wait_queue_timeout_ms: int | None = None
+    mongo_compressors: str | None = None
+    data_dir: str = "data"
+    upload_chunk_size: int = 1024 * 1024
+    version_snapshot_interval: int = 50
+    events_history: int = 1000
+    events_buffer: int = 256
+    events_heartbeat_seconds: float = 15.0
+    stats_reconcile_interval_seconds: float = 3600.0
+    store_retry_seconds: float = 5.0
+    single_flight_reads: bool = True
+    job_workers: int = 2
+    job_heartbeat_seconds: float = 10.0
+    admission_enabled: bool = True
+    admission_budget_ms: int = 2000
+    admission_queue_size: int = 64
+    admission_light_limit: int = 64
+    admission_heavy_limit: int = 8
+    admission_auth_limit: int = 4
+    admission_transfer_limit: int = 16
+    auth_rate_per_second: float = 5.0
+    auth_burst: int = 30
 
 
 settings = Settings()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# Per-subject point budgets of the precomputed pyramid, finest first. A level
+# is only stored when some subject has more samples than its budget.
+LEVELS = (4096, 1024, 256, 64)
+MIN_POINTS = 4
+MAX_POINTS = LEVELS[0]
+
+
+@dataclass(frozen=True)
+class Curves:
+    """Concentration-time series grouped by subject like ``PKArrays``."""
+
+    offsets: np.ndarray
+    time: np.ndarray
+    concentration: np.ndarray
+
+    @property
+    def longest(self) -> int:
+        return int(np.diff(self.offsets).max(initial=0))
+
+    def select(self, indices: np.ndarray) -> Curves:
+        """The curves of the subjects at ``indices``, in that order."""
+        offsets = np.asarray(self.offsets)
+        starts = offsets[indices]
+        counts = offsets[indices + 1] - starts
+        selected = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=selected[1:])
+        rows = np.repeat(starts - selected[:-1], counts) + np.arange(selected[-1])
+        return Curves(selected, np.asarray(self.time[rows]), np.asarray(self.concentration[rows]))
+
+
+def downsample(curves: Curves, points: int) -> Curves:
+    """Min/max bucketing to at most ``points`` samples per subject.
+
+    Each subject over budget keeps its first and last sample plus the lowest
+    and highest concentration of ``(points - 2) // 2`` equal-count buckets, so
+    peaks such as Cmax survive. Subjects within budget are kept whole.
+    """
+    if curves.longest <= points:
+        return curves
+    offsets = np.asarray(curves.offsets)
+    conc = np.asarray(curves.concentration)
+    counts = np.diff(offsets)
+    buckets = (points - 2) // 2
+    owner = np.repeat(np.arange(len(counts)), counts)
+    keep = counts[owner] <= points
+
+    rows = np.flatnonzero(~keep)
+    position = rows - offsets[owner[rows]]
+    n = counts[owner[rows]]
+    # Interior samples fall into buckets 1..buckets; the floor division puts
+    # the first sample in bucket 0 and the last in bucket ``buckets + 1``.
+    group = owner[rows] * (buckets + 2) + 1 + (position - 1) * buckets // (n - 2)
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(rows)]))
+    values = conc[rows]
+    for reduce in (np.minimum, np.maximum):
+        hits = np.flatnonzero(values == reduce.reduceat(values, starts)[segment])
+        first = hits[np.r_[True, segment[hits][1:] != segment[hits][:-1]]]
+        keep[rows[first]] = True
+
+    kept = np.flatnonzero(keep)
+    downsampled = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner[kept], minlength=len(counts)), out=downsampled[1:])
+    return Curves(downsampled, np.asarray(curves.time)[kept], conc[kept])
+
+
+def build_pyramid(curves: Curves) -> dict[int, Curves]:
+    """Downsampled copies for every level some subject exceeds.
+
+    Each level is bucketed from the next finer one, so building the pyramid
+    reads the raw samples once.
+    """
+    pyramid: dict[int, Curves] = {}
+    for level in LEVELS:
+        if curves.longest <= level:
+            continue
+        curves = pyramid[level] = downsample(curves, level)
+    return pyramid
@@ -1,25 +1,160 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
 
+from app.blobs import BlobStore
 from app.config import settings
+from app.events import EventBus
+from app.ingest import ArrayStore
+from app.jobs import JobQueue
 from app.models import UserRecord
+from app.singleflight import CoalescingStore
 from app.storage import InMemoryStore, MongoStore, Storage
+from app.summaries import DrugSummaries
 
+logger = logging.getLogger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 _store: Storage | None = None
+_store_ready = False
+_blob_store: BlobStore | None = None
+_array_store: ArrayStore | None = None
+_drug_summaries: DrugSummaries | None = None
+_job_queue: JobQueue | None = None
+event_bus = EventBus(history=settings.events_history, buffer=settings.events_buffer)
 
 
-def get_store() -> Storage:
+def mongo_client_options() -> dict[str, Any]:
+    options: dict[str, Any] = {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "socketTimeoutMS": settings.mongo_socket_timeout_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+    }
+    if settings.mongo_compressors:
+        options["compressors"] = settings.mongo_compressors
+    return options
+
+
+def init_store() -> Storage:
+    """Build the store, create indexes and pre-warm its connections.
+
+    An unreachable backend does not fail startup: the store is returned
+    unprepared and ``store_ready`` stays false until ``prepare_store`` succeeds.
+    """
     global _store
     if _store is None:
         if settings.use_mongo:
-            _store = MongoStore(settings.mongo_uri, settings.mongo_db)
+            store: Storage = MongoStore(
+                settings.mongo_uri,
+                settings.mongo_db,
+                mongo_client_options(),
+                snapshot_interval=settings.version_snapshot_interval,
+                bus=event_bus,
+            )
         else:
-            _store = InMemoryStore()
+            store = InMemoryStore(snapshot_interval=settings.version_snapshot_interval, bus=event_bus)
+        if settings.single_flight_reads:
+            store = CoalescingStore(store)
+        _store = store
+        prepare_store()
+    return _store
+
+
+def prepare_store() -> bool:
+    """Create indexes and pre-warm connections; false while the backend is unreachable."""
+    global _store_ready
+    if _store is None:
+        return False
+    try:
+        _store.ensure_indexes()
+        _store.warm_up()
+    except Exception:  # noqa: BLE001 - retried by prepare_store_until_ready
+        logger.warning("Storage is unreachable, retrying in the background", exc_info=True)
+        return False
+    _store_ready = True
+    return True
+
+
+async def prepare_store_until_ready(interval: float) -> None:
+    while not _store_ready:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(prepare_store)
+
+
+def store_ready() -> bool:
+    return _store_ready
+
+
+def close_store() -> None:
+    global _store, _store_ready
+    if _store is not None:
+        _store.close()
+        _store = None
+    _store_ready = False
+
+
+def get_store() -> Storage:
+    if _store is None:
+        return init_store()
     return _store
 
 
+def get_blob_store() -> BlobStore:
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore(Path(settings.data_dir) / "blobs")
+    return _blob_store
+
+
+def get_array_store() -> ArrayStore:
+    global _array_store
+    if _array_store is None:
+        _array_store = ArrayStore(Path(settings.data_dir) / "arrays")
+    return _array_store
+
+
+def get_drug_summaries() -> DrugSummaries:
+    global _drug_summaries
+    if _drug_summaries is None:
+        _drug_summaries = DrugSummaries()
+    return _drug_summaries
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        arrays = get_array_store()
+        _job_queue = JobQueue(
+            get_store(),
+            get_blob_store(),
+            arrays,
+            Path(settings.data_dir) / "jobs",
+            workers=settings.job_workers,
+            heartbeat_interval=settings.job_heartbeat_seconds,
+            on_dataset_updated=lambda dataset: get_drug_summaries().refresh(dataset, arrays),
+        )
+    return _job_queue
+
+
+def close_job_queue() -> None:
+    global _job_queue
+    if _job_queue is not None:
+        _job_queue.close()
+        _job_queue = None
+
+
+def get_event_bus() -> EventBus:
+    return event_bus
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     store: Storage = Depends(get_store),
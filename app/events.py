@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from threading import Lock
+
+# Topic every dataset event is also published to, for admin-wide feeds.
+ALL_DATASETS = "datasets"
+
+
+def dataset_topic(dataset_id: str) -> str:
+    return f"dataset:{dataset_id}"
+
+
+def owner_topic(owner_id: str) -> str:
+    return f"owner:{owner_id}"
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    topics: frozenset[str]
+    name: str
+    data: str
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.name}\ndata: {self.data}\n\n"
+
+
+class Subscription:
+    """A subscriber's bounded event buffer, bound to its event loop.
+
+    When the buffer overflows the subscription is closed instead of dropping
+    events silently; the client reconnects with ``Last-Event-ID`` and resumes
+    from the bus history.
+    """
+
+    def __init__(self, topics: frozenset[str], buffer: int) -> None:
+        self.topics = topics
+        self.missed = False
+        self.closed = False
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[Event | None] = asyncio.Queue()
+        self._buffer = buffer
+
+    def _deliver(self, event: Event | None) -> None:
+        if self.closed:
+            return
+        if event is not None and self._queue.qsize() >= self._buffer:
+            event = None
+        if event is None:
+            self.closed = True
+        self._queue.put_nowait(event)
+
+    def _replay(self, event: Event) -> None:
+        # History replay is bounded by the bus history, not the live buffer.
+        self._queue.put_nowait(event)
+
+    def push(self, event: Event) -> None:
+        """Thread-safe hand-off from the publishing thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, event)
+        except RuntimeError:
+            # The subscriber's loop has shut down.
+            self.closed = True
+
+    async def get(self) -> Event | None:
+        """Next event, or ``None`` once the subscription has been closed."""
+        return await self._queue.get()
+
+
+class EventBus:
+    """In-process fan-out of store events to SSE subscribers.
+
+    Event ids are process-wide and increasing; the most recent ``history``
+    events are retained so reconnecting clients can resume after their last id.
+    """
+
+    def __init__(self, history: int = 1000, buffer: int = 256) -> None:
+        self._lock = Lock()
+        self._next_id = 1
+        self._history: deque[Event] = deque(maxlen=history)
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._buffer = buffer
+
+    def publish(self, topics: set[str], name: str, data: str) -> Event:
+        with self._lock:
+            event = Event(self._next_id, frozenset(topics), name, data)
+            self._next_id += 1
+            self._history.append(event)
+            targets = {sub for topic in topics for sub in self._subscribers.get(topic, ())}
+        for subscription in targets:
+            subscription.push(event)
+        return event
+
+    def subscribe(self, topics: set[str], last_event_id: int | None = None) -> Subscription:
+        """Register a subscriber, replaying history newer than ``last_event_id``.
+
+        Must be called from the subscriber's event loop.
+        """
+        subscription = Subscription(frozenset(topics), self._buffer)
+        with self._lock:
+            if last_event_id is not None:
+                oldest = self._history[0].id if self._history else self._next_id
+                # Ids from the future come from before a restart of this process.
+                subscription.missed = last_event_id < oldest - 1 or last_event_id >= self._next_id
+                for event in self._history:
+                    if event.id > last_event_id and event.topics & subscription.topics:
+                        subscription._replay(event)
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.closed = True
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
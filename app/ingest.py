@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import csv
+import os
+import re
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import mkdtemp
+
+import numpy as np
+
+from app.curves import LEVELS, Curves, build_pyramid
+
+PK_DATASET_TYPE = "pk"
+
+# Conversion factors into the canonical units: h, mg/L and mg.
+UNITS: dict[str, dict[str, float]] = {
+    "time": {"h": 1.0, "min": 1 / 60, "d": 24.0},
+    "concentration": {"mg/l": 1.0, "ug/ml": 1.0, "ng/ml": 1e-3, "ug/l": 1e-3},
+    "dose": {"mg": 1.0, "ug": 1e-3, "g": 1e3},
+}
+ALIASES: dict[str, str] = {
+    "subject": "subject",
+    "subject_id": "subject",
+    "id": "subject",
+    "time": "time",
+    "t": "time",
+    "concentration": "concentration",
+    "conc": "concentration",
+    "dv": "concentration",
+    "dose": "dose",
+    "amt": "dose",
+}
+_HEADER = re.compile(r"^\s*(?P<name>[^\[(]+?)\s*(?:[\[(]\s*(?P<unit>[^\])]*?)\s*[\])])?\s*$")
+_COLUMNS = ("subject", "time", "concentration", "dose")
+
+
+class IngestError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class PKArrays:
+    """Concentration-time samples as typed columns, grouped by subject.
+
+    Rows of subject ``i`` are ``offsets[i]:offsets[i + 1]`` and are ordered by
+    time. Times are in h, concentrations in mg/L and doses in mg.
+    """
+
+    subjects: np.ndarray
+    offsets: np.ndarray
+    subject: np.ndarray
+    time: np.ndarray
+    concentration: np.ndarray
+    dose: np.ndarray
+
+    @property
+    def n_subjects(self) -> int:
+        return len(self.subjects)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.time)
+
+    def subject_slice(self, index: int) -> slice:
+        return slice(int(self.offsets[index]), int(self.offsets[index + 1]))
+
+    def curves(self) -> Curves:
+        return Curves(self.offsets, self.time, self.concentration)
+
+
+def _parse_header(fields: list[str]) -> dict[str, tuple[int, float]]:
+    columns: dict[str, tuple[int, float]] = {}
+    for index, raw in enumerate(fields):
+        match = _HEADER.match(raw)
+        role = ALIASES.get(match.group("name").lower()) if match else None
+        if role is None:
+            continue
+        unit = (match.group("unit") or "").lower()
+        factor = 1.0
+        if role in UNITS and unit:
+            if unit not in UNITS[role]:
+                raise IngestError(f"Unsupported {role} unit '{match.group('unit')}'")
+            factor = UNITS[role][unit]
+        columns[role] = (index, factor)
+    missing = [name for name in _COLUMNS[:3] if name not in columns]
+    if missing:
+        raise IngestError(f"Missing required column(s): {', '.join(missing)}")
+    return columns
+
+
+def _floats(role: str, cells: list[str]) -> np.ndarray:
+    # Empty cells are missing values, e.g. a dose given only on a subject's first row.
+    cells = [cell if cell.strip() else "nan" for cell in cells]
+    try:
+        return np.array(cells).astype(np.float64)
+    except ValueError:
+        bad = next(cell for cell in cells if not _is_float(cell))
+        raise IngestError(f"Invalid {role} value '{bad}'") from None
+
+
+def _is_float(cell: str) -> bool:
+    try:
+        float(cell)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_csv(path: Path) -> PKArrays:
+    """Parse a concentration-time CSV into validated column arrays.
+
+    Fields may be quoted, as in R and pandas exports; empty numeric cells
+    are read as NaN.
+    """
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as handle:
+            reader = csv.reader(handle)
+            columns = _parse_header(next(reader, []))
+            roles = [role for role in _COLUMNS if role in columns]
+            cells: list[list[str]] = [[] for _ in roles]
+            for row in reader:
+                if not any(row):
+                    continue
+                try:
+                    for column, role in zip(cells, roles):
+                        column.append(row[columns[role][0]])
+                except IndexError:
+                    raise IngestError(f"Line {reader.line_num} has too few columns") from None
+    except UnicodeDecodeError as exc:
+        raise IngestError("File is not UTF-8 encoded text") from exc
+    except csv.Error as exc:
+        raise IngestError(f"Malformed CSV: {exc}") from exc
+    labels = np.array(cells[0], dtype=str)
+    if len(labels) == 0:
+        raise IngestError("File contains no samples")
+
+    numeric = roles[1:]
+    values = np.column_stack([_floats(role, column) for role, column in zip(numeric, cells[1:])])
+    values *= np.array([columns[role][1] for role in numeric])
+    time = values[:, 0]
+    concentration = values[:, 1]
+    dose = values[:, 2] if "dose" in columns else np.full(len(time), np.nan)
+    if not np.isfinite(time).all():
+        raise IngestError("Times must be finite")
+    if not (np.isfinite(concentration) & (concentration >= 0)).all():
+        raise IngestError("Concentrations must be finite and non-negative")
+    if (dose < 0).any():
+        raise IngestError("Doses must be non-negative")
+
+    subjects, codes = np.unique(labels, return_inverse=True)
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order].astype(np.int32)
+    time = time[order]
+    same_subject = codes[1:] == codes[:-1]
+    decreasing = same_subject & (np.diff(time) <= 0)
+    if decreasing.any():
+        bad = subjects[codes[np.argmax(decreasing)]]
+        raise IngestError(f"Times must be strictly increasing within subject '{bad}'")
+    offsets = np.zeros(len(subjects) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(subjects)), out=offsets[1:])
+    return PKArrays(
+        subjects=subjects,
+        offsets=offsets,
+        subject=codes,
+        time=np.ascontiguousarray(time),
+        concentration=np.ascontiguousarray(concentration[order]),
+        dose=np.ascontiguousarray(dose[order]),
+    )
+
+
+class ArrayStore:
+    """Parsed column arrays persisted as ``.npy`` files, one directory per key.
+
+    Next to the columns each directory holds the downsampled curve pyramid,
+    ``curves-<level>-<column>.npy``, built once when the arrays are saved, and
+    derived results such as NCA parameters in named subdirectories.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return (self.path_for(key) / "offsets.npy").is_file()
+
+    def save(self, key: str, arrays: PKArrays) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(mkdtemp(dir=self.root, prefix=".staging-"))
+        try:
+            for name in ("subjects", "offsets", "subject", "time", "concentration", "dose"):
+                np.save(staging / f"{name}.npy", getattr(arrays, name))
+            for level, curves in build_pyramid(arrays.curves()).items():
+                for name in ("offsets", "time", "concentration"):
+                    np.save(staging / f"curves-{level}-{name}.npy", getattr(curves, name))
+            os.replace(staging, self.path_for(key))
+        except OSError:
+            # A concurrent ingest of the same file won the rename.
+            if not self.exists(key):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def load(self, key: str) -> PKArrays:
+        directory = self.path_for(key)
+        return PKArrays(
+            **{
+                name: np.load(directory / f"{name}.npy", mmap_mode="r")
+                for name in ("subjects", "offsets", "subject", "time", "concentration", "dose")
+            }
+        )
+
+    def save_derived(self, key: str, name: str, columns: dict[str, np.ndarray]) -> None:
+        """Store columns computed from the arrays of ``key`` under ``name``."""
+        target = self.path_for(key) / name
+        staging = Path(mkdtemp(dir=self.path_for(key), prefix=".staging-"))
+        try:
+            for column, values in columns.items():
+                np.save(staging / f"{column}.npy", values)
+            os.replace(staging, target)
+        except OSError:
+            # Another process stored the same result first.
+            if not target.is_dir():
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def load_derived(self, key: str, name: str, columns: tuple[str, ...]) -> dict[str, np.ndarray] | None:
+        directory = self.path_for(key) / name
+        if not directory.is_dir():
+            return None
+        return {column: np.load(directory / f"{column}.npy", mmap_mode="r") for column in columns}
+
+    def load_curves(self, key: str, points: int) -> Curves:
+        """The coarsest stored curves with at least ``points`` samples per subject.
+
+        Falls back to the raw samples when no pyramid level is that fine,
+        which also covers arrays saved before pyramids were built.
+        """
+        directory = self.path_for(key)
+        for level in reversed(LEVELS):
+            if level >= points and (directory / f"curves-{level}-offsets.npy").is_file():
+                return Curves(
+                    *(
+                        np.load(directory / f"curves-{level}-{name}.npy", mmap_mode="r")
+                        for name in ("offsets", "time", "concentration")
+                    )
+                )
+        return self.load(key).curves()
+
+    def ingest(self, key: str, path: Path) -> PKArrays:
+        """Parse ``path`` unless arrays for ``key`` already exist, then map them."""
+        if not self.exists(key):
+            self.save(key, parse_csv(path))
+        return self.load(key)
@@ -0,0 +1,428 @@
+"""Background jobs run in a local process pool.
+
+Job records live in the store, so state and progress survive restarts. Workers
+report progress and their outcome over a single queue that one thread in the
+API process drains, which keeps every state transition of a job in order.
+Cancellation is cooperative: a queued job is dropped from the pool, a running
+one stops at its next progress report. Results too large to keep in the job
+record are written to a file under the queue's root.
+
+Several API processes may share a store. Each job is owned by the queue that
+runs it, which refreshes the job's heartbeat; a job whose heartbeat goes stale,
+e.g. because its process died, is claimed by another queue with a guarded
+update and re-run there.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Any
+from uuid import uuid4
+
+from app.blobs import BlobStore
+from app.ingest import PK_DATASET_TYPE, ArrayStore
+from app.models import DatasetRecord, JobRecord, NCARequest
+from app.nca import compute_cached
+from app.unit_of_work import DuplicateJob, StorageConflict
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+FINISHED = ("succeeded", "failed", "cancelled")
+# Larger results go to a file; MongoDB documents are capped at 16 MB.
+INLINE_RESULT_BYTES = 1 << 20
+
+
+class JobRejected(ValueError):
+    """The dataset cannot run the requested job."""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_params(kind: str, dataset: DatasetRecord, params: dict[str, Any]) -> dict[str, Any]:
+    """Validate ``params`` and pin the dataset inputs the job will read."""
+    if kind == "ingest":
+        if dataset.dataset_type != PK_DATASET_TYPE or not dataset.file_sha256:
+            raise JobRejected("Ingest jobs need a pk dataset with an uploaded file")
+        return {"digest": dataset.file_sha256}
+    if not dataset.arrays_id:
+        raise JobRejected("Dataset has no parsed PK data")
+    return {**NCARequest(**params).model_dump(), "arrays_id": dataset.arrays_id}
+
+
+def job_key(dataset: DatasetRecord, kind: str, params: dict[str, Any]) -> str:
+    """Identical jobs on the same dataset version share a key."""
+    payload = json.dumps([dataset.id, dataset.version, kind, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Worker side. The event queue is inherited through the pool initializer.
+_events: Any = None
+
+
+def _init_worker(events: Any) -> None:
+    global _events
+    _events = events
+
+
+def _ingest(payload: dict[str, Any], progress: Callable[[float], None]) -> dict[str, Any]:
+    store = ArrayStore(Path(payload["arrays_root"]))
+    progress(0.1)
+    arrays = store.ingest(payload["digest"], Path(payload["blob_path"]))
+    progress(0.6)
+    # Drug summaries read the default NCA of every parsed file; compute it
+    # here rather than in the API process.
+    compute_cached(store, payload["digest"])
+    progress(0.9)
+    return {"arrays_id": payload["digest"], "subjects": arrays.n_subjects, "rows": arrays.n_rows}
+
+
+def _nca(payload: dict[str, Any], progress: Callable[[float], None]) -> dict[str, Any]:
+    store = ArrayStore(Path(payload["arrays_root"]))
+    progress(0.2)
+    # Cached next to the arrays, where ``POST /datasets/{id}/nca`` finds it.
+    result = compute_cached(store, payload["arrays_id"], payload["method"], payload["lambda_z_points"])
+    progress(0.9)
+    return {"arrays_id": payload["arrays_id"], **result.columns()}
+
+
+TASKS: dict[str, Callable[[dict[str, Any], Callable[[float], None]], dict[str, Any]]] = {
+    "ingest": _ingest,
+    "nca": _nca,
+}
+
+
+def _outcome(result: dict[str, Any], path: Path, inline_bytes: int) -> dict[str, Any]:
+    """The job record fields holding ``result``: inline, or a file under the queue root."""
+    encoded = json.dumps(result)
+    if len(encoded) <= inline_bytes:
+        return {"result": result}
+    staging = path.with_suffix(".tmp")
+    staging.write_text(encoded)
+    os.replace(staging, path)
+    return {"result_file": path.name}
+
+
+def _run(
+    job_id: str, kind: str, payload: dict[str, Any], cancel_marker: str, result_path: str, inline_bytes: int
+) -> None:
+    def progress(fraction: float) -> None:
+        if os.path.exists(cancel_marker):
+            raise JobCancelled()
+        _events.put(("progress", job_id, fraction))
+
+    try:
+        progress(0.0)
+        outcome = _outcome(TASKS[kind](payload, progress), Path(result_path), inline_bytes)
+    except JobCancelled:
+        _events.put(("cancelled", job_id, None))
+    except Exception as exc:  # noqa: BLE001 - reported as the job's error
+        _events.put(("failed", job_id, f"{type(exc).__name__}: {exc}"))
+    else:
+        _events.put(("succeeded", job_id, outcome))
+
+
+class JobQueue:
+    """Submits jobs to a process pool and records their progress in the store.
+
+    Every ``heartbeat_interval`` seconds the queue refreshes the heartbeat of
+    the jobs it owns and claims jobs whose heartbeat is older than three
+    intervals.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        blobs: BlobStore,
+        arrays: ArrayStore,
+        root: Path,
+        workers: int = 2,
+        on_dataset_updated: Callable[[DatasetRecord], None] | None = None,
+        inline_result_bytes: int = INLINE_RESULT_BYTES,
+        heartbeat_interval: float = 10.0,
+    ) -> None:
+        self.store = store
+        self.blobs = blobs
+        self.arrays = arrays
+        self.root = root
+        self.workers = workers
+        self.inline_result_bytes = inline_result_bytes
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._on_dataset_updated = on_dataset_updated
+        self._lock = Lock()
+        self._context: Any = None
+        self._executor: ProcessPoolExecutor | None = None
+        self._events: Any = None
+        self._drainer: Thread | None = None
+        self._heartbeat: Thread | None = None
+        self._stopped = Event()
+        self._futures: dict[str, Future[None]] = {}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                return
+            (self.root / "results").mkdir(parents=True, exist_ok=True)
+            # Workers are spawned rather than forked: the API process runs threads.
+            self._context = multiprocessing.get_context("spawn")
+            self._events = self._context.Queue()
+            self._executor = self._new_executor()
+            self._drainer = Thread(target=self._drain, name="job-events", daemon=True)
+            self._drainer.start()
+            self._stopped.clear()
+            self._heartbeat = Thread(target=self._beat, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+        try:
+            self._recover()
+        except Exception:  # noqa: BLE001 - the storage may still be coming up
+            logger.exception("Job recovery failed, retrying on the next heartbeat")
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        self._stopped.set()
+        self._heartbeat.join()
+        executor.shutdown(wait=True, cancel_futures=True)
+        self._events.put(None)
+        self._drainer.join()
+        self._events.close()
+
+    def submit(
+        self, dataset: DatasetRecord, kind: str, params: dict[str, Any], actor_id: str
+    ) -> tuple[JobRecord, bool]:
+        """Queue a job; returns the job and whether it was newly created.
+
+        An identical job already queued, running or finished for the same
+        dataset version is returned instead of starting another.
+        """
+        self.start()
+        params = job_params(kind, dataset, params)
+        key = job_key(dataset, kind, params)
+        while True:
+            job = JobRecord(
+                id=str(uuid4()),
+                dataset_id=dataset.id,
+                dataset_version=dataset.version,
+                kind=kind,
+                params=params,
+                submitted_by=actor_id,
+                owner=self.owner,
+                heartbeat_at=datetime.utcnow(),
+                active_key=key,
+            )
+            try:
+                with self.store.unit_of_work() as uow:
+                    uow.create_job(job)
+                    uow.create_audit_log(dataset.id, actor_id, "submit_job", {"job_id": job.id, "kind": kind})
+            except DuplicateJob:
+                existing = self.store.get_job_by_key(key)
+                if existing is not None:
+                    return existing, False
+                # The duplicate finished unsuccessfully in the meantime.
+                continue
+            return self._dispatch(job), True
+
+    def cancel(self, job: JobRecord, actor_id: str) -> JobRecord:
+        if job.status in FINISHED:
+            return job
+        future = self._futures.get(job.id)
+        if job.status == "queued" and future is not None and future.cancel():
+            return self._finish(job, "cancelled", None, actor_id)
+        # The job may run in another process; its worker checks the marker.
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._cancel_marker(job.id).touch()
+        return self.store.update_job(job.id, {"cancel_requested": True}) or job
+
+    def result_path(self, job_id: str) -> Path:
+        """Where the result of ``job_id`` is stored when it is too large for the job record."""
+        return self.root / "results" / f"{job_id}.json"
+
+    def _cancel_marker(self, job_id: str) -> Path:
+        return self.root / f"{job_id}.cancel"
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            self.workers, mp_context=self._context, initializer=_init_worker, initargs=(self._events,)
+        )
+
+    def _submit(self, *args: Any) -> Future[None]:
+        with self._lock:
+            if self._executor is None:
+                raise RuntimeError("Job queue is closed")
+            try:
+                return self._executor.submit(_run, *args)
+            except BrokenProcessPool:
+                # A worker died abruptly. The jobs it took down fail through
+                # ``_settled``; new ones get a fresh pool.
+                logger.warning("Job worker pool broke, starting a new one")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+                return self._executor.submit(_run, *args)
+
+    def _dispatch(self, job: JobRecord) -> JobRecord:
+        try:
+            payload = {
+                **job.params,
+                "arrays_root": str(self.arrays.root),
+                "blob_path": str(self.blobs.path_for(job.params["digest"])) if job.kind == "ingest" else None,
+            }
+            future = self._submit(
+                job.id,
+                job.kind,
+                payload,
+                str(self._cancel_marker(job.id)),
+                str(self.result_path(job.id)),
+                self.inline_result_bytes,
+            )
+        except Exception as exc:  # noqa: BLE001 - recorded as the job's error
+            logger.exception("Failed to start job %s", job.id)
+            return self._finish(job, "failed", f"Could not start job: {exc}", job.submitted_by)
+        self._futures[job.id] = future
+        future.add_done_callback(lambda done: self._settled(job.id, done))
+        return job
+
+    def _settled(self, job_id: str, future: Future[None]) -> None:
+        self._futures.pop(job_id, None)
+        if future.cancelled() or future.exception() is None:
+            return
+        # The worker died before it could report, e.g. a broken pool.
+        self._events.put(("failed", job_id, f"Worker failed: {future.exception()}"))
+
+    def _beat(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self._send_heartbeats()
+                self._recover()
+            except Exception:  # noqa: BLE001 - keep beating across backend hiccups
+                logger.exception("Job heartbeat failed")
+
+    def _send_heartbeats(self) -> None:
+        now = datetime.utcnow()
+        for job_id in list(self._futures):
+            try:
+                self.store.update_job(job_id, {"heartbeat_at": now}, expected={"owner": self.owner})
+            except StorageConflict:
+                # Another queue took the job over; its outcome is recorded there.
+                logger.warning("Job %s was claimed by another queue", job_id)
+                future = self._futures.pop(job_id, None)
+                if future is not None:
+                    future.cancel()
+
+    def _recover(self) -> None:
+        """Claim and re-run active jobs whose owner stopped sending heartbeats."""
+        stale_before = datetime.utcnow() - timedelta(seconds=3 * self.heartbeat_interval)
+        for job in self.store.list_jobs(ACTIVE):
+            if job.id in self._futures or (job.heartbeat_at is not None and job.heartbeat_at > stale_before):
+                continue
+            claimed = self._claim(job)
+            if claimed is None:
+                continue
+            if claimed.cancel_requested:
+                self._finish(claimed, "cancelled", None, claimed.submitted_by)
+                continue
+            self._dispatch(claimed)
+
+    def _claim(self, job: JobRecord) -> JobRecord | None:
+        """Take ``job`` over unless another queue changed its owner or heartbeat since it was read."""
+        changes = {"status": "queued", "progress": 0.0, "owner": self.owner, "heartbeat_at": datetime.utcnow()}
+        try:
+            with self.store.unit_of_work() as uow:
+                return uow.update_job(job, changes, expected={"owner": job.owner, "heartbeat_at": job.heartbeat_at})
+        except StorageConflict:
+            return None
+
+    def _drain(self) -> None:
+        while (event := self._events.get()) is not None:
+            name, job_id, value = event
+            try:
+                self._handle(name, job_id, value)
+            except Exception as exc:  # noqa: BLE001 - keep draining other jobs' events
+                logger.exception("Failed to record %s for job %s", name, job_id)
+                if name != "progress":
+                    self._fail(job_id, f"Could not record job outcome: {exc}")
+
+    def _handle(self, name: str, job_id: str, value: Any) -> None:
+        job = self.store.get_job(job_id)
+        if job is None or job.status in FINISHED or job.owner != self.owner:
+            return
+        if name == "progress":
+            changes: dict[str, Any] = {"progress": value}
+            if job.status == "queued":
+                changes["status"] = "running"
+            try:
+                self.store.update_job(job_id, changes, expected={"owner": self.owner})
+            except StorageConflict:
+                pass
+            return
+        self._finish(job, name, value, job.submitted_by)
+
+    def _fail(self, job_id: str, error: str) -> None:
+        """Mark a job failed when its outcome could not be recorded, so it is not left active."""
+        try:
+            self.store.update_job(
+                job_id, {"status": "failed", "error": error, "active_key": None}, expected={"owner": self.owner}
+            )
+        except Exception:  # noqa: BLE001 - the drain thread must keep running
+            logger.exception("Failed to mark job %s failed", job_id)
+        self._cancel_marker(job_id).unlink(missing_ok=True)
+        self.result_path(job_id).unlink(missing_ok=True)
+
+    def _finish(self, job: JobRecord, status: str, value: Any, actor_id: str) -> JobRecord:
+        changes: dict[str, Any] = {"status": status}
+        if status == "succeeded":
+            # ``value`` holds either ``result`` or ``result_file``.
+            changes.update(progress=1.0, **value)
+        else:
+            # Release the dedup key so the job can be submitted again.
+            changes["active_key"] = None
+            if status == "failed":
+                changes["error"] = value
+        while True:
+            dataset = None
+            try:
+                with self.store.unit_of_work() as uow:
+                    finished = uow.update_job(job, changes, expected={"owner": self.owner})
+                    if status == "succeeded" and job.kind == "ingest":
+                        dataset = self._attach_arrays(uow, job)
+                    uow.create_audit_log(
+                        job.dataset_id,
+                        actor_id,
+                        "complete_job",
+                        {"job_id": job.id, "kind": job.kind, "status": status},
+                    )
+            except StorageConflict:
+                # Either the dataset changed under ``_attach_arrays`` or the
+                # job was claimed by another queue, which then records it.
+                current = self.store.get_job(job.id)
+                if current is None or current.owner != self.owner or current.status in FINISHED:
+                    return current or job
+                continue
+            break
+        self._cancel_marker(job.id).unlink(missing_ok=True)
+        if dataset is not None and self._on_dataset_updated is not None:
+            self._on_dataset_updated(dataset)
+        return finished
+
+    def _attach_arrays(self, uow: Any, job: JobRecord) -> DatasetRecord | None:
+        # Arrays are stored under the digest of the file they were parsed from.
+        arrays_id = job.params["digest"]
+        dataset = self.store.get_dataset(job.dataset_id)
+        # Only if the file the job parsed is still the dataset's file.
+        if dataset is None or dataset.file_sha256 != job.params["digest"] or dataset.arrays_id == arrays_id:
+            return None
+        return uow.update_dataset(dataset, {"arrays_id": arrays_id})
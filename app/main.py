@@ -1,14 +1,71 @@
-from fastapi import FastAPI
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
 
-from app.routers import auth, datasets, roles
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse
 
-app = FastAPI(title="PKDB Codex", version="0.1.0")
+from app.admission import AdmissionMiddleware, size_threadpool
+from app.config import settings
+from app.deps import (
+    close_job_queue,
+    close_store,
+    get_job_queue,
+    get_store,
+    init_store,
+    prepare_store_until_ready,
+    store_ready,
+)
+from app.routers import auth, datasets, drugs, events, jobs, roles, stats
+from app.stats import reconcile_periodically
+from app.storage import Storage
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    size_threadpool()
+    store = init_store()
+    tasks = []
+    if not store_ready():
+        # Serve /health and a 503 /ready until the backend comes up.
+        tasks.append(asyncio.create_task(prepare_store_until_ready(settings.store_retry_seconds)))
+    # Takes over jobs whose process stopped sending heartbeats.
+    get_job_queue().start()
+    if settings.stats_reconcile_interval_seconds > 0:
+        tasks.append(
+            asyncio.create_task(reconcile_periodically(store, settings.stats_reconcile_interval_seconds))
+        )
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    close_job_queue()
+    close_store()
+
+
+app = FastAPI(title="PKDB Codex", version="0.1.0", lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware)
 
 app.include_router(auth.router)
 app.include_router(datasets.router)
+app.include_router(drugs.router)
+app.include_router(events.router)
+app.include_router(jobs.router)
 app.include_router(roles.router)
+app.include_router(stats.router)
 
 
 @app.get("/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready(store: Storage = Depends(get_store)) -> JSONResponse:
+    report = store.health()
+    if not store_ready():
+        return JSONResponse(status_code=503, content={"status": "starting", "storage": report})
+    if not report.get("ok"):
+        return JSONResponse(status_code=503, content={"status": "unavailable", "storage": report})
+    return JSONResponse(content={"status": "ready", "storage": report})
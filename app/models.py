@@ -1,5 +1,7 @@
 from datetime import datetime
 from enum import Enum
+from typing import Any, Literal
+
 from pydantic import BaseModel, Field, EmailStr
 
 
@@ -53,12 +55,30 @@ class DatasetRecord(BaseModel):
     dataset_type: str
     metadata: dict
     file_name: str | None
+    file_sha256: str | None = None
+    file_size: int | None = None
+    arrays_id: str | None = None
     owner_id: str
     locked: bool = False
+    version: int = 1
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class DatasetVersionRecord(BaseModel):
+    dataset_id: str
+    version: int
+    snapshot: dict | None = None
+    patch: list[dict] | None = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class PatchOperation(BaseModel):
+    op: Literal["add", "remove", "replace"]
+    path: str
+    value: Any = None
+
+
 class AccessRequestCreate(BaseModel):
     reason: str
 
@@ -93,3 +113,103 @@ class AuditLogRecord(BaseModel):
     action: str
     details: dict = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class NCARequest(BaseModel):
+    method: Literal["linear", "log"] = "linear"
+    lambda_z_points: int = Field(default=3, ge=2, le=20)
+
+
+class NCAReport(BaseModel):
+    dataset_id: str
+    arrays_id: str
+    method: Literal["linear", "log"]
+    lambda_z_points: int
+    subjects: list[str]
+    cmax: list[float | None]
+    tmax: list[float | None]
+    auc_0_t: list[float | None]
+    auc_inf: list[float | None]
+    lambda_z: list[float | None]
+    half_life: list[float | None]
+    clearance: list[float | None]
+
+
+class CurvesReport(BaseModel):
+    dataset_id: str
+    arrays_id: str
+    points: int
+    subjects: list[str]
+    time: list[list[float]]
+    concentration: list[list[float]]
+
+
+class ExposureStats(BaseModel):
+    mean: float | None = None
+    p5: float | None = None
+    p50: float | None = None
+    p95: float | None = None
+
+
+class StudySummary(BaseModel):
+    study_id: str
+    datasets: int
+    subjects: int
+    cmax: ExposureStats
+    auc_0_t: ExposureStats
+
+
+class DrugSummary(BaseModel):
+    drug_name: str
+    datasets: int
+    subjects: int
+    cmax: ExposureStats
+    auc_0_t: ExposureStats
+    studies: list[StudySummary]
+
+
+class StatsReport(BaseModel):
+    datasets: int
+    locked: int
+    unlocked: int
+    by_dataset_type: dict[str, int]
+    by_drug_name: dict[str, int]
+    by_owner: dict[str, int]
+    pending_access_requests: int
+    pending_role_requests: int
+
+
+JobKind = Literal["ingest", "nca"]
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+
+
+class JobCreate(BaseModel):
+    dataset_id: str
+    kind: JobKind
+    params: dict[str, Any] = Field(default_factory=dict)
+
+
+class JobRecord(BaseModel):
+    id: str
+    dataset_id: str
+    dataset_version: int
+    kind: JobKind
+    params: dict[str, Any] = Field(default_factory=dict)
+    status: JobStatus = "queued"
+    progress: float = 0.0
+    result: dict[str, Any] | None = None
+    # Set instead of ``result`` when the result is too large to store inline;
+    # it is served by ``GET /jobs/{id}/result``.
+    result_file: str | None = None
+    error: str | None = None
+    submitted_by: str
+    cancel_requested: bool = False
+    # The job queue running the job and when it last said so. A job whose
+    # heartbeat has gone stale is taken over by another queue.
+    owner: str | None = None
+    heartbeat_at: datetime | None = None
+    # Dedup key while the job is queued, running or succeeded; cleared when it
+    # fails or is cancelled so an identical job can be submitted again.
+    active_key: str | None = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
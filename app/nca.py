@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Literal
+
+import numpy as np
+
+from app.ingest import ArrayStore, PKArrays
+
+Method = Literal["linear", "log"]
+PARAMETERS = ("cmax", "tmax", "auc_0_t", "auc_inf", "lambda_z", "half_life", "clearance")
+
+
+@dataclass(frozen=True)
+class NCAResult:
+    """Per-subject non-compartmental parameters, one array entry per subject.
+
+    Parameters that cannot be estimated (e.g. too few terminal points) are NaN.
+    """
+
+    subjects: np.ndarray
+    cmax: np.ndarray
+    tmax: np.ndarray
+    auc_0_t: np.ndarray
+    auc_inf: np.ndarray
+    lambda_z: np.ndarray
+    half_life: np.ndarray
+    clearance: np.ndarray
+
+    def columns(self) -> dict[str, list]:
+        """JSON-ready columns, with NaN reported as ``None``."""
+        columns: dict[str, list] = {"subjects": self.subjects.tolist()}
+        for name in PARAMETERS:
+            columns[name] = [None if value != value else value for value in getattr(self, name).tolist()]
+        return columns
+
+
+def compute(arrays: PKArrays, method: Method = "linear", lambda_z_points: int = 3) -> NCAResult:
+    """Compute NCA parameters for every subject with grouped array reductions.
+
+    ``method="log"`` applies the linear-up/log-down trapezoidal rule; the
+    terminal slope is a log-linear fit over the last ``lambda_z_points``
+    positive samples after Tmax.
+    """
+    n = arrays.n_subjects
+    time = np.asarray(arrays.time)
+    conc = np.asarray(arrays.concentration)
+    codes = np.asarray(arrays.subject)
+    starts = np.asarray(arrays.offsets[:-1])
+    ends = np.asarray(arrays.offsets[1:])
+    rows = np.arange(len(conc))
+
+    cmax = np.maximum.reduceat(conc, starts)
+    tmax_index = np.minimum.reduceat(np.where(conc == cmax[codes], rows, len(conc)), starts)
+    tmax = time[tmax_index]
+
+    same_subject = codes[1:] == codes[:-1]
+    dt = np.diff(time)
+    c1, c2 = conc[:-1], conc[1:]
+    area = dt * (c1 + c2) / 2
+    if method == "log":
+        descending = same_subject & (c2 < c1) & (c2 > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_area = dt * (c1 - c2) / np.log(c1 / c2)
+        area = np.where(descending, log_area, area)
+    auc_0_t = np.bincount(codes[:-1][same_subject], weights=area[same_subject], minlength=n)
+
+    # Terminal phase: accumulate regression sums over a fixed trailing window,
+    # one vector step per window position rather than one per subject.
+    count = np.zeros(n)
+    sx = np.zeros(n)
+    sy = np.zeros(n)
+    sxx = np.zeros(n)
+    sxy = np.zeros(n)
+    for back in range(1, lambda_z_points + 1):
+        index = ends - back
+        usable = (index > tmax_index) & (index >= starts)
+        index = np.where(usable, index, 0)
+        x = time[index]
+        y = conc[index]
+        usable &= y > 0
+        with np.errstate(divide="ignore"):
+            y = np.where(usable, np.log(np.where(usable, y, 1.0)), 0.0)
+        x = np.where(usable, x, 0.0)
+        count += usable
+        sx += x
+        sy += y
+        sxx += x * x
+        sxy += x * y
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (count * sxy - sx * sy) / (count * sxx - sx * sx)
+    lambda_z = np.where((count >= 2) & (slope < 0), -slope, np.nan)
+
+    clast = conc[ends - 1]
+    auc_inf = auc_0_t + clast / lambda_z
+    dose = np.fmax.reduceat(np.asarray(arrays.dose), starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        clearance = np.where(auc_inf > 0, dose / auc_inf, np.nan)
+    return NCAResult(
+        subjects=np.asarray(arrays.subjects),
+        cmax=cmax,
+        tmax=tmax,
+        auc_0_t=auc_0_t,
+        auc_inf=auc_inf,
+        lambda_z=lambda_z,
+        half_life=np.log(2) / lambda_z,
+        clearance=clearance,
+    )
+
+
+def compute_cached(
+    store: ArrayStore, arrays_id: str, method: Method = "linear", lambda_z_points: int = 3
+) -> NCAResult:
+    """``compute`` stored next to the parsed file's arrays, which never change.
+
+    Results are kept on disk and memory-mapped, so they do not accumulate in
+    the API process.
+    """
+    result = load_cached(store, arrays_id, method, lambda_z_points)
+    if result is None:
+        result = compute(store.load(arrays_id), method, lambda_z_points)
+        store.save_derived(
+            arrays_id, _cache_name(method, lambda_z_points), {name: getattr(result, name) for name in PARAMETERS}
+        )
+    return result
+
+
+def load_cached(
+    store: ArrayStore, arrays_id: str, method: Method = "linear", lambda_z_points: int = 3
+) -> NCAResult | None:
+    """The stored result of ``compute_cached``, or ``None`` if it was not computed yet."""
+    columns = store.load_derived(arrays_id, _cache_name(method, lambda_z_points), PARAMETERS)
+    if columns is None:
+        return None
+    return NCAResult(subjects=np.asarray(store.load(arrays_id).subjects), **columns)
+
+
+def _cache_name(method: Method, lambda_z_points: int) -> str:
+    return f"nca-{method}-{lambda_z_points}"
@@ -1,17 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+from starlette.concurrency import run_in_threadpool
 
 from app.auth import require_role
-from app.deps import get_current_user, get_store
+from app.blobs import BlobResponse, BlobStore, BlobWriter, MultipartError, MultipartFile
+from app.config import settings
+from app.curves import MAX_POINTS, MIN_POINTS, downsample
+from app.deps import (
+    get_array_store,
+    get_blob_store,
+    get_current_user,
+    get_drug_summaries,
+    get_job_queue,
+    get_store,
+)
+from app.ingest import PK_DATASET_TYPE, ArrayStore
+from app.jobs import JobQueue
+from app.nca import load_cached
 from app.models import (
     AccessRequestCreate,
     AccessRequestRecord,
     AuditLogRecord,
+    CurvesReport,
     DatasetCreate,
     DatasetRecord,
     DatasetUpdate,
+    JobRecord,
+    NCAReport,
+    NCARequest,
+    PatchOperation,
     Role,
 )
 from app.storage import Storage
+from app.summaries import DrugSummaries
+from app.unit_of_work import StorageConflict
+from app.versions import content, diff, reconstruct
 
 router = APIRouter(prefix="/datasets", tags=["datasets"])
 
@@ -20,36 +45,69 @@ router = APIRouter(prefix="/datasets", tags=["datasets"])
 def create_dataset(
     payload: DatasetCreate,
     store: Storage = Depends(get_store),
+    arrays: ArrayStore = Depends(get_array_store),
+    summaries: DrugSummaries = Depends(get_drug_summaries),
     user=Depends(get_current_user),
 ) -> DatasetRecord:
     require_role(user, {Role.admin, Role.researcher})
-    dataset = store.create_dataset(payload, owner_id=user.id)
-    store.create_audit_log(
-        dataset_id=dataset.id,
-        actor_id=user.id,
-        action="create_dataset",
-        details={"dataset_type": dataset.dataset_type},
-    )
+    with store.unit_of_work() as uow:
+        dataset = uow.create_dataset(payload, owner_id=user.id)
+        uow.create_audit_log(
+            dataset_id=dataset.id,
+            actor_id=user.id,
+            action="create_dataset",
+            details={"dataset_type": dataset.dataset_type},
+        )
+    summaries.refresh(dataset, arrays)
     return dataset
 
 
+def _parse_fields(fields: str | None) -> list[str] | None:
+    """Validate a comma-separated ``fields`` selection; ``id`` is always included."""
+    if fields is None:
+        return None
+    selected = ["id"]
+    for name in (name.strip() for name in fields.split(",")):
+        if name and name not in selected:
+            selected.append(name)
+    unknown = [name for name in selected if name not in DatasetRecord.model_fields]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown dataset fields: {', '.join(unknown)}")
+    return selected
+
+
+def _json_response(content) -> Response:
+    # Projected rows are plain dicts; serialize them directly instead of
+    # validating them back into response models.
+    return Response(to_json(content), media_type="application/json")
+
+
 @router.get("", response_model=list[DatasetRecord])
 def list_datasets(
+    fields: str | None = None,
     store: Storage = Depends(get_store),
     user=Depends(get_current_user),
-) -> list[DatasetRecord]:
+) -> list[DatasetRecord] | Response:
+    """List datasets; ``fields=id,drug_name,...`` returns only those fields."""
+    selected = _parse_fields(fields)
+    if selected is not None:
+        return _json_response(store.list_dataset_fields(selected))
     return store.list_datasets()
 
 
 @router.get("/{dataset_id}", response_model=DatasetRecord)
 def get_dataset(
     dataset_id: str,
+    fields: str | None = None,
     store: Storage = Depends(get_store),
     user=Depends(get_current_user),
-) -> DatasetRecord:
-    dataset = store.get_dataset(dataset_id)
+) -> DatasetRecord | Response:
+    selected = _parse_fields(fields)
+    dataset = store.get_dataset(dataset_id) if selected is None else store.get_dataset_fields(dataset_id, selected)
     if not dataset:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    if selected is not None:
+        return _json_response(dataset)
     return dataset
 
 
@@ -58,6 +116,8 @@ def update_dataset(
     dataset_id: str,
     payload: DatasetUpdate,
     store: Storage = Depends(get_store),
+    arrays: ArrayStore = Depends(get_array_store),
+    summaries: DrugSummaries = Depends(get_drug_summaries),
     user=Depends(get_current_user),
 ) -> DatasetRecord:
     dataset = store.get_dataset(dataset_id)
@@ -67,18 +127,63 @@ def update_dataset(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Dataset is locked")
     if user.role != Role.admin and dataset.owner_id != user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to edit dataset")
-    updated = store.update_dataset(dataset_id, payload)
-    if not updated:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
-    store.create_audit_log(
-        dataset_id=dataset_id,
-        actor_id=user.id,
-        action="update_dataset",
-        details=payload.model_dump(exclude_unset=True),
-    )
+    changes = payload.model_dump(exclude_unset=True)
+    try:
+        with store.unit_of_work() as uow:
+            updated = uow.update_dataset(dataset, changes)
+            uow.create_audit_log(
+                dataset_id=dataset_id,
+                actor_id=user.id,
+                action="update_dataset",
+                details={"version": updated.version, "fields": sorted(changes)},
+            )
+    except StorageConflict as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Dataset was modified concurrently, retry"
+        ) from exc
+    summaries.refresh(updated, arrays)
     return updated
 
 
+def _load_version(store: Storage, dataset_id: str, version: int) -> dict:
+    chain = store.get_version_chain(dataset_id, version)
+    if not chain:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Version {version} not found")
+    return reconstruct(chain)
+
+
+@router.get("/{dataset_id}/versions/{version}", response_model=DatasetRecord)
+def get_dataset_version(
+    dataset_id: str,
+    version: int,
+    store: Storage = Depends(get_store),
+    user=Depends(get_current_user),
+) -> DatasetRecord:
+    dataset = store.get_dataset(dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    document = _load_version(store, dataset_id, version)
+    return DatasetRecord(**document, locked=dataset.locked, version=version)
+
+
+@router.get("/{dataset_id}/versions/{version}/diff", response_model=list[PatchOperation])
+def diff_dataset_versions(
+    dataset_id: str,
+    version: int,
+    against: int | None = None,
+    store: Storage = Depends(get_store),
+    user=Depends(get_current_user),
+) -> list[PatchOperation]:
+    """Changes from version ``against`` (default: the previous one) to ``version``."""
+    dataset = store.get_dataset(dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    base = against if against is not None else version - 1
+    target = _load_version(store, dataset_id, version)
+    source = _load_version(store, dataset_id, base) if base >= 1 else {}
+    return [PatchOperation(**op) for op in diff(content(source), content(target))]
+
+
 @router.post("/{dataset_id}/lock", response_model=DatasetRecord)
 def lock_dataset(
     dataset_id: str,
@@ -86,15 +191,22 @@ def lock_dataset(
     user=Depends(get_current_user),
 ) -> DatasetRecord:
     require_role(user, {Role.admin})
-    dataset = store.set_dataset_lock(dataset_id, True)
+    dataset = store.get_dataset(dataset_id)
     if not dataset:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
-    store.create_audit_log(
-        dataset_id=dataset_id,
-        actor_id=user.id,
-        action="lock_dataset",
-        details={"locked": True},
-    )
+    try:
+        with store.unit_of_work() as uow:
+            dataset = uow.set_dataset_lock(dataset, True)
+            uow.create_audit_log(
+                dataset_id=dataset_id,
+                actor_id=user.id,
+                action="lock_dataset",
+                details={"locked": True},
+            )
+    except StorageConflict as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Dataset was modified concurrently, retry"
+        ) from exc
     return dataset
 
 
@@ -105,15 +217,22 @@ def unlock_dataset(
     user=Depends(get_current_user),
 ) -> DatasetRecord:
     require_role(user, {Role.admin})
-    dataset = store.set_dataset_lock(dataset_id, False)
+    dataset = store.get_dataset(dataset_id)
     if not dataset:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
-    store.create_audit_log(
-        dataset_id=dataset_id,
-        actor_id=user.id,
-        action="unlock_dataset",
-        details={"locked": False},
-    )
+    try:
+        with store.unit_of_work() as uow:
+            dataset = uow.set_dataset_lock(dataset, False)
+            uow.create_audit_log(
+                dataset_id=dataset_id,
+                actor_id=user.id,
+                action="unlock_dataset",
+                details={"locked": False},
+            )
+    except StorageConflict as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Dataset was modified concurrently, retry"
+        ) from exc
     return dataset
 
 
@@ -127,13 +246,14 @@ def request_access(
     dataset = store.get_dataset(dataset_id)
     if not dataset:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
-    request = store.create_access_request(dataset_id, user.id, payload)
-    store.create_audit_log(
-        dataset_id=dataset_id,
-        actor_id=user.id,
-        action="request_access",
-        details={"reason": payload.reason},
-    )
+    with store.unit_of_work() as uow:
+        request = uow.create_access_request(dataset_id, user.id, payload)
+        uow.create_audit_log(
+            dataset_id=dataset_id,
+            actor_id=user.id,
+            action="request_access",
+            details={"reason": payload.reason},
+        )
     return request
 
 
@@ -163,3 +283,194 @@ def list_audit_logs(
     if user.role != Role.admin and dataset.owner_id != user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to view audit logs")
     return store.list_audit_logs(dataset_id)
+
+
+@router.post("/{dataset_id}/file", response_model=DatasetRecord)
+async def upload_dataset_file(
+    dataset_id: str,
+    request: Request,
+    response: Response,
+    file_name: str | None = None,
+    store: Storage = Depends(get_store),
+    blobs: BlobStore = Depends(get_blob_store),
+    arrays: ArrayStore = Depends(get_array_store),
+    summaries: DrugSummaries = Depends(get_drug_summaries),
+    queue: JobQueue = Depends(get_job_queue),
+    user=Depends(get_current_user),
+) -> DatasetRecord:
+    """Store the dataset's file; pk files not parsed before are parsed by an ingest job (202)."""
+    dataset = await run_in_threadpool(store.get_dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    if dataset.locked and user.role != Role.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Dataset is locked")
+    if user.role != Role.admin and dataset.owner_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to edit dataset")
+
+    writer = blobs.writer()
+    try:
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            try:
+                part = MultipartFile(content_type)
+                await _stream_body(request, writer, part)
+            except MultipartError as exc:
+                raise HTTPException(status_code=422, detail=str(exc)) from exc
+            if not part.found:
+                raise HTTPException(status_code=422, detail="Missing file part")
+            file_name = file_name or part.file_name
+        else:
+            await _stream_body(request, writer)
+        digest = await run_in_threadpool(writer.commit)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    # Arrays are keyed by digest, so a file parsed before is attached right away.
+    is_pk = dataset.dataset_type == PK_DATASET_TYPE
+    arrays_id = digest if is_pk and arrays.exists(digest) else None
+    updated = await run_in_threadpool(
+        _commit_upload, store, dataset_id, user.id, file_name, digest, writer.size, arrays_id
+    )
+    if not updated:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    await run_in_threadpool(summaries.refresh, updated, arrays)
+    if is_pk and arrays_id is None:
+        # The job attaches the arrays when it succeeds; an invalid file fails it.
+        job, _ = await run_in_threadpool(queue.submit, updated, "ingest", {}, user.id)
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Location"] = f"/jobs/{job.id}"
+    return updated
+
+
+def _commit_upload(
+    store: Storage,
+    dataset_id: str,
+    actor_id: str,
+    file_name: str | None,
+    digest: str,
+    size: int,
+    arrays_id: str | None,
+) -> DatasetRecord | None:
+    # The body has already been consumed, so a concurrent edit during the
+    # upload is resolved by re-reading rather than failing the request.
+    while True:
+        dataset = store.get_dataset(dataset_id)
+        if not dataset:
+            return None
+        try:
+            with store.unit_of_work() as uow:
+                updated = uow.set_dataset_file(dataset, file_name, digest, size, arrays_id)
+                uow.create_audit_log(
+                    dataset_id=dataset_id,
+                    actor_id=actor_id,
+                    action="upload_file",
+                    details={"file_name": file_name, "sha256": digest, "size": size},
+                )
+        except StorageConflict:
+            continue
+        return updated
+
+
+async def _stream_body(request: Request, writer: BlobWriter, part: MultipartFile | None = None) -> None:
+    # Coalesce the server's small body chunks so hashing and disk writes run
+    # off the event loop in upload_chunk_size batches. Multipart bodies are
+    # parsed as they arrive and only the file part is written.
+    buffer = bytearray()
+    async for chunk in request.stream():
+        buffer += part.feed(chunk) if part else chunk
+        if len(buffer) >= settings.upload_chunk_size:
+            await run_in_threadpool(writer.write, bytes(buffer))
+            buffer.clear()
+    if buffer:
+        await run_in_threadpool(writer.write, bytes(buffer))
+
+
+@router.get("/{dataset_id}/file", response_class=BlobResponse)
+def download_dataset_file(
+    dataset_id: str,
+    request: Request,
+    store: Storage = Depends(get_store),
+    blobs: BlobStore = Depends(get_blob_store),
+    user=Depends(get_current_user),
+) -> BlobResponse:
+    dataset = store.get_dataset(dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    if not dataset.file_sha256 or not blobs.exists(dataset.file_sha256):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset has no file")
+    return BlobResponse(
+        blobs.path_for(dataset.file_sha256), dataset.file_sha256, dataset.file_name, request.headers
+    )
+
+
+@router.post("/{dataset_id}/nca", response_model=NCAReport, responses={202: {"model": JobRecord}})
+def run_nca(
+    dataset_id: str,
+    payload: NCARequest,
+    store: Storage = Depends(get_store),
+    arrays: ArrayStore = Depends(get_array_store),
+    queue: JobQueue = Depends(get_job_queue),
+    user=Depends(get_current_user),
+) -> NCAReport | Response:
+    """Cached NCA results; uncached ones are computed by an ``nca`` job, answered with 202."""
+    dataset = store.get_dataset(dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    if not dataset.arrays_id:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Dataset has no parsed PK data")
+    result = load_cached(arrays, dataset.arrays_id, payload.method, payload.lambda_z_points)
+    if result is None:
+        job, _ = queue.submit(dataset, "nca", payload.model_dump(), user.id)
+        return JSONResponse(
+            job.model_dump(mode="json"), status_code=status.HTTP_202_ACCEPTED, headers={"Location": f"/jobs/{job.id}"}
+        )
+    return NCAReport(
+        dataset_id=dataset_id,
+        arrays_id=dataset.arrays_id,
+        method=payload.method,
+        lambda_z_points=payload.lambda_z_points,
+        **result.columns(),
+    )
+
+
+def _parse_subjects(subjects: str | None, labels: np.ndarray) -> np.ndarray:
+    """Indices of a comma-separated ``subjects`` selection; all subjects by default."""
+    names = list(dict.fromkeys(name.strip() for name in (subjects or "").split(",") if name.strip()))
+    if not names:
+        return np.arange(len(labels))
+    # Subject labels are stored sorted.
+    indices = np.searchsorted(labels, names).clip(max=len(labels) - 1)
+    unknown = [name for name, label in zip(names, labels[indices]) if name != label]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown subjects: {', '.join(unknown)}")
+    return indices
+
+
+@router.get("/{dataset_id}/curves", response_model=CurvesReport)
+def get_curves(
+    dataset_id: str,
+    points: int = Query(default=1000, ge=MIN_POINTS, le=MAX_POINTS),
+    subjects: str | None = None,
+    store: Storage = Depends(get_store),
+    arrays: ArrayStore = Depends(get_array_store),
+    user=Depends(get_current_user),
+) -> CurvesReport:
+    """Concentration-time curves with at most ``points`` samples per subject."""
+    dataset = store.get_dataset(dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    if not dataset.arrays_id:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Dataset has no parsed PK data")
+    labels = np.asarray(arrays.load(dataset.arrays_id).subjects)
+    indices = _parse_subjects(subjects, labels)
+    curves = downsample(arrays.load_curves(dataset.arrays_id, points).select(indices), points)
+    bounds = curves.offsets[1:-1]
+    return CurvesReport(
+        dataset_id=dataset_id,
+        arrays_id=dataset.arrays_id,
+        points=points,
+        subjects=labels[indices].tolist(),
+        time=[series.tolist() for series in np.split(curves.time, bounds)],
+        concentration=[series.tolist() for series in np.split(curves.concentration, bounds)],
+    )
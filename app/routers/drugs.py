@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+
+from app.deps import get_array_store, get_current_user, get_drug_summaries, get_store
+from app.ingest import ArrayStore
+from app.models import DrugSummary
+from app.storage import Storage
+from app.summaries import DrugSummaries
+
+router = APIRouter(prefix="/drugs", tags=["drugs"])
+
+
+@router.get("/{drug_name}/summary", response_model=DrugSummary)
+def get_drug_summary(
+    drug_name: str,
+    store: Storage = Depends(get_store),
+    arrays: ArrayStore = Depends(get_array_store),
+    summaries: DrugSummaries = Depends(get_drug_summaries),
+    user=Depends(get_current_user),
+) -> DrugSummary:
+    return summaries.summary(drug_name, store, arrays)
@@ -0,0 +1,75 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.deps import get_current_user, get_event_bus, get_store
+from app.events import ALL_DATASETS, EventBus, Subscription, dataset_topic, owner_topic
+from app.models import Role
+from app.storage import Storage
+
+router = APIRouter(tags=["events"])
+
+
+async def _stream(request: Request, bus: EventBus, subscription: Subscription) -> AsyncIterator[str]:
+    try:
+        if subscription.missed:
+            # The client's last event fell out of history: it must re-read.
+            yield "event: resync\ndata: {}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.events_heartbeat_seconds)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            yield event.encode()
+    finally:
+        bus.unsubscribe(subscription)
+
+
+def _event_stream(
+    request: Request, bus: EventBus, topics: set[str], last_event_id: str | None
+) -> StreamingResponse:
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscription = bus.subscribe(topics, resume_from)
+    return StreamingResponse(
+        _stream(request, bus, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/datasets/{dataset_id}/events")
+async def dataset_events(
+    dataset_id: str,
+    request: Request,
+    last_event_id: str | None = Header(default=None),
+    store: Storage = Depends(get_store),
+    bus: EventBus = Depends(get_event_bus),
+    user=Depends(get_current_user),
+) -> StreamingResponse:
+    dataset = await run_in_threadpool(store.get_dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    if user.role != Role.admin and dataset.owner_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to view events")
+    return _event_stream(request, bus, {dataset_topic(dataset_id)}, last_event_id)
+
+
+@router.get("/events")
+async def owner_events(
+    request: Request,
+    last_event_id: str | None = Header(default=None),
+    bus: EventBus = Depends(get_event_bus),
+    user=Depends(get_current_user),
+) -> StreamingResponse:
+    """Events for every dataset the caller owns, or for all datasets for admins."""
+    topic = ALL_DATASETS if user.role == Role.admin else owner_topic(user.id)
+    return _event_stream(request, bus, {topic}, last_event_id)
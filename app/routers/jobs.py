@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import ValidationError
+
+from app.deps import get_current_user, get_job_queue, get_store
+from app.jobs import JobQueue, JobRejected
+from app.models import JobCreate, JobRecord, Role
+from app.storage import Storage
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.post("", response_model=JobRecord, status_code=status.HTTP_202_ACCEPTED)
+def submit_job(
+    payload: JobCreate,
+    response: Response,
+    store: Storage = Depends(get_store),
+    queue: JobQueue = Depends(get_job_queue),
+    user=Depends(get_current_user),
+) -> JobRecord:
+    """Queue a job on a dataset; an identical job for the same dataset version is returned with 200."""
+    dataset = store.get_dataset(payload.dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    if payload.kind == "ingest":
+        # Ingest attaches arrays to the dataset, so it follows the upload rules.
+        if dataset.locked and user.role != Role.admin:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Dataset is locked")
+        if user.role != Role.admin and dataset.owner_id != user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to edit dataset")
+    try:
+        job, created = queue.submit(dataset, payload.kind, payload.params, user.id)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False)) from exc
+    except JobRejected as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return job
+
+
+def _load_job(job_id: str, store: Storage, user) -> JobRecord:
+    job = store.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if user.role != Role.admin and job.submitted_by != user.id:
+        dataset = store.get_dataset(job.dataset_id)
+        if not dataset or dataset.owner_id != user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to view job")
+    return job
+
+
+@router.get("/{job_id}", response_model=JobRecord)
+def get_job(
+    job_id: str,
+    store: Storage = Depends(get_store),
+    user=Depends(get_current_user),
+) -> JobRecord:
+    return _load_job(job_id, store, user)
+
+
+@router.get("/{job_id}/result")
+def get_job_result(
+    job_id: str,
+    store: Storage = Depends(get_store),
+    queue: JobQueue = Depends(get_job_queue),
+    user=Depends(get_current_user),
+) -> Response:
+    """The result of a succeeded job, including results too large to store with the job."""
+    job = _load_job(job_id, store, user)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job has not succeeded")
+    if job.result_file is not None:
+        return FileResponse(queue.result_path(job.id), media_type="application/json")
+    return JSONResponse(job.result)
+
+
+@router.post("/{job_id}/cancel", response_model=JobRecord)
+def cancel_job(
+    job_id: str,
+    store: Storage = Depends(get_store),
+    queue: JobQueue = Depends(get_job_queue),
+    user=Depends(get_current_user),
+) -> JobRecord:
+    job = _load_job(job_id, store, user)
+    return queue.cancel(job, user.id)
@@ -8,6 +8,7 @@ from app.models import (
     RoleUpgradeRequestRecord,
 )
 from app.storage import Storage
+from app.unit_of_work import StorageConflict
 
 router = APIRouter(prefix="/roles", tags=["roles"])
 
@@ -47,10 +48,17 @@ def approve_role_request(
     user=Depends(get_current_user),
 ) -> RoleUpgradeRequestRecord:
     require_role(user, {Role.admin})
-    request = store.set_role_upgrade_request_status(request_id, "approved")
+    request = store.get_role_upgrade_request(request_id)
     if not request:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
-    store.update_user_role(request.requester_id, request.requested_role)
+    try:
+        with store.unit_of_work() as uow:
+            request = uow.set_role_upgrade_request_status(request, "approved")
+            uow.update_user_role(request.requester_id, request.requested_role)
+    except StorageConflict as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Request was modified concurrently, retry"
+        ) from exc
     return request
 
 
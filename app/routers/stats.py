@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
+
+from app.auth import require_role
+from app.deps import get_current_user, get_store
+from app.models import Role, StatsReport
+from app.stats import format_drift
+from app.storage import Storage
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("", response_model=StatsReport)
+def get_stats(
+    store: Storage = Depends(get_store),
+    user=Depends(get_current_user),
+) -> StatsReport:
+    return store.get_stats()
+
+
+@router.post("/reconcile", response_model=dict[str, int])
+async def reconcile_stats(
+    store: Storage = Depends(get_store),
+    user=Depends(get_current_user),
+) -> dict[str, int]:
+    """Rebuild the counters from the records and report the corrections."""
+    require_role(user, {Role.admin})
+    return format_drift(await run_in_threadpool(store.reconcile_stats))
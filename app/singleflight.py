@@ -0,0 +1,123 @@
+"""Coalescing of concurrent identical storage reads.
+
+Request handlers run on a thread pool, so concurrent lookups of the same
+dataset or user are coalesced across threads: the first caller runs the
+backend call and everyone arriving while it is in flight waits for and shares
+its result.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable, Hashable, Iterator
+from contextlib import contextmanager
+from threading import Event, Lock
+from typing import Any, TypeVar
+
+from app.unit_of_work import DATASETS, USERS, UnitOfWork, Update
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome.
+
+    Exceptions raised by the call are re-raised in every waiter. If the
+    leading caller is interrupted by anything other than an ``Exception``
+    (cancellation, ``KeyboardInterrupt``), waiters are not failed with it;
+    one of them retries the call instead.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                return self._lead(key, call, fn)
+            call.done.wait()
+            if call.error is None:
+                return call.result
+            if isinstance(call.error, Exception):
+                raise call.error
+            # The leader was interrupted rather than failed; try again.
+
+    def _lead(self, key: Hashable, call: _Call, fn: Callable[[], T]) -> T:
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            self.forget(key, call)
+            call.done.set()
+
+    def forget(self, key: Hashable, call: _Call | None = None) -> None:
+        """Stop sharing the in-flight call for ``key`` with later callers."""
+        with self._lock:
+            if call is None or self._calls.get(key) is call:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class CoalescingStore:
+    """Store proxy coalescing ``get_dataset`` and ``get_user`` lookups.
+
+    Results are shared between callers and must be treated as read-only. A
+    committed write drops the in-flight lookup of every record it touched, so
+    reads issued after a write never join a lookup that started before it.
+    """
+
+    def __init__(self, store: Any) -> None:
+        self._store = store
+        self._flight = SingleFlight()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._store, name)
+
+    def get_dataset(self, dataset_id: str) -> Any:
+        return self._flight.do((DATASETS, dataset_id), lambda: self._store.get_dataset(dataset_id))
+
+    def get_user(self, user_id: str) -> Any:
+        return self._flight.do((USERS, user_id), lambda: self._store.get_user(user_id))
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[UnitOfWork]:
+        with self._store.unit_of_work() as uow:
+            yield uow
+        for op in uow.operations:
+            if isinstance(op, Update) and op.collection in (DATASETS, USERS):
+                self._flight.forget((op.collection, op.id))
+
+    def update_dataset(self, dataset_id: str, *args: Any) -> Any:
+        return self._written(DATASETS, dataset_id, self._store.update_dataset(dataset_id, *args))
+
+    def set_dataset_lock(self, dataset_id: str, *args: Any) -> Any:
+        return self._written(DATASETS, dataset_id, self._store.set_dataset_lock(dataset_id, *args))
+
+    def set_dataset_file(self, dataset_id: str, *args: Any) -> Any:
+        return self._written(DATASETS, dataset_id, self._store.set_dataset_file(dataset_id, *args))
+
+    def update_user_role(self, user_id: str, *args: Any) -> Any:
+        return self._written(USERS, user_id, self._store.update_user_role(user_id, *args))
+
+    def _written(self, collection: str, record_id: str, result: T) -> T:
+        self._flight.forget((collection, record_id))
+        return result
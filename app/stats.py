@@ -0,0 +1,106 @@
+"""Counters behind ``GET /stats``.
+
+Counts are keyed by ``(dimension, value)``, e.g. ``("drug_name", "Drug A")``
+or ``("lock", "locked")``. Stores keep them current from the operations of
+each unit of work and rebuild them from the records in ``reconcile_stats``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from starlette.concurrency import run_in_threadpool
+
+from app.models import StatsReport
+from app.unit_of_work import ACCESS_REQUESTS, DATASETS, ROLE_REQUESTS, Insert, Update
+
+logger = logging.getLogger(__name__)
+
+Key = tuple[str, str]
+
+# Counted fields per collection and the dimension each one feeds.
+DIMENSIONS: dict[str, dict[str, str]] = {
+    DATASETS: {"dataset_type": "dataset_type", "drug_name": "drug_name", "owner_id": "owner", "locked": "lock"},
+    ACCESS_REQUESTS: {"status": "access_requests"},
+    ROLE_REQUESTS: {"status": "role_requests"},
+}
+
+
+def key(collection: str, field: str, value: Any) -> Key:
+    if field == "locked":
+        value = "locked" if value else "unlocked"
+    return DIMENSIONS[collection][field], str(value)
+
+
+def record_counts(collection: str, record: Any) -> Counter[Key]:
+    """What a single record (model or compact row) contributes."""
+    return Counter(key(collection, field, getattr(record, field)) for field in DIMENSIONS.get(collection, ()))
+
+
+def update_counts(collection: str, before: Mapping[str, Any], changes: Mapping[str, Any]) -> Counter[Key]:
+    counts: Counter[Key] = Counter()
+    for field in DIMENSIONS.get(collection, ()):
+        if field in changes and field in before and changes[field] != before[field]:
+            counts[key(collection, field, changes[field])] += 1
+            counts[key(collection, field, before[field])] -= 1
+    return counts
+
+
+def operation_counts(operations: Iterable[Insert | Update]) -> Counter[Key]:
+    """Counter changes for a unit of work, using each update's recorded ``previous`` values."""
+    counts: Counter[Key] = Counter()
+    for op in operations:
+        if isinstance(op, Insert):
+            counts.update(record_counts(op.collection, op.record))
+        elif op.previous:
+            counts.update(update_counts(op.collection, op.previous, op.changes))
+    return Counter({name: amount for name, amount in counts.items() if amount})
+
+
+def drift(maintained: Mapping[Key, int], actual: Mapping[Key, int]) -> Counter[Key]:
+    """Corrections turning ``maintained`` into ``actual``."""
+    return Counter(
+        {
+            name: actual.get(name, 0) - maintained.get(name, 0)
+            for name in maintained.keys() | actual.keys()
+            if actual.get(name, 0) != maintained.get(name, 0)
+        }
+    )
+
+
+def build_report(counts: Mapping[Key, int]) -> StatsReport:
+    by_dimension: dict[str, dict[str, int]] = {}
+    for (dimension, value), amount in counts.items():
+        if amount:
+            by_dimension.setdefault(dimension, {})[value] = amount
+    lock = by_dimension.get("lock", {})
+    return StatsReport(
+        datasets=sum(lock.values()),
+        locked=lock.get("locked", 0),
+        unlocked=lock.get("unlocked", 0),
+        by_dataset_type=by_dimension.get("dataset_type", {}),
+        by_drug_name=by_dimension.get("drug_name", {}),
+        by_owner=by_dimension.get("owner", {}),
+        pending_access_requests=by_dimension.get("access_requests", {}).get("pending", 0),
+        pending_role_requests=by_dimension.get("role_requests", {}).get("pending", 0),
+    )
+
+
+def format_drift(corrections: Mapping[Key, int]) -> dict[str, int]:
+    return {f"{dimension}:{value}": amount for (dimension, value), amount in sorted(corrections.items())}
+
+
+async def reconcile_periodically(store: Any, interval: float) -> None:
+    """Rebuild the store's counters every ``interval`` seconds, logging any drift."""
+    while True:
+        try:
+            corrections = await run_in_threadpool(store.reconcile_stats)
+        except Exception:  # noqa: BLE001 - keep the job alive across backend hiccups
+            logger.exception("Stats reconciliation failed")
+        else:
+            if corrections:
+                logger.warning("Stats counters drifted and were corrected: %s", format_drift(corrections))
+        await asyncio.sleep(interval)
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Protocol
+from abc import ABC, abstractmethod
+from collections import Counter
+from collections.abc import Callable, Collection, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import RLock
+from time import perf_counter
+from typing import Any, ContextManager, Protocol
 from uuid import uuid4
 
+from pydantic_core import PydanticUndefined
+
 from app.models import (
     AccessRequestCreate,
     AccessRequestRecord,
@@ -11,15 +19,72 @@ from app.models import (
     DatasetCreate,
     DatasetRecord,
     DatasetUpdate,
+    DatasetVersionRecord,
+    JobRecord,
     RoleUpgradeRequestCreate,
     RoleUpgradeRequestRecord,
+    StatsReport,
     UserCreate,
     UserRecord,
 )
 from app.auth import hash_password
+from app.compact import (
+    AccessRequestRow,
+    AuditLogTable,
+    DatasetRow,
+    JobRow,
+    RoleUpgradeRequestRow,
+    UserRow,
+)
+from app.events import ALL_DATASETS, EventBus, dataset_topic, owner_topic
+from app.stats import (
+    DIMENSIONS,
+    Key,
+    build_report,
+    drift,
+    key,
+    operation_counts,
+    record_counts,
+    update_counts,
+)
+from app.unit_of_work import (
+    ACCESS_REQUESTS,
+    AUDIT_LOGS,
+    DATASETS,
+    JOBS,
+    ROLE_REQUESTS,
+    STATS,
+    USERS,
+    VERSIONS,
+    DuplicateJob,
+    Increment,
+    Insert,
+    StorageConflict,
+    UnitOfWork,
+    Update,
+)
 
 
 class Storage(Protocol):
+    def ensure_indexes(self) -> None:
+        ...
+
+    def warm_up(self) -> None:
+        ...
+
+    def health(self) -> dict[str, Any]:
+        ...
+
+    def close(self) -> None:
+        ...
+
+    def unit_of_work(self) -> ContextManager[UnitOfWork]:
+        """Collect writes and commit them together when the block exits cleanly.
+
+        Raises ``StorageConflict`` on commit if a dataset changed since it was read.
+        """
+        ...
+
     def create_user(self, user: UserCreate) -> UserRecord:
         ...
 
@@ -35,18 +100,39 @@ class Storage(Protocol):
     def create_dataset(self, data: DatasetCreate, owner_id: str) -> DatasetRecord:
         ...
 
-    def list_datasets(self) -> list[DatasetRecord]:
+    def list_datasets(self, drug_name: str | None = None) -> list[DatasetRecord]:
         ...
 
     def get_dataset(self, dataset_id: str) -> DatasetRecord | None:
         ...
 
+    def list_dataset_fields(self, fields: list[str], drug_name: str | None = None) -> list[dict[str, Any]]:
+        """Datasets as plain dicts restricted to ``fields``."""
+        ...
+
+    def get_dataset_fields(self, dataset_id: str, fields: list[str]) -> dict[str, Any] | None:
+        ...
+
     def update_dataset(self, dataset_id: str, data: DatasetUpdate) -> DatasetRecord | None:
         ...
 
     def set_dataset_lock(self, dataset_id: str, locked: bool) -> DatasetRecord | None:
         ...
 
+    def set_dataset_file(
+        self,
+        dataset_id: str,
+        file_name: str | None,
+        sha256: str,
+        size: int,
+        arrays_id: str | None = None,
+    ) -> DatasetRecord | None:
+        ...
+
+    def get_version_chain(self, dataset_id: str, version: int) -> list[DatasetVersionRecord]:
+        """Entries from the nearest snapshot at or before ``version`` through it."""
+        ...
+
     def create_access_request(
         self, dataset_id: str, requester_id: str, payload: AccessRequestCreate
     ) -> AccessRequestRecord:
@@ -60,6 +146,9 @@ class Storage(Protocol):
     ) -> RoleUpgradeRequestRecord:
         ...
 
+    def get_role_upgrade_request(self, request_id: str) -> RoleUpgradeRequestRecord | None:
+        ...
+
     def list_role_upgrade_requests(self) -> list[RoleUpgradeRequestRecord]:
         ...
 
@@ -79,167 +168,570 @@ class Storage(Protocol):
     def list_audit_logs(self, dataset_id: str) -> list[AuditLogRecord]:
         ...
 
+    def get_stats(self) -> StatsReport:
+        """Dataset and pending request counts, from counters maintained on write."""
+        ...
+
+    def reconcile_stats(self) -> dict[Key, int]:
+        """Rebuild the counters from the records; returns the corrections applied."""
+        ...
+
+    def get_job(self, job_id: str) -> JobRecord | None:
+        ...
+
+    def get_job_by_key(self, active_key: str) -> JobRecord | None:
+        """The queued, running or succeeded job holding ``active_key``."""
+        ...
+
+    def list_jobs(self, statuses: Collection[str]) -> list[JobRecord]:
+        ...
+
+    def update_job(
+        self, job_id: str, changes: dict[str, Any], expected: dict[str, Any] | None = None
+    ) -> JobRecord | None:
+        """Apply ``changes``; raises ``StorageConflict`` if the job no longer has the ``expected`` values."""
+        ...
+
+
+class _UnitOfWorkWrites(ABC):
+    """Single-write store methods, each committed as its own unit of work.
+
+    Subclasses provide the reads, ``_commit`` and ``_publish``.
+    """
+
+    _snapshot_interval: int
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[UnitOfWork]:
+        uow = UnitOfWork(self._snapshot_interval)
+        yield uow
+        if uow.operations:
+            self._commit(uow)
+            self._publish_events(uow)
+
+    @abstractmethod
+    def _commit(self, uow: UnitOfWork) -> None:
+        """Apply every operation of ``uow`` or, on ``StorageConflict``, none."""
+
+    @abstractmethod
+    def _publish(self, dataset_id: str, name: str, data: str) -> None:
+        ...
+
+    @abstractmethod
+    def get_user(self, user_id: str) -> UserRecord | None:
+        ...
 
-class InMemoryStore:
-    def __init__(self) -> None:
-        self._users: dict[str, UserRecord] = {}
-        self._datasets: dict[str, DatasetRecord] = {}
-        self._requests: dict[str, AccessRequestRecord] = {}
-        self._role_requests: dict[str, RoleUpgradeRequestRecord] = {}
-        self._audit_logs: dict[str, AuditLogRecord] = {}
+    @abstractmethod
+    def get_dataset(self, dataset_id: str) -> DatasetRecord | None:
+        ...
+
+    @abstractmethod
+    def get_role_upgrade_request(self, request_id: str) -> RoleUpgradeRequestRecord | None:
+        ...
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> JobRecord | None:
+        ...
+
+    def _publish_events(self, uow: UnitOfWork) -> None:
+        for op in uow.operations:
+            if not isinstance(op, Insert):
+                continue
+            if op.collection == ACCESS_REQUESTS:
+                self._publish(op.record.dataset_id, "access_request", op.record.model_dump_json())
+            elif op.collection == AUDIT_LOGS:
+                self._publish(op.record.dataset_id, "audit", op.record.model_dump_json())
+
+    def _commit_dataset(
+        self, dataset_id: str, build: Callable[[UnitOfWork, DatasetRecord], DatasetRecord]
+    ) -> DatasetRecord | None:
+        # Read-modify-write; a concurrent update to the same dataset makes the
+        # guarded write miss, so re-read and try again.
+        while True:
+            dataset = self.get_dataset(dataset_id)
+            if dataset is None:
+                return None
+            try:
+                with self.unit_of_work() as uow:
+                    updated = build(uow, dataset)
+            except StorageConflict:
+                continue
+            return updated
 
     def create_user(self, user: UserCreate) -> UserRecord:
-        user_id = str(uuid4())
         record = UserRecord(
-            id=user_id,
+            id=str(uuid4()),
             email=user.email,
             role=user.role,
             hashed_password=hash_password(user.password),
         )
-        self._users[user_id] = record
+        with self.unit_of_work() as uow:
+            uow.create_user(record)
         return record
 
-    def get_user_by_email(self, email: str) -> UserRecord | None:
-        return next((user for user in self._users.values() if user.email == email), None)
-
-    def get_user(self, user_id: str) -> UserRecord | None:
-        return self._users.get(user_id)
-
-    def list_users(self) -> list[UserRecord]:
-        return list(self._users.values())
-
     def create_dataset(self, data: DatasetCreate, owner_id: str) -> DatasetRecord:
-        dataset_id = str(uuid4())
-        record = DatasetRecord(
-            id=dataset_id,
-            drug_name=data.drug_name,
-            study_id=data.study_id,
-            dataset_type=data.dataset_type,
-            metadata=data.metadata,
-            file_name=data.file_name,
-            owner_id=owner_id,
-        )
-        self._datasets[dataset_id] = record
+        with self.unit_of_work() as uow:
+            record = uow.create_dataset(data, owner_id)
         return record
 
-    def list_datasets(self) -> list[DatasetRecord]:
-        return list(self._datasets.values())
-
-    def get_dataset(self, dataset_id: str) -> DatasetRecord | None:
-        return self._datasets.get(dataset_id)
-
     def update_dataset(self, dataset_id: str, data: DatasetUpdate) -> DatasetRecord | None:
-        record = self._datasets.get(dataset_id)
-        if not record:
-            return None
-        updated = record.model_copy(update=data.model_dump(exclude_unset=True))
-        updated.updated_at = datetime.utcnow()
-        self._datasets[dataset_id] = updated
-        return updated
+        changes = data.model_dump(exclude_unset=True)
+        return self._commit_dataset(dataset_id, lambda uow, dataset: uow.update_dataset(dataset, changes))
 
     def set_dataset_lock(self, dataset_id: str, locked: bool) -> DatasetRecord | None:
-        record = self._datasets.get(dataset_id)
-        if not record:
-            return None
-        updated = record.model_copy(update={"locked": locked, "updated_at": datetime.utcnow()})
-        self._datasets[dataset_id] = updated
-        return updated
+        return self._commit_dataset(dataset_id, lambda uow, dataset: uow.set_dataset_lock(dataset, locked))
+
+    def set_dataset_file(
+        self,
+        dataset_id: str,
+        file_name: str | None,
+        sha256: str,
+        size: int,
+        arrays_id: str | None = None,
+    ) -> DatasetRecord | None:
+        return self._commit_dataset(
+            dataset_id,
+            lambda uow, dataset: uow.set_dataset_file(dataset, file_name, sha256, size, arrays_id),
+        )
 
     def create_access_request(
         self, dataset_id: str, requester_id: str, payload: AccessRequestCreate
     ) -> AccessRequestRecord:
-        request_id = str(uuid4())
-        record = AccessRequestRecord(
-            id=request_id,
-            dataset_id=dataset_id,
-            requester_id=requester_id,
-            reason=payload.reason,
-        )
-        self._requests[request_id] = record
+        with self.unit_of_work() as uow:
+            record = uow.create_access_request(dataset_id, requester_id, payload)
         return record
 
-    def list_access_requests(self, dataset_id: str) -> list[AccessRequestRecord]:
-        return [req for req in self._requests.values() if req.dataset_id == dataset_id]
-
     def create_role_upgrade_request(
         self, requester_id: str, payload: RoleUpgradeRequestCreate
     ) -> RoleUpgradeRequestRecord:
-        request_id = str(uuid4())
         record = RoleUpgradeRequestRecord(
-            id=request_id,
+            id=str(uuid4()),
             requester_id=requester_id,
             requested_role=payload.requested_role,
             reason=payload.reason,
         )
-        self._role_requests[request_id] = record
+        with self.unit_of_work() as uow:
+            uow.create_role_upgrade_request(record)
         return record
 
-    def list_role_upgrade_requests(self) -> list[RoleUpgradeRequestRecord]:
-        return list(self._role_requests.values())
-
     def set_role_upgrade_request_status(
         self, request_id: str, status: str
     ) -> RoleUpgradeRequestRecord | None:
-        record = self._role_requests.get(request_id)
-        if not record:
-            return None
-        updated = record.model_copy(update={"status": status})
-        self._role_requests[request_id] = updated
-        return updated
+        while True:
+            request = self.get_role_upgrade_request(request_id)
+            if not request:
+                return None
+            try:
+                with self.unit_of_work() as uow:
+                    updated = uow.set_role_upgrade_request_status(request, status)
+            except StorageConflict:
+                continue
+            return updated
 
     def update_user_role(self, user_id: str, role: str) -> UserRecord | None:
-        record = self._users.get(user_id)
-        if not record:
+        if not self.get_user(user_id):
             return None
-        updated = record.model_copy(update={"role": role})
-        self._users[user_id] = updated
-        return updated
+        with self.unit_of_work() as uow:
+            uow.update_user_role(user_id, role)
+        return self.get_user(user_id)
 
     def create_audit_log(
         self, dataset_id: str, actor_id: str, action: str, details: dict | None = None
     ) -> AuditLogRecord:
-        log_id = str(uuid4())
-        record = AuditLogRecord(
-            id=log_id,
-            dataset_id=dataset_id,
-            actor_id=actor_id,
-            action=action,
-            details=details or {},
-        )
-        self._audit_logs[log_id] = record
+        with self.unit_of_work() as uow:
+            record = uow.create_audit_log(dataset_id, actor_id, action, details)
         return record
 
-    def list_audit_logs(self, dataset_id: str) -> list[AuditLogRecord]:
-        return [log for log in self._audit_logs.values() if log.dataset_id == dataset_id]
+    def update_job(
+        self, job_id: str, changes: dict[str, Any], expected: dict[str, Any] | None = None
+    ) -> JobRecord | None:
+        job = self.get_job(job_id)
+        if not job:
+            return None
+        with self.unit_of_work() as uow:
+            updated = uow.update_job(job, changes, expected)
+        return updated
+
+
+class InMemoryStore(_UnitOfWorkWrites):
+    def __init__(self, snapshot_interval: int = 50, bus: EventBus | None = None) -> None:
+        self._snapshot_interval = snapshot_interval
+        self._bus = bus
+        self._lock = RLock()
+        self._users: dict[str, UserRow] = {}
+        self._user_emails: dict[str, str] = {}
+        self._datasets: dict[str, DatasetRow] = {}
+        self._requests: dict[str, AccessRequestRow] = {}
+        self._requests_by_dataset: dict[str, list[str]] = {}
+        self._role_requests: dict[str, RoleUpgradeRequestRow] = {}
+        self._audit_logs = AuditLogTable()
+        self._versions: dict[str, list[DatasetVersionRecord]] = {}
+        self._counts: Counter[Key] = Counter()
+        self._jobs: dict[str, JobRow] = {}
+        self._active_jobs: dict[str, str] = {}
+
+    def ensure_indexes(self) -> None:
+        pass
+
+    def warm_up(self) -> None:
+        pass
+
+    def health(self) -> dict[str, Any]:
+        return {"backend": "memory", "ok": True}
+
+    def close(self) -> None:
+        pass
+
+    def _commit(self, uow: UnitOfWork) -> None:
+        rows = {
+            USERS: self._users,
+            DATASETS: self._datasets,
+            ACCESS_REQUESTS: self._requests,
+            ROLE_REQUESTS: self._role_requests,
+            JOBS: self._jobs,
+        }
+        with self._lock:
+            # Check every guard before applying anything so a conflict leaves
+            # the store untouched.
+            for op in uow.operations:
+                if isinstance(op, Update) and op.guarded:
+                    row = rows[op.collection].get(op.id)
+                    if (
+                        row is None
+                        or (op.expected_version is not None and row.version != op.expected_version)
+                        or any(getattr(row, name) != value for name, value in (op.expected or {}).items())
+                    ):
+                        raise StorageConflict(f"{op.collection} {op.id} changed concurrently")
+                if isinstance(op, Insert) and op.collection == JOBS:
+                    if op.record.active_key in self._active_jobs:
+                        raise DuplicateJob(op.record.active_key)
+            for op in uow.operations:
+                if isinstance(op, Update):
+                    row = rows[op.collection].get(op.id)
+                    if row is not None:
+                        before = {name: getattr(row, name) for name in DIMENSIONS.get(op.collection, ())}
+                        if op.collection == JOBS and "active_key" in op.changes:
+                            self._active_jobs.pop(row.active_key, None)
+                            if op.changes["active_key"] is not None:
+                                self._active_jobs[op.changes["active_key"]] = op.id
+                        rows[op.collection][op.id] = row.updated(op.changes)
+                        self._counts.update(update_counts(op.collection, before, op.changes))
+                    continue
+                self._counts.update(record_counts(op.collection, op.record))
+                if op.collection == USERS:
+                    self._users[op.record.id] = UserRow.from_record(op.record)
+                    self._user_emails[op.record.email] = op.record.id
+                elif op.collection == DATASETS:
+                    self._datasets[op.record.id] = DatasetRow.from_record(op.record)
+                elif op.collection == VERSIONS:
+                    self._versions.setdefault(op.record.dataset_id, []).append(op.record)
+                elif op.collection == ACCESS_REQUESTS:
+                    self._requests[op.record.id] = AccessRequestRow.from_record(op.record)
+                    self._requests_by_dataset.setdefault(op.record.dataset_id, []).append(op.record.id)
+                elif op.collection == ROLE_REQUESTS:
+                    self._role_requests[op.record.id] = RoleUpgradeRequestRow.from_record(op.record)
+                elif op.collection == AUDIT_LOGS:
+                    self._audit_logs.append(op.record)
+                elif op.collection == JOBS:
+                    self._jobs[op.record.id] = JobRow.from_record(op.record)
+                    if op.record.active_key is not None:
+                        self._active_jobs[op.record.active_key] = op.record.id
+
+    def get_user_by_email(self, email: str) -> UserRecord | None:
+        user_id = self._user_emails.get(email)
+        return self.get_user(user_id) if user_id else None
+
+    def get_user(self, user_id: str) -> UserRecord | None:
+        row = self._users.get(user_id)
+        return row.to_record() if row else None
+
+    def list_users(self) -> list[UserRecord]:
+        return [row.to_record() for row in self._users.values()]
+
+    def list_datasets(self, drug_name: str | None = None) -> list[DatasetRecord]:
+        return [
+            row.to_record()
+            for row in self._datasets.values()
+            if drug_name is None or row.drug_name == drug_name
+        ]
+
+    def get_dataset(self, dataset_id: str) -> DatasetRecord | None:
+        row = self._datasets.get(dataset_id)
+        return row.to_record() if row else None
+
+    def list_dataset_fields(self, fields: list[str], drug_name: str | None = None) -> list[dict[str, Any]]:
+        return [
+            row.to_fields(fields)
+            for row in self._datasets.values()
+            if drug_name is None or row.drug_name == drug_name
+        ]
+
+    def get_dataset_fields(self, dataset_id: str, fields: list[str]) -> dict[str, Any] | None:
+        row = self._datasets.get(dataset_id)
+        return row.to_fields(fields) if row else None
+
+    def get_version_chain(self, dataset_id: str, version: int) -> list[DatasetVersionRecord]:
+        entries = self._versions.get(dataset_id, [])
+        if not 1 <= version <= len(entries):
+            return []
+        start = version - 1
+        while entries[start].snapshot is None:
+            start -= 1
+        return entries[start:version]
+
+    def list_access_requests(self, dataset_id: str) -> list[AccessRequestRecord]:
+        return [self._requests[req_id].to_record() for req_id in self._requests_by_dataset.get(dataset_id, [])]
+
+    def get_role_upgrade_request(self, request_id: str) -> RoleUpgradeRequestRecord | None:
+        row = self._role_requests.get(request_id)
+        return row.to_record() if row else None
 
+    def list_role_upgrade_requests(self) -> list[RoleUpgradeRequestRecord]:
+        return [row.to_record() for row in self._role_requests.values()]
 
-class MongoStore:
-    def __init__(self, uri: str, database: str) -> None:
+    def list_audit_logs(self, dataset_id: str) -> list[AuditLogRecord]:
+        return self._audit_logs.for_dataset(dataset_id)
+
+    def get_stats(self) -> StatsReport:
+        with self._lock:
+            return build_report(self._counts)
+
+    def reconcile_stats(self) -> dict[Key, int]:
+        with self._lock:
+            actual: Counter[Key] = Counter()
+            for collection, rows in (
+                (DATASETS, self._datasets),
+                (ACCESS_REQUESTS, self._requests),
+                (ROLE_REQUESTS, self._role_requests),
+            ):
+                for row in rows.values():
+                    actual.update(record_counts(collection, row))
+            corrections = drift(self._counts, actual)
+            self._counts = actual
+        return corrections
+
+    def get_job(self, job_id: str) -> JobRecord | None:
+        row = self._jobs.get(job_id)
+        return row.to_record() if row else None
+
+    def get_job_by_key(self, active_key: str) -> JobRecord | None:
+        job_id = self._active_jobs.get(active_key)
+        return self.get_job(job_id) if job_id else None
+
+    def list_jobs(self, statuses: Collection[str]) -> list[JobRecord]:
+        return [row.to_record() for row in self._jobs.values() if row.status in statuses]
+
+    def _publish(self, dataset_id: str, name: str, data: str) -> None:
+        if self._bus is None:
+            return
+        topics = {ALL_DATASETS, dataset_topic(dataset_id)}
+        row = self._datasets.get(dataset_id)
+        if row:
+            topics.add(owner_topic(row.owner_id))
+        self._bus.publish(topics, name, data)
+
+
+def _projection(fields: list[str]) -> dict[str, int]:
+    return {"_id": 0, **{name: 1 for name in fields}}
+
+
+def _dataset(doc: dict[str, Any]) -> DatasetRecord:
+    # Documents written before versioning have no version; read them as
+    # version 0 so their next update is stored as a snapshot.
+    return DatasetRecord(**{**doc, "version": doc.get("version") or 0})
+
+
+def _with_defaults(doc: dict[str, Any], fields: list[str]) -> dict[str, Any]:
+    # Documents written before a field existed lack it; fill its static default.
+    restricted = {}
+    for name in fields:
+        if name in doc:
+            restricted[name] = doc[name]
+        elif name == "version":
+            restricted[name] = 0
+        else:
+            default = DatasetRecord.model_fields[name].default
+            restricted[name] = None if default is PydanticUndefined else default
+    return restricted
+
+
+def _is_duplicate_key(exc: Exception) -> bool:
+    from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+    if isinstance(exc, DuplicateKeyError):
+        return True
+    if isinstance(exc, BulkWriteError):
+        errors = exc.details.get("writeErrors", [])
+    else:
+        # ClientBulkWriteException from MongoClient.bulk_write.
+        errors = getattr(exc, "write_errors", None) or []
+    return any(error.get("code") == 11000 for error in errors)
+
+
+# Topologies that support multi-document transactions.
+TRANSACTIONAL_TOPOLOGIES = {"ReplicaSetWithPrimary", "Sharded", "LoadBalanced"}
+# Wire version of MongoDB 8.0, the first server with the client-level bulkWrite command.
+CLIENT_BULK_WRITE_WIRE_VERSION = 25
+
+
+class MongoStore(_UnitOfWorkWrites):
+    def __init__(
+        self,
+        uri: str,
+        database: str,
+        client_options: dict[str, Any] | None = None,
+        snapshot_interval: int = 50,
+        bus: EventBus | None = None,
+    ) -> None:
         from pymongo import MongoClient
 
-        self._client = MongoClient(uri)
+        from app.pool import PoolStats
+
+        options = dict(client_options or {})
+        self._pool_stats = PoolStats()
+        options.setdefault("event_listeners", []).append(self._pool_stats)
+        self._client = MongoClient(uri, **options)
         self._db = self._client[database]
-        self._users = self._db["users"]
-        self._datasets = self._db["datasets"]
-        self._requests = self._db["access_requests"]
-        self._role_requests = self._db["role_upgrade_requests"]
-        self._audit_logs = self._db["dataset_audit_logs"]
+        self._users = self._db[USERS]
+        self._datasets = self._db[DATASETS]
+        self._requests = self._db[ACCESS_REQUESTS]
+        self._role_requests = self._db[ROLE_REQUESTS]
+        self._audit_logs = self._db[AUDIT_LOGS]
+        self._versions = self._db[VERSIONS]
+        self._stats = self._db[STATS]
+        self._jobs = self._db[JOBS]
+        self._snapshot_interval = snapshot_interval
+        self._bus = bus
+        # Dataset owners never change, so feed routing can skip a lookup.
+        self._owners: dict[str, str] = {}
+        # Detected in warm_up once the topology is known.
+        self._transactions = False
+        self._client_bulk_write = False
+
+    def ensure_indexes(self) -> None:
         self._users.create_index("email", unique=True)
         self._datasets.create_index("owner_id")
+        self._datasets.create_index("drug_name")
         self._requests.create_index("dataset_id")
         self._role_requests.create_index("requester_id")
         self._audit_logs.create_index("dataset_id")
+        self._versions.create_index([("dataset_id", 1), ("version", 1)], unique=True)
+        self._jobs.create_index("id", unique=True)
+        self._jobs.create_index("status")
+        # Dedup of identical jobs: only jobs still holding their key take part.
+        self._jobs.create_index(
+            "active_key", unique=True, partialFilterExpression={"active_key": {"$type": "string"}}
+        )
 
-    def create_user(self, user: UserCreate) -> UserRecord:
-        user_id = str(uuid4())
-        record = UserRecord(
-            id=user_id,
-            email=user.email,
-            role=user.role,
-            hashed_password=hash_password(user.password),
+    def warm_up(self) -> None:
+        # Concurrent pings each check out their own connection, so the pool
+        # holds min_pool_size sockets before the first request arrives.
+        connections = max(self._client.options.pool_options.min_pool_size, 1)
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(lambda _: self._client.admin.command("ping"), range(connections)))
+        topology = self._client.topology_description
+        servers = [server for server in topology.server_descriptions().values() if server.is_server_type_known]
+        self._transactions = topology.topology_type_name in TRANSACTIONAL_TOPOLOGIES
+        self._client_bulk_write = bool(servers) and all(
+            server.max_wire_version >= CLIENT_BULK_WRITE_WIRE_VERSION for server in servers
         )
-        self._users.insert_one(record.model_dump())
-        return record
+
+    def health(self) -> dict[str, Any]:
+        pool_options = self._client.options.pool_options
+        report: dict[str, Any] = {
+            "backend": "mongo",
+            "pool": {
+                "max_pool_size": pool_options.max_pool_size,
+                "min_pool_size": pool_options.min_pool_size,
+                **self._pool_stats.snapshot(),
+            },
+        }
+        started = perf_counter()
+        try:
+            self._client.admin.command("ping")
+        except Exception as exc:  # noqa: BLE001 - surfaced in the probe payload
+            report.update(ok=False, error=str(exc))
+            return report
+        report.update(ok=True, ping_ms=round((perf_counter() - started) * 1000, 3))
+        return report
+
+    def close(self) -> None:
+        self._client.close()
+
+    def _commit(self, uow: UnitOfWork) -> None:
+        # Counters are incremented in the same batch as the writes they count.
+        operations = uow.operations + [
+            Increment(STATS, dimension, value, amount)
+            for (dimension, value), amount in operation_counts(uow.operations).items()
+        ]
+        from pymongo.errors import PyMongoError
+
+        try:
+            if self._transactions:
+                with self._client.start_session() as session:
+                    session.with_transaction(lambda s: self._write(operations, s))
+            else:
+                self._write(operations, None)
+        except PyMongoError as exc:
+            if uow.inserted(JOBS) and _is_duplicate_key(exc):
+                raise DuplicateJob(uow.inserted(JOBS)[0].active_key) from exc
+            raise
+        for record in uow.inserted(DATASETS):
+            self._owners[record.id] = record.owner_id
+
+    def _write(self, operations: list[Insert | Update | Increment], session: Any) -> None:
+        guarded = [isinstance(op, Update) and op.guarded for op in operations]
+        # Without a transaction a missed guard cannot be rolled back, so the
+        # single client-level bulkWrite is only used when nothing is guarded.
+        if self._client_bulk_write and (session is not None or not any(guarded)):
+            result = self._client.bulk_write(
+                [self._write_model(op, namespaced=True) for op in operations],
+                session=session,
+                verbose_results=True,
+            )
+            for index, is_guarded in enumerate(guarded):
+                if is_guarded and not result.update_results[index].matched_count:
+                    op = operations[index]
+                    raise StorageConflict(f"{op.collection} {op.id} changed concurrently")
+            return
+        # One bulk_write per collection, guarded collections first so a
+        # conflict is raised before anything else is written.
+        by_collection: dict[str, list[Insert | Update | Increment]] = {}
+        for op in operations:
+            by_collection.setdefault(op.collection, []).append(op)
+
+        def is_guarded(op: Insert | Update | Increment) -> bool:
+            return isinstance(op, Update) and op.guarded
+
+        for name in sorted(by_collection, key=lambda name: not any(map(is_guarded, by_collection[name]))):
+            ops = by_collection[name]
+            result = self._db[name].bulk_write(
+                [self._write_model(op) for op in ops], ordered=True, session=session
+            )
+            updates = [op for op in ops if isinstance(op, Update)]
+            if any(map(is_guarded, updates)) and result.matched_count < len(updates):
+                raise StorageConflict(f"{name} changed concurrently")
+
+    def _write_model(self, op: Insert | Update | Increment, namespaced: bool = False) -> Any:
+        from pymongo import InsertOne, UpdateOne
+
+        namespace = {"namespace": f"{self._db.name}.{op.collection}"} if namespaced else {}
+        if isinstance(op, Insert):
+            return InsertOne(op.record.model_dump(), **namespace)
+        if isinstance(op, Increment):
+            return UpdateOne(
+                {"_id": op.id},
+                {"$inc": {"count": op.amount}, "$setOnInsert": {"dimension": op.dimension, "value": op.value}},
+                upsert=True,
+                **namespace,
+            )
+        query: dict[str, Any] = {"id": op.id}
+        if op.expected_version is not None:
+            # Version 0 stands for documents written before versioning, which
+            # have no version field.
+            query["version"] = op.expected_version or None
+        query.update(op.expected or {})
+        return UpdateOne(query, {"$set": op.changes}, **namespace)
 
     def get_user_by_email(self, email: str) -> UserRecord | None:
         doc = self._users.find_one({"email": email})
@@ -252,97 +744,115 @@ class MongoStore:
     def list_users(self) -> list[UserRecord]:
         return [UserRecord(**doc) for doc in self._users.find({})]
 
-    def create_dataset(self, data: DatasetCreate, owner_id: str) -> DatasetRecord:
-        dataset_id = str(uuid4())
-        record = DatasetRecord(
-            id=dataset_id,
-            drug_name=data.drug_name,
-            study_id=data.study_id,
-            dataset_type=data.dataset_type,
-            metadata=data.metadata,
-            file_name=data.file_name,
-            owner_id=owner_id,
-        )
-        self._datasets.insert_one(record.model_dump())
-        return record
-
-    def list_datasets(self) -> list[DatasetRecord]:
-        return [DatasetRecord(**doc) for doc in self._datasets.find({})]
+    def list_datasets(self, drug_name: str | None = None) -> list[DatasetRecord]:
+        query = {} if drug_name is None else {"drug_name": drug_name}
+        return [_dataset(doc) for doc in self._datasets.find(query)]
 
     def get_dataset(self, dataset_id: str) -> DatasetRecord | None:
         doc = self._datasets.find_one({"id": dataset_id})
-        return DatasetRecord(**doc) if doc else None
+        return _dataset(doc) if doc else None
 
-    def update_dataset(self, dataset_id: str, data: DatasetUpdate) -> DatasetRecord | None:
-        update = data.model_dump(exclude_unset=True)
-        if update:
-            update["updated_at"] = datetime.utcnow()
-            self._datasets.update_one({"id": dataset_id}, {"$set": update})
-        return self.get_dataset(dataset_id)
+    def list_dataset_fields(self, fields: list[str], drug_name: str | None = None) -> list[dict[str, Any]]:
+        query = {} if drug_name is None else {"drug_name": drug_name}
+        return [_with_defaults(doc, fields) for doc in self._datasets.find(query, _projection(fields))]
 
-    def set_dataset_lock(self, dataset_id: str, locked: bool) -> DatasetRecord | None:
-        self._datasets.update_one(
-            {"id": dataset_id}, {"$set": {"locked": locked, "updated_at": datetime.utcnow()}}
-        )
-        return self.get_dataset(dataset_id)
+    def get_dataset_fields(self, dataset_id: str, fields: list[str]) -> dict[str, Any] | None:
+        doc = self._datasets.find_one({"id": dataset_id}, _projection(fields))
+        return _with_defaults(doc, fields) if doc else None
 
-    def create_access_request(
-        self, dataset_id: str, requester_id: str, payload: AccessRequestCreate
-    ) -> AccessRequestRecord:
-        request_id = str(uuid4())
-        record = AccessRequestRecord(
-            id=request_id,
-            dataset_id=dataset_id,
-            requester_id=requester_id,
-            reason=payload.reason,
+    def get_version_chain(self, dataset_id: str, version: int) -> list[DatasetVersionRecord]:
+        snapshot = self._versions.find_one(
+            {"dataset_id": dataset_id, "version": {"$lte": version}, "snapshot": {"$ne": None}},
+            sort=[("version", -1)],
         )
-        self._requests.insert_one(record.model_dump())
-        return record
+        if not snapshot:
+            return []
+        chain = [DatasetVersionRecord(**snapshot)]
+        chain.extend(
+            DatasetVersionRecord(**doc)
+            for doc in self._versions.find(
+                {"dataset_id": dataset_id, "version": {"$gt": snapshot["version"], "$lte": version}}
+            ).sort("version", 1)
+        )
+        return chain if chain[-1].version == version else []
 
     def list_access_requests(self, dataset_id: str) -> list[AccessRequestRecord]:
         return [AccessRequestRecord(**doc) for doc in self._requests.find({"dataset_id": dataset_id})]
 
-    def create_role_upgrade_request(
-        self, requester_id: str, payload: RoleUpgradeRequestCreate
-    ) -> RoleUpgradeRequestRecord:
-        request_id = str(uuid4())
-        record = RoleUpgradeRequestRecord(
-            id=request_id,
-            requester_id=requester_id,
-            requested_role=payload.requested_role,
-            reason=payload.reason,
-        )
-        self._role_requests.insert_one(record.model_dump())
-        return record
+    def get_role_upgrade_request(self, request_id: str) -> RoleUpgradeRequestRecord | None:
+        doc = self._role_requests.find_one({"id": request_id})
+        return RoleUpgradeRequestRecord(**doc) if doc else None
 
     def list_role_upgrade_requests(self) -> list[RoleUpgradeRequestRecord]:
         return [RoleUpgradeRequestRecord(**doc) for doc in self._role_requests.find({})]
 
-    def set_role_upgrade_request_status(
-        self, request_id: str, status: str
-    ) -> RoleUpgradeRequestRecord | None:
-        self._role_requests.update_one({"id": request_id}, {"$set": {"status": status}})
-        doc = self._role_requests.find_one({"id": request_id})
-        return RoleUpgradeRequestRecord(**doc) if doc else None
+    def list_audit_logs(self, dataset_id: str) -> list[AuditLogRecord]:
+        return [AuditLogRecord(**doc) for doc in self._audit_logs.find({"dataset_id": dataset_id})]
 
-    def update_user_role(self, user_id: str, role: str) -> UserRecord | None:
-        self._users.update_one({"id": user_id}, {"$set": {"role": role}})
-        doc = self._users.find_one({"id": user_id})
-        return UserRecord(**doc) if doc else None
+    def get_job(self, job_id: str) -> JobRecord | None:
+        doc = self._jobs.find_one({"id": job_id})
+        return JobRecord(**doc) if doc else None
 
-    def create_audit_log(
-        self, dataset_id: str, actor_id: str, action: str, details: dict | None = None
-    ) -> AuditLogRecord:
-        log_id = str(uuid4())
-        record = AuditLogRecord(
-            id=log_id,
-            dataset_id=dataset_id,
-            actor_id=actor_id,
-            action=action,
-            details=details or {},
+    def get_job_by_key(self, active_key: str) -> JobRecord | None:
+        doc = self._jobs.find_one({"active_key": active_key})
+        return JobRecord(**doc) if doc else None
+
+    def list_jobs(self, statuses: Collection[str]) -> list[JobRecord]:
+        return [JobRecord(**doc) for doc in self._jobs.find({"status": {"$in": list(statuses)}})]
+
+    def _counts(self, session: Any = None) -> Counter[Key]:
+        return Counter(
+            {(doc["dimension"], doc["value"]): doc["count"] for doc in self._stats.find({}, session=session)}
         )
-        self._audit_logs.insert_one(record.model_dump())
-        return record
 
-    def list_audit_logs(self, dataset_id: str) -> list[AuditLogRecord]:
-        return [AuditLogRecord(**doc) for doc in self._audit_logs.find({"dataset_id": dataset_id})]
+    def get_stats(self) -> StatsReport:
+        return build_report(self._counts())
+
+    def _drift(self, session: Any = None) -> Counter[Key]:
+        maintained = self._counts(session)
+        actual: Counter[Key] = Counter()
+        for collection, fields in DIMENSIONS.items():
+            for field in fields:
+                # Records written before locking existed have no locked field.
+                group = {"$ifNull": ["$locked", False]} if field == "locked" else f"${field}"
+                pipeline = [{"$group": {"_id": group, "count": {"$sum": 1}}}]
+                for doc in self._db[collection].aggregate(pipeline, session=session):
+                    actual[key(collection, field, doc["_id"])] += doc["count"]
+        return drift(maintained, actual)
+
+    def reconcile_stats(self) -> dict[Key, int]:
+        if self._transactions:
+            from pymongo.read_concern import ReadConcern
+
+            # Counters and records read from one snapshot agree exactly.
+            with self._client.start_session() as session:
+                with session.start_transaction(read_concern=ReadConcern("snapshot")):
+                    corrections = self._drift(session)
+        else:
+            # Without snapshots a write committing between reading the
+            # counters and the records looks like drift, but only in the pass
+            # it raced with; apply only what two passes agree on.
+            first, second = self._drift(), self._drift()
+            corrections = Counter({name: amount for name, amount in first.items() if second.get(name) == amount})
+        # Applied as increments so writes committed since the scan are kept.
+        if corrections:
+            self._stats.bulk_write(
+                [
+                    self._write_model(Increment(STATS, dimension, value, amount))
+                    for (dimension, value), amount in corrections.items()
+                ]
+            )
+        return corrections
+
+    def _publish(self, dataset_id: str, name: str, data: str) -> None:
+        if self._bus is None:
+            return
+        topics = {ALL_DATASETS, dataset_topic(dataset_id)}
+        owner_id = self._owners.get(dataset_id)
+        if owner_id is None:
+            doc = self._datasets.find_one({"id": dataset_id}, {"owner_id": 1})
+            if doc:
+                owner_id = self._owners[dataset_id] = doc["owner_id"]
+        if owner_id is not None:
+            topics.add(owner_topic(owner_id))
+        self._bus.publish(topics, name, data)
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from threading import Lock
+
+import numpy as np
+
+from app.ingest import ArrayStore
+from app.models import DatasetRecord, DrugSummary, ExposureStats, StudySummary
+from app.nca import compute_cached
+from app.storage import Storage
+
+PERCENTILES = (5, 50, 95)
+
+
+@dataclass(frozen=True)
+class _Exposure:
+    study_id: str
+    cmax: np.ndarray
+    auc_0_t: np.ndarray
+
+
+class _Values:
+    """Running sum and sorted copy of the finite values added so far.
+
+    Adding or removing one dataset's values merges them into the sorted
+    array instead of re-collecting and re-sorting every dataset's values,
+    and percentiles are read by position.
+    """
+
+    def __init__(self) -> None:
+        self.sorted = np.empty(0)
+        self.total = 0.0
+
+    def add(self, values: np.ndarray) -> None:
+        values = np.sort(values[np.isfinite(values)])
+        self.sorted = np.insert(self.sorted, np.searchsorted(self.sorted, values), values)
+        self.total += float(values.sum())
+
+    def remove(self, values: np.ndarray) -> None:
+        values = np.sort(values[np.isfinite(values)])
+        # Equal values take consecutive slots from the leftmost match.
+        positions = np.searchsorted(self.sorted, values) + (
+            np.arange(len(values)) - np.searchsorted(values, values)
+        )
+        self.sorted = np.delete(self.sorted, positions)
+        self.total = float(self.total - values.sum()) if len(self.sorted) else 0.0
+
+    def stats(self) -> ExposureStats:
+        count = len(self.sorted)
+        if not count:
+            return ExposureStats()
+        # Linear interpolation between closest ranks, as np.percentile does.
+        ranks = np.array(PERCENTILES) / 100 * (count - 1)
+        lower = np.floor(ranks).astype(int)
+        upper = np.minimum(lower + 1, count - 1)
+        p5, p50, p95 = self.sorted[lower] + (self.sorted[upper] - self.sorted[lower]) * (ranks - lower)
+        return ExposureStats(mean=self.total / count, p5=float(p5), p50=float(p50), p95=float(p95))
+
+
+@dataclass
+class _Aggregate:
+    datasets: int = 0
+    subjects: int = 0
+    cmax: _Values = field(default_factory=_Values)
+    auc_0_t: _Values = field(default_factory=_Values)
+
+    def add(self, exposure: _Exposure) -> None:
+        self.datasets += 1
+        self.subjects += len(exposure.cmax)
+        self.cmax.add(exposure.cmax)
+        self.auc_0_t.add(exposure.auc_0_t)
+
+    def remove(self, exposure: _Exposure) -> None:
+        self.datasets -= 1
+        self.subjects -= len(exposure.cmax)
+        self.cmax.remove(exposure.cmax)
+        self.auc_0_t.remove(exposure.auc_0_t)
+
+
+@dataclass
+class _DrugAggregate:
+    total: _Aggregate = field(default_factory=_Aggregate)
+    studies: dict[str, _Aggregate] = field(default_factory=dict)
+
+    def add(self, exposure: _Exposure) -> None:
+        self.total.add(exposure)
+        self.studies.setdefault(exposure.study_id, _Aggregate()).add(exposure)
+
+    def remove(self, exposure: _Exposure) -> None:
+        self.total.remove(exposure)
+        study = self.studies[exposure.study_id]
+        study.remove(exposure)
+        if not study.datasets:
+            del self.studies[exposure.study_id]
+
+
+@dataclass(frozen=True)
+class _Entry:
+    version: int
+    drug_name: str
+    exposure: _Exposure | None
+
+
+class DrugSummaries:
+    """Materialised per-drug exposure summaries.
+
+    Each dataset of a requested drug keeps one entry, tagged with the dataset
+    version it was computed from, and each drug keeps running aggregates of
+    its entries. Writes swap only the touched dataset's contribution in and
+    out of those aggregates. Every read lists the drug's dataset versions
+    from storage and re-reads only datasets whose entry is missing or older,
+    so writes made by other processes are picked up. NCA runs outside the
+    lock, and an entry only ever moves forward in version, so late or
+    concurrent refreshes cannot reinstate an older file's exposure.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._entries: dict[str, _Entry] = {}
+        self._by_drug: dict[str, set[str]] = {}
+        self._aggregates: dict[str, _DrugAggregate] = {}
+        self._summaries: dict[str, DrugSummary] = {}
+        self._requested: set[str] = set()
+        self._loading: Counter[str] = Counter()
+
+    @staticmethod
+    def _exposure(dataset: DatasetRecord, arrays: ArrayStore) -> _Exposure | None:
+        if not dataset.arrays_id:
+            return None
+        result = compute_cached(arrays, dataset.arrays_id)
+        return _Exposure(dataset.study_id, result.cmax, result.auc_0_t)
+
+    def _tracked(self, drug_name: str) -> bool:
+        return drug_name in self._requested or self._loading[drug_name] > 0
+
+    def _is_current(self, dataset_id: str, version: int) -> bool:
+        entry = self._entries.get(dataset_id)
+        return entry is not None and entry.version >= version
+
+    def refresh(self, dataset: DatasetRecord, arrays: ArrayStore) -> None:
+        """Apply a created or updated dataset to the summaries it affects."""
+        with self._lock:
+            entry = self._entries.get(dataset.id)
+            if self._is_current(dataset.id, dataset.version):
+                return
+            if not self._tracked(dataset.drug_name) and not (entry and self._tracked(entry.drug_name)):
+                # The next read of the drug fetches the dataset from storage.
+                return
+        exposure = self._exposure(dataset, arrays)
+        with self._lock:
+            self._apply(dataset, exposure)
+
+    def summary(self, drug_name: str, store: Storage, arrays: ArrayStore) -> DrugSummary:
+        with self._lock:
+            # Refreshes arriving while the drug is read are kept, not dropped.
+            self._loading[drug_name] += 1
+        try:
+            rows = store.list_dataset_fields(["id", "version"], drug_name=drug_name)
+            versions = {row["id"]: row["version"] for row in rows}
+            with self._lock:
+                stale = [key for key, version in versions.items() if not self._is_current(key, version)]
+                # Entries the store no longer lists under this drug were moved elsewhere.
+                moved = self._by_drug.get(drug_name, set()) - versions.keys()
+                stale += sorted(moved)
+            for dataset_id in stale:
+                dataset = store.get_dataset(dataset_id)
+                exposure = self._exposure(dataset, arrays) if dataset else None
+                with self._lock:
+                    if dataset is None:
+                        self._remove(dataset_id)
+                    else:
+                        self._apply(dataset, exposure)
+        finally:
+            with self._lock:
+                self._loading[drug_name] -= 1
+                if not self._loading[drug_name]:
+                    del self._loading[drug_name]
+        with self._lock:
+            # Unknown drug names are answered but not remembered.
+            if drug_name in self._by_drug:
+                self._requested.add(drug_name)
+            summary = self._summaries.get(drug_name)
+            if summary is None:
+                summary = self._summarise(drug_name)
+                if drug_name in self._by_drug:
+                    self._summaries[drug_name] = summary
+            return summary
+
+    def _apply(self, dataset: DatasetRecord, exposure: _Exposure | None) -> None:
+        """Store ``dataset``'s entry unless a newer one is stored."""
+        if self._is_current(dataset.id, dataset.version):
+            return
+        self._remove(dataset.id)
+        self._entries[dataset.id] = _Entry(dataset.version, dataset.drug_name, exposure)
+        self._by_drug.setdefault(dataset.drug_name, set()).add(dataset.id)
+        if exposure is not None:
+            self._aggregates.setdefault(dataset.drug_name, _DrugAggregate()).add(exposure)
+        self._summaries.pop(dataset.drug_name, None)
+
+    def _remove(self, dataset_id: str) -> None:
+        entry = self._entries.pop(dataset_id, None)
+        if entry is None:
+            return
+        datasets = self._by_drug[entry.drug_name]
+        datasets.discard(dataset_id)
+        if not datasets:
+            del self._by_drug[entry.drug_name]
+        if entry.exposure is not None:
+            aggregate = self._aggregates[entry.drug_name]
+            aggregate.remove(entry.exposure)
+            if not aggregate.total.datasets:
+                del self._aggregates[entry.drug_name]
+        self._summaries.pop(entry.drug_name, None)
+
+    def _summarise(self, drug_name: str) -> DrugSummary:
+        aggregate = self._aggregates.get(drug_name, _DrugAggregate())
+        studies = [
+            StudySummary(
+                study_id=study_id,
+                datasets=study.datasets,
+                subjects=study.subjects,
+                cmax=study.cmax.stats(),
+                auc_0_t=study.auc_0_t.stats(),
+            )
+            for study_id, study in sorted(aggregate.studies.items())
+        ]
+        return DrugSummary(
+            drug_name=drug_name,
+            datasets=aggregate.total.datasets,
+            subjects=aggregate.total.subjects,
+            cmax=aggregate.total.cmax.stats(),
+            auc_0_t=aggregate.total.auc_0_t.stats(),
+            studies=studies,
+        )
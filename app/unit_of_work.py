@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+from uuid import uuid4
+
+from pydantic import BaseModel
+
+from app.models import (
+    AccessRequestCreate,
+    AccessRequestRecord,
+    AuditLogRecord,
+    DatasetCreate,
+    DatasetRecord,
+    JobRecord,
+    RoleUpgradeRequestRecord,
+    UserRecord,
+)
+from app.versions import make_version
+
+USERS = "users"
+DATASETS = "datasets"
+ACCESS_REQUESTS = "access_requests"
+ROLE_REQUESTS = "role_upgrade_requests"
+AUDIT_LOGS = "dataset_audit_logs"
+VERSIONS = "dataset_versions"
+STATS = "stats"
+JOBS = "jobs"
+
+
+class StorageConflict(Exception):
+    """A guarded write found its record changed since it was read."""
+
+
+class DuplicateJob(StorageConflict):
+    """An identical job is already queued, running or finished."""
+
+
+@dataclass(frozen=True)
+class Insert:
+    collection: str
+    record: BaseModel
+
+
+@dataclass(frozen=True)
+class Update:
+    collection: str
+    id: str
+    changes: dict[str, Any]
+    # Only applied when the stored record is still at this version.
+    expected_version: int | None = None
+    # Values of the changed fields as read, for maintaining counters.
+    previous: dict[str, Any] | None = None
+    # Only applied when the stored record still has these field values.
+    expected: dict[str, Any] | None = None
+
+    @property
+    def guarded(self) -> bool:
+        return self.expected_version is not None or bool(self.expected)
+
+
+@dataclass(frozen=True)
+class Increment:
+    collection: str
+    dimension: str
+    value: str
+    amount: int
+
+    @property
+    def id(self) -> str:
+        return f"{self.dimension}:{self.value}"
+
+
+@dataclass
+class UnitOfWork:
+    """Collects the writes of one request so a store can commit them together.
+
+    Methods build and return the resulting records immediately; nothing is
+    written until the owning store commits the collected ``operations``.
+    """
+
+    snapshot_interval: int = 50
+    operations: list[Insert | Update] = field(default_factory=list)
+
+    def create_user(self, record: UserRecord) -> UserRecord:
+        self.operations.append(Insert(USERS, record))
+        return record
+
+    def update_user_role(self, user_id: str, role: str) -> None:
+        self.operations.append(Update(USERS, user_id, {"role": role}))
+
+    def create_dataset(self, data: DatasetCreate, owner_id: str) -> DatasetRecord:
+        record = DatasetRecord(
+            id=str(uuid4()),
+            drug_name=data.drug_name,
+            study_id=data.study_id,
+            dataset_type=data.dataset_type,
+            metadata=data.metadata,
+            file_name=data.file_name,
+            owner_id=owner_id,
+        )
+        self.operations.append(Insert(DATASETS, record))
+        version = make_version(record.id, 1, None, record.model_dump(mode="json"), self.snapshot_interval)
+        self.operations.append(Insert(VERSIONS, version))
+        return record
+
+    def update_dataset(self, dataset: DatasetRecord, changes: dict[str, Any]) -> DatasetRecord:
+        """Apply ``changes`` on top of ``dataset`` as its next version."""
+        if not changes:
+            return dataset
+        updated = dataset.model_copy(
+            update={**changes, "version": dataset.version + 1, "updated_at": datetime.utcnow()}
+        )
+        self.operations.append(
+            Update(
+                DATASETS,
+                dataset.id,
+                {**changes, "version": updated.version, "updated_at": updated.updated_at},
+                expected_version=dataset.version,
+                previous={name: getattr(dataset, name) for name in changes},
+            )
+        )
+        # Version 0 marks a dataset written before versioning: it has no
+        # stored entry to patch against, so its next version is a snapshot.
+        previous = dataset.model_dump(mode="json") if dataset.version else None
+        self.operations.append(
+            Insert(
+                VERSIONS,
+                make_version(
+                    dataset.id, updated.version, previous, updated.model_dump(mode="json"), self.snapshot_interval
+                ),
+            )
+        )
+        return updated
+
+    def set_dataset_lock(self, dataset: DatasetRecord, locked: bool) -> DatasetRecord:
+        changes = {"locked": locked, "updated_at": datetime.utcnow()}
+        # Guarded on the value read: two concurrent toggles must not both
+        # apply their counter changes.
+        previous = {"locked": dataset.locked}
+        self.operations.append(Update(DATASETS, dataset.id, changes, previous=previous, expected=previous))
+        return dataset.model_copy(update=changes)
+
+    def set_dataset_file(
+        self,
+        dataset: DatasetRecord,
+        file_name: str | None,
+        sha256: str,
+        size: int,
+        arrays_id: str | None = None,
+    ) -> DatasetRecord:
+        return self.update_dataset(
+            dataset,
+            {"file_name": file_name, "file_sha256": sha256, "file_size": size, "arrays_id": arrays_id},
+        )
+
+    def create_access_request(
+        self, dataset_id: str, requester_id: str, payload: AccessRequestCreate
+    ) -> AccessRequestRecord:
+        record = AccessRequestRecord(
+            id=str(uuid4()),
+            dataset_id=dataset_id,
+            requester_id=requester_id,
+            reason=payload.reason,
+        )
+        self.operations.append(Insert(ACCESS_REQUESTS, record))
+        return record
+
+    def create_role_upgrade_request(self, record: RoleUpgradeRequestRecord) -> RoleUpgradeRequestRecord:
+        self.operations.append(Insert(ROLE_REQUESTS, record))
+        return record
+
+    def set_role_upgrade_request_status(
+        self, request: RoleUpgradeRequestRecord, status: str
+    ) -> RoleUpgradeRequestRecord:
+        previous = {"status": request.status}
+        self.operations.append(
+            Update(ROLE_REQUESTS, request.id, {"status": status}, previous=previous, expected=previous)
+        )
+        return request.model_copy(update={"status": status})
+
+    def create_audit_log(
+        self, dataset_id: str, actor_id: str, action: str, details: dict | None = None
+    ) -> AuditLogRecord:
+        record = AuditLogRecord(
+            id=str(uuid4()),
+            dataset_id=dataset_id,
+            actor_id=actor_id,
+            action=action,
+            details=details or {},
+        )
+        self.operations.append(Insert(AUDIT_LOGS, record))
+        return record
+
+    def create_job(self, record: JobRecord) -> JobRecord:
+        self.operations.append(Insert(JOBS, record))
+        return record
+
+    def update_job(
+        self, job: JobRecord, changes: dict[str, Any], expected: dict[str, Any] | None = None
+    ) -> JobRecord:
+        changes = {**changes, "updated_at": datetime.utcnow()}
+        self.operations.append(Update(JOBS, job.id, changes, expected=expected))
+        return job.model_copy(update=changes)
+
+    def inserted(self, collection: str) -> list[Any]:
+        return [op.record for op in self.operations if isinstance(op, Insert) and op.collection == collection]
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from copy import deepcopy
+from typing import Any
+
+from app.models import DatasetVersionRecord
+
+# Fields that are not part of a dataset's versioned content.
+UNVERSIONED = {"version", "locked"}
+
+
+def _escape(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def diff(old: dict[str, Any], new: dict[str, Any], prefix: str = "") -> list[dict[str, Any]]:
+    """JSON-patch operations turning ``old`` into ``new``.
+
+    Nested objects are diffed key by key; lists and scalars are replaced whole.
+    """
+    ops: list[dict[str, Any]] = []
+    for key in old.keys() - new.keys():
+        ops.append({"op": "remove", "path": f"{prefix}/{_escape(key)}"})
+    for key, value in new.items():
+        path = f"{prefix}/{_escape(key)}"
+        if key not in old:
+            ops.append({"op": "add", "path": path, "value": value})
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            ops.extend(diff(old[key], value, path))
+        elif old[key] != value:
+            ops.append({"op": "replace", "path": path, "value": value})
+    return ops
+
+
+def apply(document: dict[str, Any], ops: list[dict[str, Any]]) -> dict[str, Any]:
+    """Apply ``ops`` to ``document`` in place and return it."""
+    for op in ops:
+        *parents, leaf = [_unescape(token) for token in op["path"].split("/")[1:]]
+        target = document
+        for token in parents:
+            target = target[token]
+        if op["op"] == "remove":
+            del target[leaf]
+        else:
+            target[leaf] = deepcopy(op["value"])
+    return document
+
+
+def content(record_document: dict[str, Any]) -> dict[str, Any]:
+    return {key: value for key, value in record_document.items() if key not in UNVERSIONED}
+
+
+def make_version(
+    dataset_id: str,
+    version: int,
+    previous: dict[str, Any] | None,
+    current: dict[str, Any],
+    snapshot_interval: int,
+) -> DatasetVersionRecord:
+    """Build the stored entry for ``version``: a full snapshot every
+    ``snapshot_interval`` versions and a delta from ``previous`` otherwise."""
+    if previous is None or (version - 1) % snapshot_interval == 0:
+        return DatasetVersionRecord(dataset_id=dataset_id, version=version, snapshot=content(current))
+    return DatasetVersionRecord(
+        dataset_id=dataset_id, version=version, patch=diff(content(previous), content(current))
+    )
+
+
+def reconstruct(chain: list[DatasetVersionRecord]) -> dict[str, Any]:
+    """Rebuild the last version in ``chain``, which starts at a snapshot."""
+    document = deepcopy(chain[0].snapshot)
+    for entry in chain[1:]:
+        apply(document, entry.patch or [])
+    return document
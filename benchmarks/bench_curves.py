@@ -0,0 +1,59 @@
+"""Downsampled curves from the pyramid versus from raw samples.
+
+Run with ``python -m benchmarks.bench_curves``. Synthetic datasets of growing
+length are saved through ``ArrayStore`` (which builds the pyramid) and the
+curves for every subject are read back at a fixed point budget.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+
+from app.curves import downsample
+from app.ingest import ArrayStore, PKArrays
+
+
+def synthetic(subjects: int, samples: int, seed: int = 0) -> PKArrays:
+    rng = np.random.default_rng(seed)
+    grid = np.linspace(0, 48, samples)
+    ke = rng.uniform(0.05, 0.3, subjects)[:, None]
+    conc = 10 * (np.exp(-ke * grid) - np.exp(-1.5 * grid)) + rng.normal(0, 0.05, (subjects, samples)).clip(0)
+    return PKArrays(
+        subjects=np.array([f"S{i:04d}" for i in range(subjects)]),
+        offsets=np.arange(subjects + 1, dtype=np.int64) * samples,
+        subject=np.repeat(np.arange(subjects, dtype=np.int32), samples),
+        time=np.tile(grid, subjects),
+        concentration=np.abs(conc).ravel(),
+        dose=np.full(subjects * samples, 100.0),
+    )
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        best = min(best, perf_counter() - started)
+    return best
+
+
+def main(subjects: int = 100, points: int = 500) -> None:
+    print(f"{subjects} subjects, {points} points per subject")
+    with TemporaryDirectory() as root:
+        store = ArrayStore(Path(root))
+        everyone = np.arange(subjects)
+        for samples in (1_000, 10_000, 100_000):
+            key = f"n{samples}"
+            store.save(key, synthetic(subjects, samples))
+            pyramid = timed(lambda: downsample(store.load_curves(key, points).select(everyone), points))
+            raw = timed(lambda: downsample(store.load(key).curves().select(everyone), points))
+            print(
+                f"{samples:>7} samples/subject: pyramid {pyramid * 1000:8.2f} ms  raw {raw * 1000:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
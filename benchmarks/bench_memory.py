@@ -0,0 +1,83 @@
+"""Bytes per audit row: Pydantic models in a dict vs. the columnar table.
+
+Run with ``python -m benchmarks.bench_memory``.
+"""
+from __future__ import annotations
+
+import tracemalloc
+from hashlib import sha256
+from uuid import uuid4
+
+from app.compact import AuditLogTable
+from app.models import AuditLogRecord
+
+ACTIONS = (
+    "create_dataset",
+    "update_dataset",
+    "lock_dataset",
+    "request_access",
+    "upload_file",
+    "submit_job",
+    "complete_job",
+)
+
+
+def details(action: str, index: int) -> dict:
+    """Details shaped like the ones the routers write; most are unique per row."""
+    if action == "create_dataset":
+        return {"dataset_type": ("pk", "pd", "raw")[index % 3]}
+    if action == "update_dataset":
+        return {"version": index, "fields": ["metadata", "study_id"][: 1 + index % 2]}
+    if action == "lock_dataset":
+        return {"locked": bool(index % 2)}
+    if action == "request_access":
+        return {"reason": f"Needed for exposure analysis, protocol {index}"}
+    if action == "upload_file":
+        return {"file_name": f"study-{index}.csv", "sha256": sha256(str(index).encode()).hexdigest(), "size": index}
+    if action == "submit_job":
+        return {"job_id": str(uuid4()), "kind": "nca"}
+    return {"job_id": str(uuid4()), "kind": "nca", "status": "succeeded"}
+
+
+def records(count: int, datasets: int = 1_000, actors: int = 200) -> list[AuditLogRecord]:
+    dataset_ids = [str(uuid4()) for _ in range(datasets)]
+    actor_ids = [str(uuid4()) for _ in range(actors)]
+    return [
+        AuditLogRecord(
+            id=str(uuid4()),
+            # Fresh string copies, as they would arrive from request parsing.
+            dataset_id="".join(dataset_ids[index % datasets]),
+            actor_id="".join(actor_ids[index % actors]),
+            action="".join(ACTIONS[index % len(ACTIONS)]),
+            details=details(ACTIONS[index % len(ACTIONS)], index),
+        )
+        for index in range(count)
+    ]
+
+
+def measure(build) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def main(count: int = 200_000) -> None:
+    def as_models() -> dict[str, AuditLogRecord]:
+        return {record.id: record for record in records(count)}
+
+    def as_table() -> AuditLogTable:
+        table = AuditLogTable()
+        for record in records(count):
+            table.append(record)
+        return table
+
+    for name, build in (("pydantic dict", as_models), ("columnar table", as_table)):
+        print(f"{name:>15}: {measure(build) / count:8.1f} bytes/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Vectorised NCA over a synthetic 100k-subject dataset.
+
+Run with ``python -m benchmarks.bench_nca``. A per-subject Python loop over a
+sample of subjects is timed alongside for comparison.
+"""
+from __future__ import annotations
+
+from time import perf_counter
+
+import numpy as np
+
+from app.ingest import PKArrays
+from app.nca import compute
+
+
+def synthetic(subjects: int = 100_000, samples: int = 12, seed: int = 0) -> PKArrays:
+    rng = np.random.default_rng(seed)
+    grid = np.array([0, 0.25, 0.5, 1, 1.5, 2, 3, 4, 6, 8, 12, 24], dtype=float)[:samples]
+    ka = rng.uniform(0.8, 2.0, subjects)[:, None]
+    ke = rng.uniform(0.05, 0.3, subjects)[:, None]
+    dose = rng.choice([50.0, 100.0, 200.0], subjects)
+    conc = dose[:, None] / 20 * ka / (ka - ke) * (np.exp(-ke * grid) - np.exp(-ka * grid))
+    return PKArrays(
+        subjects=np.array([f"S{i:06d}" for i in range(subjects)]),
+        offsets=np.arange(subjects + 1, dtype=np.int64) * samples,
+        subject=np.repeat(np.arange(subjects, dtype=np.int32), samples),
+        time=np.tile(grid, subjects),
+        concentration=conc.ravel(),
+        dose=np.repeat(dose, samples),
+    )
+
+
+def per_subject(arrays: PKArrays, limit: int) -> None:
+    for index in range(limit):
+        rows = arrays.subject_slice(index)
+        sliced = PKArrays(
+            subjects=arrays.subjects[index : index + 1],
+            offsets=np.array([0, rows.stop - rows.start]),
+            subject=np.zeros(rows.stop - rows.start, dtype=np.int32),
+            time=arrays.time[rows],
+            concentration=arrays.concentration[rows],
+            dose=arrays.dose[rows],
+        )
+        compute(sliced)
+
+
+def main() -> None:
+    arrays = synthetic()
+    print(f"{arrays.n_subjects} subjects, {arrays.n_rows} samples")
+    for method in ("linear", "log"):
+        started = perf_counter()
+        compute(arrays, method)
+        elapsed = perf_counter() - started
+        print(f"vectorised {method:>6}: {elapsed * 1000:8.1f} ms ({arrays.n_subjects / elapsed:,.0f} subjects/s)")
+    limit = 2_000
+    started = perf_counter()
+    per_subject(arrays, limit)
+    elapsed = perf_counter() - started
+    print(f"per-subject loop: {elapsed / limit * arrays.n_subjects * 1000:8.1f} ms extrapolated")
+
+
+if __name__ == "__main__":
+    main()
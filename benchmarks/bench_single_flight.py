@@ -0,0 +1,74 @@
+"""Thundering herd on one dataset: backend calls with and without single-flight.
+
+Run with ``python -m benchmarks.bench_single_flight``. Each reader thread
+repeatedly looks up the same dataset and user, as concurrent
+``GET /datasets/{id}`` requests do through ``get_current_user``, against a
+store whose lookups take ``latency`` seconds.
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+from app.models import DatasetCreate, UserCreate
+from app.singleflight import CoalescingStore
+from app.storage import InMemoryStore
+
+
+class SlowStore(InMemoryStore):
+    def __init__(self, latency: float) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    def _backend_call(self) -> None:
+        with self._calls_lock:
+            self.calls += 1
+        sleep(self.latency)
+
+    def get_dataset(self, dataset_id: str):
+        self._backend_call()
+        return super().get_dataset(dataset_id)
+
+    def get_user(self, user_id: str):
+        self._backend_call()
+        return super().get_user(user_id)
+
+
+def herd(coalesce: bool, readers: int, duration: float, latency: float) -> tuple[float, float]:
+    backend = SlowStore(latency)
+    user = backend.create_user(UserCreate(email="reader@example.com", password="secret", role="viewer"))
+    dataset = backend.create_dataset(
+        DatasetCreate(drug_name="Drug H", study_id="S1", dataset_type="pk"), owner_id=user.id
+    )
+    store = CoalescingStore(backend) if coalesce else backend
+    served = [0] * readers
+    deadline = perf_counter() + duration
+
+    def reader(index: int) -> None:
+        while perf_counter() < deadline:
+            assert store.get_user(user.id) is not None
+            assert store.get_dataset(dataset.id) is not None
+            served[index] += 1
+
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=readers) as executor:
+        list(executor.map(reader, range(readers)))
+    elapsed = perf_counter() - started
+    return sum(served) / elapsed, backend.calls / elapsed
+
+
+def main(readers: int = 200, duration: float = 2.0, latency: float = 0.005) -> None:
+    print(f"{readers} readers, {latency * 1000:.1f} ms backend latency, {duration:.0f} s")
+    for name, coalesce in (("direct", False), ("single-flight", True)):
+        requests, calls = herd(coalesce, readers, duration, latency)
+        print(
+            f"{name:>13}: {requests:10.0f} requests/s  {calls:10.0f} backend calls/s"
+            f"  ({calls / requests:.3f} calls per request)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Cold-start latency: lazy store construction vs. lifespan warm-up.
+
+Run with ``python -m benchmarks.bench_startup``. Set ``PKDB_USE_MONGO=true``
+to measure against a real MongoDB deployment.
+"""
+from __future__ import annotations
+
+from time import perf_counter
+
+from fastapi.testclient import TestClient
+
+from app import deps
+from app.main import app
+
+
+def _first_request_ms(client: TestClient) -> float:
+    started = perf_counter()
+    response = client.get("/ready")
+    elapsed = (perf_counter() - started) * 1000
+    assert response.status_code == 200, response.text
+    return elapsed
+
+
+def lazy() -> tuple[float, float]:
+    deps.close_store()
+    client = TestClient(app)
+    return 0.0, _first_request_ms(client)
+
+
+def warmed() -> tuple[float, float]:
+    deps.close_store()
+    started = perf_counter()
+    with TestClient(app) as client:
+        startup = (perf_counter() - started) * 1000
+        return startup, _first_request_ms(client)
+
+
+def main(rounds: int = 5) -> None:
+    for name, scenario in (("lazy", lazy), ("lifespan", warmed)):
+        samples = [scenario() for _ in range(rounds)]
+        startup = sorted(sample[0] for sample in samples)[rounds // 2]
+        first = sorted(sample[1] for sample in samples)[rounds // 2]
+        print(f"{name:>9}: startup {startup:8.2f} ms  first request {first:8.2f} ms")
+    deps.close_store()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.blobs import BlobStore
+from app.deps import get_array_store, get_blob_store, get_drug_summaries, get_job_queue, get_store
+from app.ingest import ArrayStore
+from app.jobs import FINISHED, JobQueue
+from app.main import app
+
+
+@pytest.fixture
+def file_stores(tmp_path: Path) -> Iterator[tuple[BlobStore, ArrayStore, JobQueue]]:
+    """Blob and array stores and the job queue parsing into them, under ``tmp_path``.
+
+    The queue starts its worker pool on the first submitted job.
+    """
+    blobs = BlobStore(tmp_path / "blobs")
+    arrays = ArrayStore(tmp_path / "arrays")
+    queue = JobQueue(
+        get_store(),
+        blobs,
+        arrays,
+        tmp_path / "jobs",
+        workers=1,
+        on_dataset_updated=lambda dataset: get_drug_summaries().refresh(dataset, arrays),
+    )
+    app.dependency_overrides[get_blob_store] = lambda: blobs
+    app.dependency_overrides[get_array_store] = lambda: arrays
+    app.dependency_overrides[get_job_queue] = lambda: queue
+    yield blobs, arrays, queue
+    queue.close()
+    app.dependency_overrides.pop(get_blob_store, None)
+    app.dependency_overrides.pop(get_array_store, None)
+    app.dependency_overrides.pop(get_job_queue, None)
+
+
+@pytest.fixture
+def blob_store(file_stores: tuple[BlobStore, ArrayStore, JobQueue]) -> BlobStore:
+    return file_stores[0]
+
+
+@pytest.fixture
+def array_store(file_stores: tuple[BlobStore, ArrayStore, JobQueue]) -> ArrayStore:
+    return file_stores[1]
+
+
+@pytest.fixture
+def job_queue(file_stores: tuple[BlobStore, ArrayStore, JobQueue]) -> JobQueue:
+    return file_stores[2]
+
+
+@pytest.fixture
+def wait_for_job(file_stores: tuple[BlobStore, ArrayStore, JobQueue]) -> Callable[[str, dict[str, str]], dict]:
+    """Poll a job, by id or ``Location`` path, until it has finished."""
+    client = TestClient(app)
+
+    def wait(job: str, headers: dict[str, str]) -> dict:
+        path = job if job.startswith("/jobs/") else f"/jobs/{job}"
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            record = client.get(path, headers=headers).json()
+            if record["status"] in FINISHED:
+                return record
+            time.sleep(0.05)
+        raise AssertionError(f"job {path} did not finish: {record}")
+
+    return wait
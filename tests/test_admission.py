@@ -0,0 +1,94 @@
+import asyncio
+
+import anyio.to_thread
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionMiddleware, Lane, TokenBucket, classify, lane_limits
+from app.main import app
+
+
+def test_routes_map_to_cost_classes() -> None:
+    assert classify("POST", "/auth/token") == "auth"
+    assert classify("GET", "/datasets") == "heavy"
+    assert classify("GET", "/datasets/abc") == "light"
+    assert classify("GET", "/datasets/abc/file") == "transfer"
+    assert classify("GET", "/datasets/abc/curves") == "heavy"
+    assert classify("GET", "/jobs/abc/result") == "transfer"
+    assert classify("GET", "/jobs/abc") == "light"
+    assert classify("GET", "/ready") is None
+
+
+def test_startup_sizes_threadpool_for_all_lanes() -> None:
+    async def total_tokens() -> float:
+        return anyio.to_thread.current_default_thread_limiter().total_tokens
+
+    with TestClient(app) as client:
+        assert client.portal.call(total_tokens) >= sum(lane_limits().values())
+
+
+def test_lane_queues_within_budget_and_sheds_beyond_it() -> None:
+    async def scenario() -> None:
+        lane = Lane(limit=1, queue_size=1, budget=0.5)
+        assert await lane.acquire() is None
+
+        queued = asyncio.create_task(lane.acquire())
+        await asyncio.sleep(0)
+        assert await lane.acquire() is not None
+
+        lane.release(0.01)
+        assert await queued is None
+        lane.release(0.01)
+        assert lane.active == 0
+
+        slow = Lane(limit=1, queue_size=4, budget=0.05)
+        slow.service_time = 1.0
+        assert await slow.acquire() is None
+        assert await slow.acquire() == 1.0
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_over_at_the_deadline_is_kept(monkeypatch) -> None:
+    lane = Lane(limit=1, queue_size=1, budget=0.5)
+
+    async def hand_over_then_time_out(waiter, timeout):
+        # Python 3.12+ can raise TimeoutError after the waiter was resolved.
+        lane.release(0.0)
+        await asyncio.sleep(0)
+        raise asyncio.TimeoutError
+
+    async def scenario() -> None:
+        assert await lane.acquire() is None
+        monkeypatch.setattr(asyncio, "wait_for", hand_over_then_time_out)
+        assert await lane.acquire() is None
+        monkeypatch.undo()
+        assert lane.active == 1
+        lane.release(0.01)
+        assert lane.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_rejects_bursts() -> None:
+    bucket = TokenBucket(rate=1.0, burst=2)
+    assert bucket.take("client") is None
+    assert bucket.take("client") is None
+    assert bucket.take("client") is not None
+    assert bucket.take("other") is None
+
+
+def test_shed_requests_get_retry_after() -> None:
+    client = TestClient(app)
+    client.get("/health")
+    admission = app.middleware_stack
+    while not isinstance(admission, AdmissionMiddleware):
+        admission = admission.app
+    lane = admission.lanes["heavy"]
+    active, queue_size = lane.active, lane.queue_size
+    lane.active, lane.queue_size = lane.limit, 0
+    try:
+        response = client.get("/datasets", headers={"Authorization": "Bearer invalid"})
+    finally:
+        lane.active, lane.queue_size = active, queue_size
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
@@ -0,0 +1,47 @@
+from uuid import uuid4
+
+from app.compact import AuditLogTable, DatasetRow
+from app.models import AuditLogRecord, DatasetRecord
+
+
+def test_audit_table_round_trips_records() -> None:
+    table = AuditLogTable()
+    dataset_id = str(uuid4())
+    written = [
+        AuditLogRecord(id=str(uuid4()), dataset_id=dataset_id, actor_id="actor", action="lock_dataset"),
+        AuditLogRecord(
+            id=str(uuid4()),
+            dataset_id=dataset_id,
+            actor_id="actor",
+            action="update_dataset",
+            details={"version": 2, "fields": ["metadata"]},
+        ),
+        AuditLogRecord(id=str(uuid4()), dataset_id="other", actor_id="actor", action="lock_dataset"),
+    ]
+    for record in written:
+        table.append(record)
+
+    assert len(table) == 3
+    assert [record.model_dump() for record in table.for_dataset(dataset_id)] == [
+        record.model_dump() for record in written[:2]
+    ]
+    assert table.for_dataset("missing") == []
+
+
+def test_dataset_row_round_trips_record() -> None:
+    record = DatasetRecord(
+        id="d1",
+        drug_name="Drug C",
+        study_id="S1",
+        dataset_type="pk",
+        metadata={"phase": "I"},
+        file_name=None,
+        owner_id="owner",
+    )
+
+    assert DatasetRow.from_record(record).to_record() == record
+
+    row = DatasetRow.from_record(record)
+    updated = row.updated({"metadata": {"phase": "II"}, "version": 2})
+    assert row.to_record() == record
+    assert updated.to_record() == record.model_copy(update={"metadata": {"phase": "II"}, "version": 2})
@@ -0,0 +1,96 @@
+from collections.abc import Callable
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.curves import Curves, build_pyramid, downsample
+from app.ingest import ArrayStore
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def pk_csv(samples: int) -> str:
+    time = np.linspace(0, 48, samples)
+    conc = 10 * (np.exp(-0.1 * time) - np.exp(-1.5 * time))
+    rows = [f"LONG,{t!r},{c!r},100\n" for t, c in zip(time.tolist(), conc.tolist())]
+    return "subject,time,concentration,dose\n" + "".join(rows) + "SHORT,0,0,50\nSHORT,1,2,50\n"
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def test_downsample_keeps_extremes_and_endpoints() -> None:
+    rng = np.random.default_rng(0)
+    counts = np.array([1000, 3, 257])
+    offsets = np.r_[0, np.cumsum(counts)]
+    time = np.concatenate([np.sort(rng.uniform(0, 24, n)) for n in counts])
+    conc = rng.uniform(0, 5, offsets[-1])
+    curves = Curves(offsets, time, conc)
+
+    result = downsample(curves, 64)
+
+    sizes = np.diff(result.offsets)
+    assert sizes[1] == 3
+    assert (sizes <= 64).all()
+    for index in range(len(counts)):
+        raw = slice(offsets[index], offsets[index + 1])
+        kept = slice(result.offsets[index], result.offsets[index + 1])
+        assert (np.diff(result.time[kept]) > 0).all()
+        assert result.time[kept][[0, -1]].tolist() == time[raw][[0, -1]].tolist()
+        assert result.concentration[kept].max() == conc[raw].max()
+        assert result.concentration[kept].min() == conc[raw].min()
+
+    pyramid = build_pyramid(curves)
+    assert sorted(pyramid) == [64, 256]
+    assert pyramid[64].concentration.max() == conc.max()
+
+
+def test_curves_endpoint_reads_pyramid(
+    array_store: ArrayStore, wait_for_job: Callable[[str, dict[str, str]], dict]
+) -> None:
+    register_user("curves-owner@example.com", "researcher")
+    headers = {"Authorization": f"Bearer {login('curves-owner@example.com')}"}
+    dataset_id = client.post(
+        "/datasets",
+        json={"drug_name": "Drug C", "study_id": "STUDY-C1", "dataset_type": "pk", "metadata": {}},
+        headers=headers,
+    ).json()["id"]
+    assert client.get(f"/datasets/{dataset_id}/curves", headers=headers).status_code == 409
+    upload = client.post(f"/datasets/{dataset_id}/file?file_name=pk.csv", content=pk_csv(5000), headers=headers)
+    assert wait_for_job(upload.headers["Location"], headers)["status"] == "succeeded"
+    arrays_id = upload.json()["file_sha256"]
+    assert (array_store.path_for(arrays_id) / "curves-4096-time.npy").is_file()
+    assert np.diff(array_store.load_curves(arrays_id, 100).offsets).max() == 256
+
+    response = client.get(f"/datasets/{dataset_id}/curves?points=100", headers=headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["subjects"] == ["LONG", "SHORT"]
+    assert [len(series) for series in body["time"]] == [100, 2]
+    raw = array_store.load(arrays_id)
+    assert max(body["concentration"][0]) == raw.concentration[:5000].max()
+    assert body["time"][0][-1] == 48
+
+    selected = client.get(f"/datasets/{dataset_id}/curves?subjects=SHORT&points=4", headers=headers).json()
+    assert selected["subjects"] == ["SHORT"]
+    assert selected["concentration"] == [[0, 2]]
+    assert client.get(f"/datasets/{dataset_id}/curves?subjects=NONE", headers=headers).status_code == 422
+    assert client.get(f"/datasets/{dataset_id}/curves?points=2", headers=headers).status_code == 422
@@ -0,0 +1,179 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from app.blobs import BlobResponse, BlobStore
+from app.main import app
+
+
+client = TestClient(app)
+pytestmark = pytest.mark.usefixtures("blob_store")
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def create_dataset(token: str) -> str:
+    response = client.post(
+        "/datasets",
+        json={"drug_name": "Drug F", "study_id": "STUDY-F1", "dataset_type": "raw", "metadata": {}},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_chunked_upload_is_deduplicated_and_supports_ranges(blob_store: BlobStore) -> None:
+    register_user("files-owner@example.com", "researcher")
+    token = login("files-owner@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = b"subject,time,concentration\n" * 1000
+
+    digests = []
+    for _ in range(2):
+        dataset_id = create_dataset(token)
+        response = client.post(
+            f"/datasets/{dataset_id}/file?file_name=conc.csv",
+            content=iter([payload[:5000], payload[5000:]]),
+            headers=headers,
+        )
+        assert response.status_code == 200
+        assert response.json()["file_size"] == len(payload)
+        digests.append(response.json()["file_sha256"])
+
+    assert digests[0] == digests[1]
+    assert len(list((blob_store.root / "sha256").rglob("*"))) == 2
+
+    full = client.get(f"/datasets/{dataset_id}/file", headers=headers)
+    assert full.status_code == 200
+    assert full.content == payload
+
+    partial = client.get(f"/datasets/{dataset_id}/file", headers={**headers, "Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == payload[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(payload)}"
+
+    unsatisfiable = client.get(f"/datasets/{dataset_id}/file", headers={**headers, "Range": "bytes=999999-"})
+    assert unsatisfiable.status_code == 416
+
+    invalid = client.get(f"/datasets/{dataset_id}/file", headers={**headers, "Range": "bytes=5-3"})
+    assert invalid.status_code == 200
+    assert invalid.content == payload
+
+
+def test_multipart_upload_uses_part_file_name() -> None:
+    register_user("files-multipart@example.com", "researcher")
+    token = login("files-multipart@example.com")
+    dataset_id = create_dataset(token)
+
+    headers = {"Authorization": f"Bearer {token}"}
+    content = b"subject,time\n1,0\n" * 1000
+
+    response = client.post(
+        f"/datasets/{dataset_id}/file",
+        data={"note": "leading field"},
+        files={"file": ("profile.csv", content, "text/csv")},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["file_name"] == "profile.csv"
+    assert response.json()["file_size"] == len(content)
+    assert client.get(f"/datasets/{dataset_id}/file", headers=headers).content == content
+
+    missing = client.post(f"/datasets/{dataset_id}/file", files={"other": ("x.csv", b"x")}, headers=headers)
+    assert missing.status_code == 422
+    no_boundary = client.post(
+        f"/datasets/{dataset_id}/file", content=b"x", headers={**headers, "Content-Type": "multipart/form-data"}
+    )
+    assert no_boundary.status_code == 422
+
+
+def send_blob(path: Path, range_header: str, extensions: dict) -> list[dict]:
+    response = BlobResponse(path, "digest", None, Headers({"range": range_header}))
+    scope = {"type": "http", "method": "GET", "extensions": extensions}
+    sent: list[dict] = []
+
+    async def receive() -> dict:
+        return {"type": "http.request"}
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.zerocopysend":
+            # The descriptor is closed once the response returns.
+            message = {**message, "body": os.pread(message["file"], message["count"], message["offset"])}
+        sent.append(message)
+
+    asyncio.run(response(scope, receive, send))
+    return sent
+
+
+def test_blob_response_uses_zerocopysend_when_offered(tmp_path: Path) -> None:
+    path = tmp_path / "blob"
+    path.write_bytes(bytes(range(256)) * 16)
+
+    start, zerocopy = send_blob(path, "bytes=100-199", {"http.response.zerocopysend": {}})
+    assert start["status"] == 206
+    assert zerocopy["type"] == "http.response.zerocopysend"
+    assert (zerocopy["offset"], zerocopy["count"], zerocopy["more_body"]) == (100, 100, False)
+    assert zerocopy["body"] == path.read_bytes()[100:200]
+
+    BlobResponse.chunk_size, chunk_size = 64, BlobResponse.chunk_size
+    try:
+        _, *chunks = send_blob(path, "bytes=100-199", {})
+    finally:
+        BlobResponse.chunk_size = chunk_size
+    assert [message["type"] for message in chunks] == ["http.response.body"] * 2
+    assert b"".join(message["body"] for message in chunks) == path.read_bytes()[100:200]
+    assert [message["more_body"] for message in chunks] == [True, False]
+
+
+def test_download_escapes_file_name(blob_store: BlobStore) -> None:
+    register_user("files-names@example.com", "researcher")
+    token = login("files-names@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    dataset_id = create_dataset(token)
+
+    expected = {
+        'a".csv': 'attachment; filename="a\\".csv"',
+        "数据.csv": "attachment; filename=\"??.csv\"; filename*=UTF-8''%E6%95%B0%E6%8D%AE.csv",
+    }
+    for file_name, disposition in expected.items():
+        client.post(f"/datasets/{dataset_id}/file", params={"file_name": file_name}, content=b"x", headers=headers)
+        response = client.get(f"/datasets/{dataset_id}/file", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-disposition"] == disposition
+
+
+def test_locked_dataset_blocks_uploads_but_not_downloads() -> None:
+    register_user("files-locked@example.com", "researcher")
+    register_user("files-reader@example.com", "viewer")
+    register_user("files-admin@example.com", "admin")
+    token = login("files-locked@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    dataset_id = create_dataset(token)
+    client.post(f"/datasets/{dataset_id}/file?file_name=a.csv", content=b"subject\n", headers=headers)
+    admin = {"Authorization": f"Bearer {login('files-admin@example.com')}"}
+    assert client.post(f"/datasets/{dataset_id}/lock", headers=admin).status_code == 200
+
+    reader = {"Authorization": f"Bearer {login('files-reader@example.com')}"}
+    assert client.get(f"/datasets/{dataset_id}/file", headers=reader).content == b"subject\n"
+    upload = client.post(f"/datasets/{dataset_id}/file?file_name=b.csv", content=b"x", headers=headers)
+    assert upload.status_code == 403
@@ -0,0 +1,81 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import DatasetCreate, DatasetUpdate
+from app.storage import InMemoryStore
+from app.versions import apply, diff, reconstruct
+
+
+client = TestClient(app)
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def test_diff_only_records_changed_paths() -> None:
+    old = {"metadata": {"phase": "I", "a/b": 1, "sites": [1, 2]}, "drug_name": "X"}
+    new = {"metadata": {"phase": "II", "a/b": 1, "sites": [1, 2, 3]}, "study_id": "S"}
+
+    ops = diff(old, new)
+
+    assert {"op": "replace", "path": "/metadata/phase", "value": "II"} in ops
+    assert {"op": "remove", "path": "/drug_name"} in ops
+    assert len(ops) == 4
+    assert apply(old, ops) == new
+
+
+def test_store_rebuilds_every_version_across_snapshots() -> None:
+    store = InMemoryStore(snapshot_interval=4)
+    dataset = store.create_dataset(
+        DatasetCreate(drug_name="Drug V", study_id="S", dataset_type="pk", metadata={"edit": 0}),
+        owner_id="owner",
+    )
+    for edit in range(1, 11):
+        store.update_dataset(dataset.id, DatasetUpdate(metadata={"edit": edit, "static": "x" * 100}))
+
+    assert store.get_dataset(dataset.id).version == 11
+    for version in range(1, 12):
+        chain = store.get_version_chain(dataset.id, version)
+        assert chain[0].snapshot is not None and len(chain) <= 4
+        assert reconstruct(chain)["metadata"]["edit"] == version - 1
+    assert store.get_version_chain(dataset.id, 12) == []
+
+
+def test_version_endpoints_and_compact_audit() -> None:
+    register_user("versions-owner@example.com", "researcher")
+    token = login("versions-owner@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    dataset_id = client.post(
+        "/datasets",
+        json={"drug_name": "Drug V", "study_id": "STUDY-V1", "dataset_type": "pk", "metadata": {"phase": "I"}},
+        headers=headers,
+    ).json()["id"]
+    updated = client.patch(f"/datasets/{dataset_id}", json={"metadata": {"phase": "II"}}, headers=headers)
+    assert updated.json()["version"] == 2
+
+    first = client.get(f"/datasets/{dataset_id}/versions/1", headers=headers)
+    assert first.status_code == 200
+    assert first.json()["metadata"] == {"phase": "I"}
+
+    changes = client.get(f"/datasets/{dataset_id}/versions/2/diff", headers=headers).json()
+    assert {"op": "replace", "path": "/metadata/phase", "value": "II"} in changes
+
+    assert client.get(f"/datasets/{dataset_id}/versions/3", headers=headers).status_code == 404
+    logs = client.get(f"/datasets/{dataset_id}/audit", headers=headers).json()
+    update_log = next(log for log in logs if log["action"] == "update_dataset")
+    assert update_log["details"] == {"version": 2, "fields": ["metadata"]}
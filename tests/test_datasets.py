@@ -58,3 +58,30 @@ def test_viewer_cannot_create_dataset() -> None:
         headers={"Authorization": f"Bearer {token}"},
     )
     assert response.status_code == 403
+
+
+def test_fields_restrict_dataset_responses() -> None:
+    register_user("fields-researcher@example.com", "researcher")
+    token = login("fields-researcher@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    created = client.post(
+        "/datasets",
+        json={
+            "drug_name": "Drug Fields",
+            "study_id": "STUDY-003",
+            "dataset_type": "pharmacokinetics",
+            "metadata": {"phase": "I", "notes": "x" * 1000},
+        },
+        headers=headers,
+    ).json()
+
+    listed = client.get("/datasets", params={"fields": "drug_name,study_id,locked"}, headers=headers)
+    assert listed.status_code == 200
+    row = next(item for item in listed.json() if item["id"] == created["id"])
+    assert row == {"id": created["id"], "drug_name": "Drug Fields", "study_id": "STUDY-003", "locked": False}
+
+    single = client.get(f"/datasets/{created['id']}", params={"fields": "created_at"}, headers=headers)
+    assert single.json() == {"id": created["id"], "created_at": created["created_at"]}
+
+    invalid = client.get("/datasets", params={"fields": "drug_name,password"}, headers=headers)
+    assert invalid.status_code == 422
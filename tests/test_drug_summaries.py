@@ -0,0 +1,156 @@
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.ingest import ArrayStore, parse_csv
+from app.main import app
+from app.models import DatasetCreate, DatasetUpdate
+from app.storage import InMemoryStore
+from app.summaries import PERCENTILES, DrugSummaries, _Values
+
+
+client = TestClient(app)
+WaitForJob = Callable[[str, dict[str, str]], dict]
+pytestmark = pytest.mark.usefixtures("array_store")
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def create_pk_dataset(
+    headers: dict[str, str], drug_name: str, study_id: str, peak: int, wait_for: WaitForJob
+) -> str:
+    dataset_id = client.post(
+        "/datasets",
+        json={"drug_name": drug_name, "study_id": study_id, "dataset_type": "pk", "metadata": {}},
+        headers=headers,
+    ).json()["id"]
+    csv = f"subject,time,concentration\nS1,0,0\nS1,1,{peak}\nS2,0,0\nS2,1,{peak * 2}\n"
+    response = client.post(f"/datasets/{dataset_id}/file?file_name=pk.csv", content=csv, headers=headers)
+    assert response.status_code == 202
+    assert wait_for(response.headers["Location"], headers)["status"] == "succeeded"
+    return dataset_id
+
+
+def test_summary_tracks_dataset_updates(wait_for_job: WaitForJob) -> None:
+    register_user("summary-owner@example.com", "researcher")
+    token = login("summary-owner@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    create_pk_dataset(headers, "Drug S", "STUDY-S1", 10, wait_for_job)
+    moved = create_pk_dataset(headers, "Drug S", "STUDY-S2", 30, wait_for_job)
+
+    summary = client.get("/drugs/Drug S/summary", headers=headers).json()
+    assert summary["datasets"] == 2
+    assert summary["subjects"] == 4
+    assert summary["cmax"]["mean"] == pytest.approx(30)
+    assert [study["study_id"] for study in summary["studies"]] == ["STUDY-S1", "STUDY-S2"]
+
+    client.patch(f"/datasets/{moved}", json={"drug_name": "Drug S2"}, headers=headers)
+    create_pk_dataset(headers, "Drug S", "STUDY-S1", 20, wait_for_job)
+
+    summary = client.get("/drugs/Drug S/summary", headers=headers).json()
+    assert summary["datasets"] == 2
+    assert summary["studies"][0]["subjects"] == 4
+    assert summary["cmax"]["p50"] == pytest.approx(20)
+    assert client.get("/drugs/Drug S2/summary", headers=headers).json()["datasets"] == 1
+
+
+class BlockingStore(InMemoryStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.listing = threading.Event()
+        self.release = threading.Event()
+
+    def list_dataset_fields(self, fields, drug_name=None):
+        self.listing.set()
+        self.release.wait(5)
+        return super().list_dataset_fields(fields, drug_name)
+
+
+def save_arrays(array_store: ArrayStore, tmp_path: Path, key: str, peak: int) -> None:
+    path = tmp_path / f"{key}.csv"
+    path.write_text(f"subject,time,concentration\nS1,0,0\nS1,1,{peak}\n")
+    array_store.save(key, parse_csv(path))
+
+
+def test_refresh_applies_newest_version_and_does_not_wait_for_loads(array_store: ArrayStore, tmp_path: Path) -> None:
+    for key, peak in (("old", 10), ("new", 40)):
+        save_arrays(array_store, tmp_path, key, peak)
+    store = BlockingStore()
+    summaries = DrugSummaries()
+    dataset = store.create_dataset(DatasetCreate(drug_name="Drug R", study_id="S1", dataset_type="pk"), owner_id="o")
+
+    loader = threading.Thread(target=summaries.summary, args=("Drug R", store, array_store))
+    loader.start()
+    assert store.listing.wait(5)
+    # The load is in progress: refreshes neither block nor get lost.
+    newer = dataset.model_copy(update={"arrays_id": "new", "version": 3})
+    summaries.refresh(newer, array_store)
+    summaries.refresh(dataset.model_copy(update={"arrays_id": "old", "version": 2}), array_store)
+    store.release.set()
+    loader.join(5)
+
+    assert summaries.summary("Drug R", store, array_store).cmax.mean == pytest.approx(40)
+    assert summaries.summary("Unknown drug", store, array_store).datasets == 0
+    assert "Unknown drug" not in summaries._summaries
+
+
+def test_summary_picks_up_writes_from_other_processes(array_store: ArrayStore, tmp_path: Path) -> None:
+    for key, peak in (("first", 10), ("second", 30), ("third", 50)):
+        save_arrays(array_store, tmp_path, key, peak)
+    store = InMemoryStore()
+    # Writes below go straight to the store, as another process's would.
+    summaries = DrugSummaries()
+    create = DatasetCreate(drug_name="Drug X", study_id="S1", dataset_type="pk")
+    kept = store.create_dataset(create, owner_id="o")
+    moved = store.create_dataset(create, owner_id="o")
+    store.set_dataset_file(kept.id, "pk.csv", "a", 1, arrays_id="first")
+    store.set_dataset_file(moved.id, "pk.csv", "b", 1, arrays_id="second")
+    assert summaries.summary("Drug X", store, array_store).cmax.mean == pytest.approx(20)
+
+    store.set_dataset_file(kept.id, "pk.csv", "c", 1, arrays_id="third")
+    store.update_dataset(moved.id, DatasetUpdate(drug_name="Drug Y"))
+
+    summary = summaries.summary("Drug X", store, array_store)
+    assert (summary.datasets, summary.cmax.mean) == (1, pytest.approx(50))
+    assert summaries.summary("Drug Y", store, array_store).cmax.mean == pytest.approx(30)
+
+
+def test_running_values_match_recomputed_percentiles() -> None:
+    rng = np.random.default_rng(0)
+    groups = [np.round(rng.normal(10, 3, size), 1) for size in (5, 1, 12, 7)]
+    groups[2][[0, 4]] = np.nan
+    values = _Values()
+    for group in groups:
+        values.add(group)
+    values.remove(groups[1])
+    values.remove(groups[2])
+    values.add(groups[2])
+
+    remaining = np.concatenate([groups[0], groups[3], groups[2]])
+    remaining = remaining[np.isfinite(remaining)]
+    stats = values.stats()
+    assert stats.mean == pytest.approx(remaining.mean())
+    assert [stats.p5, stats.p50, stats.p95] == pytest.approx(list(np.percentile(remaining, PERCENTILES)))
+    for group in (groups[0], groups[2], groups[3]):
+        values.remove(group)
+    assert values.stats().mean is None
@@ -0,0 +1,104 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.events import EventBus
+from app.main import app
+from app.models import AccessRequestCreate, DatasetCreate
+from app.storage import InMemoryStore
+
+
+client = TestClient(app)
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def test_store_writes_fan_out_to_dataset_and_owner_topics() -> None:
+    async def scenario() -> None:
+        bus = EventBus()
+        store = InMemoryStore(bus=bus)
+        dataset = store.create_dataset(
+            DatasetCreate(drug_name="Drug E", study_id="S", dataset_type="pk"), owner_id="owner"
+        )
+        dataset_feed = bus.subscribe({f"dataset:{dataset.id}"})
+        owner_feed = bus.subscribe({"owner:owner"})
+        other_feed = bus.subscribe({"owner:someone-else"})
+
+        store.create_audit_log(dataset.id, "owner", "lock_dataset")
+        store.create_access_request(dataset.id, "viewer", AccessRequestCreate(reason="please"))
+        await asyncio.sleep(0)
+
+        assert (await dataset_feed.get()).name == "audit"
+        assert (await dataset_feed.get()).name == "access_request"
+        assert (await owner_feed.get()).id == 1
+        assert other_feed._queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_resume_replays_history_after_last_event_id() -> None:
+    async def scenario() -> None:
+        bus = EventBus(history=3)
+        for index in range(5):
+            bus.publish({"t"}, "audit", str(index))
+
+        resumed = bus.subscribe({"t"}, last_event_id=3)
+        assert not resumed.missed
+        assert [(await resumed.get()).data for _ in range(2)] == ["3", "4"]
+
+        stale = bus.subscribe({"t"}, last_event_id=0)
+        assert stale.missed
+        assert not bus.subscribe({"t"}, last_event_id=5).missed
+        assert bus.subscribe({"t"}, last_event_id=500).missed
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_is_closed_when_buffer_overflows() -> None:
+    async def scenario() -> None:
+        bus = EventBus(buffer=2)
+        subscription = bus.subscribe({"t"})
+        for index in range(4):
+            bus.publish({"t"}, "audit", str(index))
+        await asyncio.sleep(0)
+
+        received = [await subscription.get() for _ in range(3)]
+        assert [event.data for event in received[:2]] == ["0", "1"]
+        assert received[2] is None
+        assert subscription.closed
+
+    asyncio.run(scenario())
+
+
+def test_dataset_feed_requires_owner_or_admin() -> None:
+    register_user("events-owner@example.com", "researcher")
+    register_user("events-viewer@example.com", "viewer")
+    owner_token = login("events-owner@example.com")
+    dataset_id = client.post(
+        "/datasets",
+        json={"drug_name": "Drug E", "study_id": "STUDY-E1", "dataset_type": "pk", "metadata": {}},
+        headers={"Authorization": f"Bearer {owner_token}"},
+    ).json()["id"]
+
+    viewer_token = login("events-viewer@example.com")
+    response = client.get(
+        f"/datasets/{dataset_id}/events",
+        headers={"Authorization": f"Bearer {viewer_token}"},
+    )
+    assert response.status_code == 403
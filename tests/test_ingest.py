@@ -0,0 +1,134 @@
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.ingest import ArrayStore, IngestError, parse_csv
+from app.main import app
+
+
+client = TestClient(app)
+
+PK_CSV = (
+    "subject,time [min],conc (ng/mL),dose [mg]\n"
+    "S2,0,0,100\n"
+    "S1,0,0,50\n"
+    "S2,60,800,100\n"
+    "S1,30,400,50\n"
+    "S1,120,200,50\n"
+)
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def test_parse_csv_groups_subjects_and_converts_units(tmp_path: Path) -> None:
+    path = tmp_path / "pk.csv"
+    path.write_text(PK_CSV)
+
+    arrays = parse_csv(path)
+
+    assert arrays.subjects.tolist() == ["S1", "S2"]
+    assert arrays.offsets.tolist() == [0, 3, 5]
+    assert arrays.time[arrays.subject_slice(0)].tolist() == [0.0, 0.5, 2.0]
+    assert arrays.concentration[arrays.subject_slice(1)].tolist() == [0.0, 0.8]
+    assert arrays.dose.tolist() == [50, 50, 50, 100, 100]
+
+
+def test_parse_csv_reads_quoted_fields_and_sparse_doses(tmp_path: Path) -> None:
+    path = tmp_path / "pk.csv"
+    # As written by R's write.csv: quoted header and labels, dose on the first row only.
+    path.write_text(
+        '"","subject","time","conc (mg/L)","dose"\n'
+        '"1","S 1",0,0,100\n'
+        '"2","S 1",1,5,\n'
+        '"3","A, B",0,0,\n'
+        '\n'
+        '"4","A, B",2,3,\n'
+    )
+
+    arrays = parse_csv(path)
+
+    assert arrays.subjects.tolist() == ["A, B", "S 1"]
+    assert arrays.time.tolist() == [0, 2, 0, 1]
+    assert np.isnan(arrays.dose[[0, 1, 3]]).all()
+    assert arrays.dose[2] == 100
+
+    path.write_text("subject,time,concentration\nS1,0,abc\n")
+    with pytest.raises(IngestError, match="Invalid concentration value 'abc'"):
+        parse_csv(path)
+    path.write_text("subject,time,concentration\nS1,0\n")
+    with pytest.raises(IngestError, match="Line 2 has too few columns"):
+        parse_csv(path)
+
+
+def test_parse_csv_rejects_unsorted_times_and_unknown_units(tmp_path: Path) -> None:
+    path = tmp_path / "pk.csv"
+    path.write_text("subject,time,concentration\nS1,1,5\nS1,1,4\n")
+    with pytest.raises(IngestError, match="strictly increasing within subject 'S1'"):
+        parse_csv(path)
+
+    path.write_text("subject,time [weeks],concentration\nS1,1,5\n")
+    with pytest.raises(IngestError, match="Unsupported time unit"):
+        parse_csv(path)
+
+    path.write_bytes(b"\xff\xfe\x00\x89PNG\r\n")
+    with pytest.raises(IngestError, match="not UTF-8"):
+        parse_csv(path)
+
+
+def test_pk_upload_persists_memory_mapped_arrays(
+    array_store: ArrayStore, wait_for_job: Callable[[str, dict[str, str]], dict]
+) -> None:
+    register_user("ingest-owner@example.com", "researcher")
+    token = login("ingest-owner@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    dataset_id = client.post(
+        "/datasets",
+        json={"drug_name": "Drug I", "study_id": "STUDY-I1", "dataset_type": "pk", "metadata": {}},
+        headers=headers,
+    ).json()["id"]
+
+    response = client.post(f"/datasets/{dataset_id}/file?file_name=pk.csv", content=PK_CSV, headers=headers)
+    assert response.status_code == 202
+    assert response.json()["arrays_id"] is None
+    assert wait_for_job(response.headers["Location"], headers)["status"] == "succeeded"
+    arrays_id = client.get(f"/datasets/{dataset_id}", headers=headers).json()["arrays_id"]
+    assert arrays_id == response.json()["file_sha256"]
+    arrays = array_store.load(arrays_id)
+    assert isinstance(arrays.time, np.memmap)
+    assert arrays.n_subjects == 2
+    assert (array_store.path_for(arrays_id) / "nca-linear-3" / "cmax.npy").is_file()
+
+    # The same file again is already parsed and attached without a job.
+    again = client.post(f"/datasets/{dataset_id}/file?file_name=copy.csv", content=PK_CSV, headers=headers)
+    assert again.status_code == 200
+    assert again.json()["arrays_id"] == arrays_id
+
+    invalid = client.post(
+        f"/datasets/{dataset_id}/file?file_name=bad.csv",
+        content="subject,time\nS1,0\n",
+        headers=headers,
+    )
+    assert invalid.status_code == 202
+    job = wait_for_job(invalid.headers["Location"], headers)
+    assert job["status"] == "failed"
+    assert job["error"].startswith("IngestError: Missing required column(s): concentration")
+    assert client.get(f"/datasets/{dataset_id}", headers=headers).json()["arrays_id"] is None
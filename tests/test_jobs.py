@@ -0,0 +1,227 @@
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.blobs import BlobStore
+from app.deps import get_store
+from app.ingest import ArrayStore
+from app.jobs import JobQueue, job_params
+from app.models import JobRecord
+from app.main import app
+
+
+client = TestClient(app)
+WaitForJob = Callable[[str, dict[str, str]], dict]
+
+PK_CSV = (
+    "subject,time,concentration,dose\n"
+    + "".join(f"A,{t},{c},100\n" for t, c in [(0, 0), (1, 10), (2, 8), (4, 4), (8, 1)])
+    + "".join(f"B,{t},{c},50\n" for t, c in [(0, 0), (0.5, 3)])
+)
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def create_pk_dataset(headers: dict[str, str], study_id: str, wait_for: WaitForJob) -> str:
+    dataset_id = client.post(
+        "/datasets",
+        json={"drug_name": "Drug J", "study_id": study_id, "dataset_type": "pk", "metadata": {}},
+        headers=headers,
+    ).json()["id"]
+    upload = client.post(f"/datasets/{dataset_id}/file?file_name=pk.csv", content=PK_CSV, headers=headers)
+    assert wait_for(upload.headers["Location"], headers)["status"] == "succeeded"
+    return dataset_id
+
+
+def test_nca_job_runs_once_per_dataset_version(wait_for_job: WaitForJob) -> None:
+    register_user("jobs-owner@example.com", "researcher")
+    headers = {"Authorization": f"Bearer {login('jobs-owner@example.com')}"}
+    dataset_id = create_pk_dataset(headers, "STUDY-J1", wait_for_job)
+
+    submitted = client.post(
+        "/jobs", json={"dataset_id": dataset_id, "kind": "nca", "params": {"method": "log"}}, headers=headers
+    )
+    assert submitted.status_code == 202
+    job_id = submitted.json()["id"]
+    duplicate = client.post(
+        "/jobs", json={"dataset_id": dataset_id, "kind": "nca", "params": {"method": "log"}}, headers=headers
+    )
+    assert duplicate.status_code == 200
+    assert duplicate.json()["id"] == job_id
+
+    job = wait_for_job(job_id, headers)
+    assert job["status"] == "succeeded"
+    assert job["progress"] == 1.0
+    assert job["result"]["cmax"] == [10, 3]
+
+    audit = client.get(f"/datasets/{dataset_id}/audit", headers=headers).json()
+    # The upload's ingest job comes first.
+    submitted = [entry["details"] for entry in audit if entry["action"] == "submit_job"]
+    completed = [entry["details"] for entry in audit if entry["action"] == "complete_job"]
+    assert [entry["kind"] for entry in submitted] == ["ingest", "nca"]
+    assert completed[-1] == {"job_id": job_id, "kind": "nca", "status": "succeeded"}
+
+
+def test_ingest_job_and_rejections(wait_for_job: WaitForJob) -> None:
+    register_user("jobs-ingest@example.com", "researcher")
+    headers = {"Authorization": f"Bearer {login('jobs-ingest@example.com')}"}
+    dataset_id = create_pk_dataset(headers, "STUDY-J2", wait_for_job)
+
+    job_id = client.post("/jobs", json={"dataset_id": dataset_id, "kind": "ingest"}, headers=headers).json()["id"]
+    job = wait_for_job(job_id, headers)
+    assert job["status"] == "succeeded"
+    assert (job["result"]["subjects"], job["result"]["rows"]) == (2, 7)
+
+    invalid = client.post(
+        "/jobs", json={"dataset_id": dataset_id, "kind": "nca", "params": {"method": "cubic"}}, headers=headers
+    )
+    assert invalid.status_code == 422
+    bare = client.post(
+        "/datasets",
+        json={"drug_name": "Drug J", "study_id": "STUDY-J3", "dataset_type": "pk", "metadata": {}},
+        headers=headers,
+    ).json()["id"]
+    assert client.post("/jobs", json={"dataset_id": bare, "kind": "nca"}, headers=headers).status_code == 409
+
+
+def test_cancelled_job_can_be_resubmitted(job_queue: JobQueue, wait_for_job: WaitForJob) -> None:
+    register_user("jobs-cancel@example.com", "researcher")
+    register_user("jobs-other@example.com", "researcher")
+    headers = {"Authorization": f"Bearer {login('jobs-cancel@example.com')}"}
+    other = {"Authorization": f"Bearer {login('jobs-other@example.com')}"}
+    dataset_id = create_pk_dataset(headers, "STUDY-J4", wait_for_job)
+    # A fresh pool is still starting its worker when the cancel arrives.
+    job_queue.close()
+
+    job_id = client.post("/jobs", json={"dataset_id": dataset_id, "kind": "nca"}, headers=headers).json()["id"]
+    assert client.get(f"/jobs/{job_id}", headers=other).status_code == 403
+    assert client.post(f"/jobs/{job_id}/cancel", headers=headers).status_code == 200
+    assert wait_for_job(job_id, headers)["status"] == "cancelled"
+
+    again = client.post("/jobs", json={"dataset_id": dataset_id, "kind": "nca"}, headers=headers)
+    assert again.status_code == 202
+    assert again.json()["id"] != job_id
+    assert wait_for_job(again.json()["id"], headers)["status"] == "succeeded"
+
+
+def test_large_result_is_stored_as_file(job_queue: JobQueue, wait_for_job: WaitForJob) -> None:
+    register_user("jobs-large@example.com", "researcher")
+    headers = {"Authorization": f"Bearer {login('jobs-large@example.com')}"}
+    dataset_id = create_pk_dataset(headers, "STUDY-J5", wait_for_job)
+    job_queue.inline_result_bytes = 16
+
+    job_id = client.post("/jobs", json={"dataset_id": dataset_id, "kind": "nca"}, headers=headers).json()["id"]
+    job = wait_for_job(job_id, headers)
+
+    assert job["status"] == "succeeded"
+    assert job["result"] is None
+    assert job_queue.result_path(job_id).name == job["result_file"]
+    result = client.get(f"/jobs/{job_id}/result", headers=headers)
+    assert result.status_code == 200
+    assert result.json()["cmax"] == [10, 3]
+
+
+def test_job_survives_broken_pool_and_failed_dispatch(
+    job_queue: JobQueue, wait_for_job: WaitForJob, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    register_user("jobs-broken@example.com", "researcher")
+    headers = {"Authorization": f"Bearer {login('jobs-broken@example.com')}"}
+    dataset_id = create_pk_dataset(headers, "STUDY-J6", wait_for_job)
+    first = client.post("/jobs", json={"dataset_id": dataset_id, "kind": "ingest"}, headers=headers).json()["id"]
+    assert wait_for_job(first, headers)["status"] == "succeeded"
+
+    executor = job_queue._executor
+    for process in list(executor._processes.values()):
+        process.kill()
+    deadline = time.monotonic() + 30
+    while not executor._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+    job_id = client.post("/jobs", json={"dataset_id": dataset_id, "kind": "nca"}, headers=headers).json()["id"]
+    assert wait_for_job(job_id, headers)["status"] == "succeeded"
+    assert job_queue._executor is not executor
+
+    def refuse(*args):
+        raise OSError("no more processes")
+
+    monkeypatch.setattr(job_queue, "_submit", refuse)
+    log_nca = {"dataset_id": dataset_id, "kind": "nca", "params": {"method": "log"}}
+    failed = client.post("/jobs", json=log_nca, headers=headers)
+    assert failed.status_code == 202
+    assert failed.json()["status"] == "failed"
+    assert "no more processes" in failed.json()["error"]
+    assert client.get(f"/jobs/{failed.json()['id']}/result", headers=headers).status_code == 409
+
+    monkeypatch.undo()
+    again = client.post("/jobs", json=log_nca, headers=headers)
+    assert again.json()["id"] != failed.json()["id"]
+    assert wait_for_job(again.json()["id"], headers)["status"] == "succeeded"
+
+
+def test_queues_claim_only_stale_jobs(
+    file_stores: tuple[BlobStore, ArrayStore, JobQueue], wait_for_job: WaitForJob, tmp_path: Path
+) -> None:
+    blobs, arrays, job_queue = file_stores
+    register_user("jobs-claim@example.com", "researcher")
+    headers = {"Authorization": f"Bearer {login('jobs-claim@example.com')}"}
+    store = get_store()
+    dataset = store.get_dataset(create_pk_dataset(headers, "STUDY-J7", wait_for_job))
+    user_id = store.get_user_by_email("jobs-claim@example.com").id
+
+    def running(owner: str, heartbeat_at: datetime, method: str) -> JobRecord:
+        job = JobRecord(
+            id=str(uuid4()),
+            dataset_id=dataset.id,
+            dataset_version=dataset.version,
+            kind="nca",
+            params=job_params("nca", dataset, {"method": method}),
+            submitted_by=user_id,
+            status="running",
+            owner=owner,
+            heartbeat_at=heartbeat_at,
+        )
+        with store.unit_of_work() as uow:
+            uow.create_job(job)
+        return job
+
+    dead = running("gone:1", datetime.utcnow() - timedelta(minutes=5), "linear")
+    # Two queues read the same stale job; only the first claim applies.
+    assert job_queue._claim(dead).owner == job_queue.owner
+    assert JobQueue(store, blobs, arrays, tmp_path / "other")._claim(dead) is None
+    store.update_job(dead.id, {"owner": "gone:1", "heartbeat_at": dead.heartbeat_at})
+
+    alive = running("busy:1", datetime.utcnow(), "log")
+    other = JobQueue(store, blobs, arrays, tmp_path / "other", workers=1, heartbeat_interval=0.5)
+    try:
+        other.start()
+        assert store.get_job(alive.id).owner == "busy:1"
+        assert store.get_job(dead.id).owner == other.owner
+        assert wait_for_job(dead.id, headers)["status"] == "succeeded"
+
+        # Cancelling from a queue that never ran a job, then the owner of
+        # ``alive`` stops sending heartbeats: it is claimed and cancelled.
+        JobQueue(store, blobs, arrays, tmp_path / "idle").cancel(alive, user_id)
+        assert store.get_job(alive.id).cancel_requested
+        assert wait_for_job(alive.id, headers)["status"] == "cancelled"
+    finally:
+        other.close()
@@ -0,0 +1,91 @@
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.ingest import ArrayStore, parse_csv
+from app.main import app
+from app.nca import compute
+
+
+client = TestClient(app)
+
+PK_CSV = (
+    "subject,time,concentration,dose\n"
+    + "".join(f"A,{t},{c},100\n" for t, c in [(0, 0), (1, 10), (2, 8), (4, 4), (8, 1)])
+    + "".join(f"B,{t},{c},50\n" for t, c in [(0, 0), (0.5, 3)])
+)
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def test_compute_matches_hand_calculation(tmp_path: Path) -> None:
+    path = tmp_path / "pk.csv"
+    path.write_text(PK_CSV)
+    arrays = parse_csv(path)
+
+    linear = compute(arrays, "linear")
+    log = compute(arrays, "log")
+
+    slope = np.polyfit([2, 4, 8], np.log([8, 4, 1]), 1)[0]
+    assert linear.cmax.tolist() == [10, 3]
+    assert linear.tmax.tolist() == [1, 0.5]
+    assert linear.auc_0_t.tolist() == [36, 0.75]
+    assert linear.lambda_z[0] == pytest.approx(-slope)
+    assert linear.auc_inf[0] == pytest.approx(36 + 1 / -slope)
+    assert linear.clearance[0] == pytest.approx(100 / (36 + 1 / -slope))
+    assert np.isnan(linear.lambda_z[1])
+    expected_log = 5 + 2 / np.log(10 / 8) + 8 / np.log(2) + 12 / np.log(4)
+    assert log.auc_0_t[0] == pytest.approx(expected_log)
+
+
+def test_nca_endpoint_returns_columns(
+    array_store: ArrayStore, wait_for_job: Callable[[str, dict[str, str]], dict]
+) -> None:
+    register_user("nca-owner@example.com", "researcher")
+    token = login("nca-owner@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    dataset_id = client.post(
+        "/datasets",
+        json={"drug_name": "Drug N", "study_id": "STUDY-N1", "dataset_type": "pk", "metadata": {}},
+        headers=headers,
+    ).json()["id"]
+
+    missing = client.post(f"/datasets/{dataset_id}/nca", json={}, headers=headers)
+    assert missing.status_code == 409
+
+    upload = client.post(f"/datasets/{dataset_id}/file?file_name=pk.csv", content=PK_CSV, headers=headers)
+    wait_for_job(upload.headers["Location"], headers)
+    # The default parameters are computed while the file is parsed.
+    assert client.post(f"/datasets/{dataset_id}/nca", json={}, headers=headers).status_code == 200
+
+    queued = client.post(f"/datasets/{dataset_id}/nca", json={"method": "log"}, headers=headers)
+    assert queued.status_code == 202
+    assert queued.json()["kind"] == "nca"
+    assert wait_for_job(queued.headers["Location"], headers)["status"] == "succeeded"
+
+    response = client.post(f"/datasets/{dataset_id}/nca", json={"method": "log"}, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["subjects"] == ["A", "B"]
+    assert body["cmax"] == [10, 3]
+    assert body["half_life"][1] is None
+    assert (array_store.path_for(body["arrays_id"]) / "nca-log-3" / "cmax.npy").is_file()
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.deps import close_store, mongo_client_options
+from app.main import app
+from app.storage import InMemoryStore
+
+
+def test_ready_reports_storage_after_startup() -> None:
+    with TestClient(app) as client:
+        response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready"
+    assert body["storage"]["backend"] == "memory"
+
+
+def test_startup_survives_unreachable_storage(monkeypatch) -> None:
+    reachable = threading.Event()
+
+    def warm_up(self) -> None:
+        if not reachable.is_set():
+            raise ConnectionError("storage unreachable")
+
+    monkeypatch.setattr(InMemoryStore, "warm_up", warm_up)
+    monkeypatch.setattr(settings, "store_retry_seconds", 0.05)
+    close_store()
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+        starting = client.get("/ready")
+        assert starting.status_code == 503
+        assert starting.json()["status"] == "starting"
+
+        reachable.set()
+        deadline = time.monotonic() + 10
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline, "storage was not prepared after it became reachable"
+            time.sleep(0.05)
+
+
+def test_mongo_compression_is_opt_in(monkeypatch) -> None:
+    assert "compressors" not in mongo_client_options()
+    monkeypatch.setattr(settings, "mongo_compressors", "zstd,zlib")
+    assert mongo_client_options()["compressors"] == "zstd,zlib"
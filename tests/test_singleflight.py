@@ -0,0 +1,134 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.models import DatasetCreate, DatasetUpdate, Role, UserCreate
+from app.singleflight import CoalescingStore, SingleFlight
+from app.storage import InMemoryStore
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def run_herd(flight: SingleFlight, fn, callers: int = 8) -> list:
+    """Start one leader, let it block, then pile ``callers - 1`` waiters onto it."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(flight.do, "key", blocking)]
+        started.wait(5)
+        futures += [executor.submit(flight.do, "key", fn) for _ in range(callers - 1)]
+        time.sleep(0.1)
+        release.set()
+        return [future.exception() or future.result() for future in futures]
+
+
+def test_concurrent_calls_share_one_execution() -> None:
+    flight = SingleFlight()
+    calls = []
+
+    results = run_herd(flight, lambda: calls.append(1) or len(calls))
+
+    assert results == [1] * 8
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+    assert flight.do("key", lambda: "fresh") == "fresh"
+
+
+def test_errors_propagate_to_every_waiter() -> None:
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("backend down")
+
+    results = run_herd(flight, fail)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_interrupted_leader_does_not_fail_waiters() -> None:
+    flight = SingleFlight()
+    attempts = []
+
+    def interrupted_once():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise Interrupted()
+        return "value"
+
+    results = run_herd(flight, interrupted_once, callers=4)
+
+    assert isinstance(results[0], Interrupted)
+    assert results[1:] == ["value"] * 3
+
+
+def test_coalescing_store_reads_through_writes() -> None:
+    store = CoalescingStore(InMemoryStore())
+    dataset = store.create_dataset(
+        DatasetCreate(drug_name="Drug SF", study_id="S1", dataset_type="pk"), owner_id="owner"
+    )
+
+    assert store.get_dataset(dataset.id) == dataset
+    store.update_dataset(dataset.id, DatasetUpdate(study_id="S2"))
+    assert store.get_dataset(dataset.id).study_id == "S2"
+    with pytest.raises(AttributeError):
+        store.missing_method
+
+
+def block_first_read(backend: InMemoryStore, name: str) -> tuple[threading.Event, threading.Event]:
+    """Make the first ``name`` lookup on ``backend`` read its record, then block until released."""
+    read = getattr(backend, name)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def blocking(record_id: str):
+        result = read(record_id)
+        if not entered.is_set():
+            entered.set()
+            release.wait(5)
+        return result
+
+    setattr(backend, name, blocking)
+    return entered, release
+
+
+@pytest.mark.parametrize("collection", ["datasets", "users"])
+def test_reads_after_a_commit_do_not_join_an_older_lookup(collection: str) -> None:
+    backend = InMemoryStore()
+    store = CoalescingStore(backend)
+    if collection == "datasets":
+        record_id = store.create_dataset(
+            DatasetCreate(drug_name="Drug SF", study_id="S1", dataset_type="pk"), owner_id="owner"
+        ).id
+        read, write = store.get_dataset, lambda: store.update_dataset(record_id, DatasetUpdate(study_id="S2"))
+        value = lambda record: record.study_id  # noqa: E731
+        before, after = "S1", "S2"
+    else:
+        record_id = store.create_user(UserCreate(email="sf@example.com", password="secret")).id
+        read, write = store.get_user, lambda: store.update_user_role(record_id, Role.admin)
+        value = lambda record: record.role  # noqa: E731
+        before, after = Role.viewer, Role.admin
+    entered, release = block_first_read(backend, read.__name__)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        try:
+            leader = executor.submit(read, record_id)
+            assert entered.wait(5)
+            write()
+            follower = executor.submit(read, record_id)
+            # Joining the leader's lookup would block until release and
+            # return the record as it was before the write.
+            assert value(follower.result(timeout=2)) == after
+        finally:
+            release.set()
+        assert value(leader.result(timeout=5)) == before
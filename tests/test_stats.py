@@ -0,0 +1,109 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import AccessRequestCreate, DatasetCreate, DatasetUpdate, RoleUpgradeRequestCreate
+from app.storage import InMemoryStore
+from app.unit_of_work import StorageConflict
+
+
+client = TestClient(app)
+
+
+def register_user(email: str, role: str) -> None:
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "password": "secret", "role": role},
+    )
+    assert response.status_code == 201
+
+
+def login(email: str) -> str:
+    response = client.post(
+        "/auth/token",
+        data={"username": email, "password": "secret"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def test_counters_follow_writes() -> None:
+    store = InMemoryStore()
+    first = store.create_dataset(
+        DatasetCreate(drug_name="Drug A", study_id="S1", dataset_type="pk"), owner_id="alice"
+    )
+    store.create_dataset(DatasetCreate(drug_name="Drug A", study_id="S2", dataset_type="tox"), owner_id="bob")
+    store.update_dataset(first.id, DatasetUpdate(drug_name="Drug B"))
+    store.set_dataset_lock(first.id, True)
+    store.create_access_request(first.id, "bob", AccessRequestCreate(reason="analysis"))
+    upgrade = RoleUpgradeRequestCreate(requested_role="researcher", reason="need")
+    role_request = store.create_role_upgrade_request("carol", upgrade)
+    store.create_role_upgrade_request("dave", upgrade)
+    store.set_role_upgrade_request_status(role_request.id, "approved")
+
+    stats = store.get_stats()
+    assert (stats.datasets, stats.locked, stats.unlocked) == (2, 1, 1)
+    assert stats.by_dataset_type == {"pk": 1, "tox": 1}
+    assert stats.by_drug_name == {"Drug A": 1, "Drug B": 1}
+    assert stats.by_owner == {"alice": 1, "bob": 1}
+    assert stats.pending_access_requests == 1
+    assert stats.pending_role_requests == 1
+    assert store.reconcile_stats() == {}
+
+
+def test_interleaved_toggles_count_once() -> None:
+    store = InMemoryStore()
+    dataset = store.create_dataset(DatasetCreate(drug_name="Drug A", study_id="S1", dataset_type="pk"), owner_id="a")
+    request = store.create_role_upgrade_request("b", RoleUpgradeRequestCreate(requested_role="researcher", reason="need"))
+    # Both writers read the records before either commits.
+    stale_dataset, stale_request = store.get_dataset(dataset.id), store.get_role_upgrade_request(request.id)
+
+    with store.unit_of_work() as uow:
+        uow.set_dataset_lock(dataset, True)
+        uow.set_role_upgrade_request_status(request, "approved")
+    with pytest.raises(StorageConflict):
+        with store.unit_of_work() as uow:
+            uow.set_dataset_lock(stale_dataset, True)
+    with pytest.raises(StorageConflict):
+        with store.unit_of_work() as uow:
+            uow.set_role_upgrade_request_status(stale_request, "rejected")
+
+    stats = store.get_stats()
+    assert (stats.locked, stats.unlocked, stats.pending_role_requests) == (1, 0, 0)
+    assert store.reconcile_stats() == {}
+    assert store.set_role_upgrade_request_status(request.id, "rejected").status == "rejected"
+    assert store.reconcile_stats() == {}
+
+
+def test_reconcile_corrects_drift() -> None:
+    store = InMemoryStore()
+    store.create_dataset(
+        DatasetCreate(drug_name="Drug A", study_id="S1", dataset_type="pk"), owner_id="alice"
+    )
+    store._counts[("drug_name", "Drug A")] += 2
+    store._counts[("drug_name", "Ghost")] = 1
+
+    assert store.reconcile_stats() == {("drug_name", "Drug A"): -2, ("drug_name", "Ghost"): -1}
+    assert store.get_stats().by_drug_name == {"Drug A": 1}
+
+
+def test_stats_endpoint() -> None:
+    register_user("stats-admin@example.com", "admin")
+    register_user("stats-viewer@example.com", "viewer")
+    admin = {"Authorization": f"Bearer {login('stats-admin@example.com')}"}
+    viewer = {"Authorization": f"Bearer {login('stats-viewer@example.com')}"}
+    client.post(
+        "/datasets",
+        json={"drug_name": "Drug Stats", "study_id": "STUDY-S", "dataset_type": "pk", "metadata": {}},
+        headers=admin,
+    )
+
+    response = client.get("/stats", headers=viewer)
+    assert response.status_code == 200
+    assert response.json()["by_drug_name"]["Drug Stats"] == 1
+
+    assert client.post("/stats/reconcile", headers=viewer).status_code == 403
+    reconciled = client.post("/stats/reconcile", headers=admin)
+    assert reconciled.status_code == 200
+    assert reconciled.json() == {}
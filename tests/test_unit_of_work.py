@@ -0,0 +1,72 @@
+import pytest
+
+from app.models import DatasetCreate, DatasetUpdate
+from app.storage import InMemoryStore
+from app.unit_of_work import VERSIONS, StorageConflict, UnitOfWork
+
+
+def make_dataset(store: InMemoryStore):
+    return store.create_dataset(
+        DatasetCreate(drug_name="Drug U", study_id="S1", dataset_type="pk", metadata={"phase": "I"}),
+        owner_id="owner",
+    )
+
+
+def test_unit_of_work_commits_writes_together() -> None:
+    store = InMemoryStore()
+    with store.unit_of_work() as uow:
+        dataset = uow.create_dataset(
+            DatasetCreate(drug_name="Drug U", study_id="S1", dataset_type="pk"), owner_id="owner"
+        )
+        uow.create_audit_log(dataset.id, "owner", "create_dataset")
+        assert store.get_dataset(dataset.id) is None
+
+    assert store.get_dataset(dataset.id) == dataset
+    assert [log.action for log in store.list_audit_logs(dataset.id)] == ["create_dataset"]
+    assert len(store.get_version_chain(dataset.id, 1)) == 1
+
+
+def test_unit_of_work_discards_writes_on_error() -> None:
+    store = InMemoryStore()
+    dataset = make_dataset(store)
+    with pytest.raises(RuntimeError):
+        with store.unit_of_work() as uow:
+            uow.update_dataset(dataset, {"metadata": {"phase": "II"}})
+            uow.create_audit_log(dataset.id, "owner", "update_dataset")
+            raise RuntimeError("boom")
+
+    assert store.get_dataset(dataset.id) == dataset
+    assert store.list_audit_logs(dataset.id) == []
+
+
+def test_stale_update_conflicts_without_partial_writes() -> None:
+    store = InMemoryStore()
+    dataset = make_dataset(store)
+    store.update_dataset(dataset.id, DatasetUpdate(study_id="S2"))
+
+    with pytest.raises(StorageConflict):
+        with store.unit_of_work() as uow:
+            uow.update_dataset(dataset, {"study_id": "S3"})
+            uow.create_audit_log(dataset.id, "owner", "update_dataset")
+
+    current = store.get_dataset(dataset.id)
+    assert (current.study_id, current.version) == ("S2", 2)
+    assert store.list_audit_logs(dataset.id) == []
+    assert store.get_version_chain(dataset.id, 3) == []
+
+
+def test_update_snapshots_datasets_written_before_versioning() -> None:
+    store = InMemoryStore()
+    dataset = make_dataset(store)
+
+    stored = UnitOfWork()
+    stored.update_dataset(dataset, {"study_id": "S2"})
+    legacy = UnitOfWork()
+    legacy.update_dataset(dataset.model_copy(update={"version": 0}), {"study_id": "S2"})
+
+    [patched] = [op.record for op in stored.operations if op.collection == VERSIONS]
+    [snapshot] = [op.record for op in legacy.operations if op.collection == VERSIONS]
+    assert patched.snapshot is None and patched.patch
+    assert snapshot.version == 1 and snapshot.snapshot["study_id"] == "S2"
+    [update] = [op for op in legacy.operations if op.collection != VERSIONS]
+    assert update.expected_version == 0